@@ -0,0 +1,121 @@
+"""
+Benchmark merge_timeseries against the previous merge_timeseries.
+
+Inputs are lifetime-sized: a year of Vercel rows (hourly, or pre-rolled to
+days as the API passes them) merged with ten years of daily live rows, as
+the records the API passes. The previous merge_timeseries (copied below)
+concatenated and sorted the rows without bucketing them: that was the whole
+merge of a request without a resolution. A request with one also ran the
+previous rollup_timeseries pass (copied below) over the sorted rows.
+
+Run from the api/ directory:
+    python -m benchmarks.merge_timeseries
+"""
+
+import random
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from services.merger import merge_timeseries
+from services.records import TimeseriesRecord as TimeseriesEntry
+from services.rollup import bucket_start, make_bucket, to_epoch
+
+LIVE_DAYS = 3650
+VERCEL_DAYS = 365
+REPEAT = 7
+
+
+def merge_timeseries_sort(
+    list_a: list[TimeseriesEntry], list_b: list[TimeseriesEntry]
+) -> list[TimeseriesEntry]:
+    """The previous merge_timeseries: concatenate, sort, trim leading zeros."""
+    sorted_data = sorted(list_a + list_b, key=lambda x: x.date)
+    first_nonzero_idx = next(
+        (i for i, entry in enumerate(sorted_data) if entry.pageviews > 0), 0
+    )
+    return sorted_data[first_nonzero_idx:]
+
+
+def rollup_timeseries(
+    entries: list[TimeseriesEntry], resolution: str
+) -> list[TimeseriesEntry]:
+    """The previous rollup_timeseries, run over the merged rows with a resolution."""
+    buckets: list[TimeseriesEntry] = []
+    current = None
+    pageviews = visitors = 0
+    bounced = 0.0
+    migration_date = None
+
+    for entry in entries:
+        start = bucket_start(to_epoch(entry.date), resolution)
+        if start != current:
+            if current is not None:
+                buckets.append(
+                    make_bucket(current, pageviews, visitors, bounced, migration_date)
+                )
+            current = start
+            pageviews = visitors = 0
+            bounced = 0.0
+            migration_date = entry.migration_date
+        elif entry.migration_date != migration_date:
+            migration_date = None
+        pageviews += entry.pageviews
+        visitors += entry.visitors
+        bounced += entry.bounce_rate * entry.pageviews
+
+    if current is not None:
+        buckets.append(
+            make_bucket(current, pageviews, visitors, bounced, migration_date)
+        )
+    return buckets
+
+
+def make_series(
+    start: datetime, count: int, step: timedelta, bounces: bool
+) -> list[TimeseriesEntry]:
+    rng = random.Random(count)
+    return [
+        TimeseriesEntry(
+            date=start + i * step,
+            pageviews=rng.randint(1, 50),
+            visitors=rng.randint(1, 20),
+            bounce_rate=rng.random() if bounces else 0.0,
+        )
+        for i in range(count)
+    ]
+
+
+def bench(label: str, fn) -> float:
+    best = min(timeit.repeat(fn, number=1, repeat=REPEAT))
+    print(f"  {label:<40} {best * 1000:8.2f} ms")
+    return best
+
+
+def main():
+    now = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = now - timedelta(days=LIVE_DAYS)
+    # Live rows are daily with no bounce rate, as the live store returns them
+    live = make_series(start, LIVE_DAYS, timedelta(days=1), bounces=False)
+    hourly = make_series(start, VERCEL_DAYS * 24, timedelta(hours=1), bounces=True)
+    daily = rollup_timeseries(hourly, "day")
+
+    for title, vercel in [
+        (f"{len(hourly)} hourly + {len(live)} daily rows", hourly),
+        (f"{len(daily)} daily + {len(live)} daily rows", daily),
+    ]:
+        print(title)
+        sort = bench(
+            "previous merge (sort, no buckets)",
+            lambda: merge_timeseries_sort(vercel, live),
+        )
+        rollup = bench(
+            "previous merge + rollup into days",
+            lambda: rollup_timeseries(merge_timeseries_sort(vercel, live), "day"),
+        )
+        new = bench("merge into days", lambda: merge_timeseries(vercel, live))
+        print(f"  vs previous merge:          {new / sort:.2f}x the time")
+        print(f"  vs previous merge + rollup: {new / rollup:.2f}x the time")
+
+
+if __name__ == "__main__":
+    main()
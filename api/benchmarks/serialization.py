@@ -0,0 +1,67 @@
+"""
+Benchmark response serialization on the real migration data files.
+
+Before: the merged response is held as Pydantic models (AllStats ->
+TimeseriesEntry/StatEntry) and serialized with FastAPI's jsonable_encoder
+and json.dumps. After: the same response held as slots records and
+serialized by services.serialization.dumps (orjson when installed).
+
+Lifetime responses are built without live data, at hourly resolution (the
+largest timeseries) and at the default daily resolution.
+
+Run from the api/ directory:
+    python -m benchmarks.serialization
+"""
+
+import json
+import timeit
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+
+from models import AllStats
+from services.serialization import dumps, orjson
+from services.stats import assemble_project_stats
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+REPEAT = 5
+
+
+def serialize_models(content: dict) -> bytes:
+    """The previous path: build the response models, then encode them."""
+    model = AllStats.model_validate(content, from_attributes=True)
+    return json.dumps(
+        jsonable_encoder(model),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def best_ms(fn) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=REPEAT)) * 1000
+
+
+def main():
+    encoder = f"orjson {orjson.__version__}" if orjson is not None else "json"
+    print(f"after = records + {encoder}")
+    print(f"{'file':<28}{'resolution':<12}{'KB':>8}{'before ms':>12}{'after ms':>10}")
+    for path in sorted(DATA_DIR.glob("*.json")):
+        for resolution in ("hour", "day"):
+            content = assemble_project_stats(path.stem, path, 0, [], {}, resolution)
+            before = serialize_models(content)
+            after = dumps(content)
+            if json.loads(before) != json.loads(after):
+                raise SystemExit(f"{path.name}: outputs differ")
+
+            before_ms = best_ms(lambda: serialize_models(content))
+            after_ms = best_ms(lambda: dumps(content))
+            print(
+                f"{path.name:<28}{resolution:<12}{len(after) / 1024:>8.0f}"
+                f"{before_ms:>12.2f}{after_ms:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
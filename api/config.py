@@ -16,11 +16,16 @@ from pathlib import Path
 # Base path for data files
 DATA_DIR = Path(__file__).parent / "data"
 
+# Required as X-Admin-Token by the /admin endpoints when set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 # --- PROJECT REGISTRY ---
 # Map project slugs to their respective metadata
 # - ph_id: PostHog Project ID (get from PostHog Settings -> Project Settings)
 # - vercel_file: Path to the Vercel migration JSON file
 # - display_name: Human-readable name for the dashboard
+# - prewarm_periods / prewarm_interval (optional): override which periods are
+#   kept warm in the response cache and how often (see services/prewarm.py)
 PROJECT_REGISTRY = {
     "jiit-timetable-website": {
         "ph_id": os.getenv("PH_JIIT_TIMETABLE_ID", ""),
@@ -38,6 +43,8 @@ PROJECT_REGISTRY = {
         "vercel_file": DATA_DIR / "jportal.json",
         "display_name": "JPortal",
         "analytics_provider": "cloudflare",
+        # The dashboard caps JPortal at 90 days
+        "prewarm_periods": [7, 30, 90],
     },
     "talentsync": {
         "ph_id": os.getenv("PH_TALENTSYNC_ID", ""),
@@ -5,40 +5,110 @@ A unified API for fetching analytics data from multiple projects,
 combining Vercel migration data with live PostHog data.
 
 Endpoints:
+- GET /ready - Readiness probe (passes once migration data is preloaded)
+- GET /internal/pools - Upstream HTTP connection pool and circuit breaker statistics
+- GET /internal/cache - Response cache counters
+- GET /internal/prewarm - Prewarm scheduler status per project
+- GET /internal/store - Live data store sync state
+- GET /internal/compression - Response compression ratio and CPU time
+- GET /internal/loop - Event loop lag and CPU executor counters
+- GET /metrics - Prometheus metrics (latency histograms, upstream and cache counters)
+- POST /admin/{project_slug}/refresh - Rebuild a project's cached responses now
+- POST /admin/{project_slug}/purge - Drop a project's cached responses
 - GET /api/v1/projects - List all available projects
+- GET /api/v1/stats - Get stats of several projects, and combined across them
 - GET /api/v1/{project_slug}/stats - Get unified stats for a project
+- GET /api/v1/{project_slug}/bundle - Get unified stats for several periods at once
 """
 
 import asyncio
-from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from functools import cache
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables BEFORE importing modules that depend on them
 load_dotenv()
 
-from config import PROJECT_REGISTRY, get_project_config, list_available_projects
-from models import AllStats, Metadata, ProjectInfo, ProjectListResponse
+from config import (
+    ADMIN_TOKEN,
+    PROJECT_REGISTRY,
+    get_project_config,
+    list_available_projects,
+)
+from models import (
+    AggregateStats,
+    AllStats,
+    ProjectInfo,
+    ProjectListResponse,
+    StatsBundle,
+)
 from services import (
-    fetch_timeseries,
-    fetch_all_breakdowns,
-    fetch_cf_timeseries,
-    fetch_cf_all_breakdowns,
-    load_vercel_data,
-    get_empty_stats,
-    merge_timeseries,
-    merge_stats,
-    filter_timeseries_by_date,
-    filter_stats_by_date,
+    preload_vercel_data,
+    is_vercel_data_ready,
+    start_clients,
+    close_clients,
+    pool_stats,
+    response_cache,
+    compressor,
+    cpu_executor,
+    loop_lag_monitor,
+    metrics,
+    MetricsMiddleware,
+    METRICS_ENABLED,
+    METRICS_CONTENT_TYPE,
+    get_stats_body,
+    get_timeseries_body,
+    get_bundle_body,
+    get_aggregate_body,
+    prewarm_scheduler,
+    PREWARM_ENABLED,
+    live_store,
+    live_windows,
+    Resolution,
+    FastJSONResponse,
+    CacheEntry,
+    conditional_response,
+    dumps,
 )
 
 # --- APP SETUP ---
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open the shared upstream HTTP clients and the CPU executor, preload
+    every registered migration file in the background and start the
+    prewarm scheduler and loop lag monitor.
+    """
+    await start_clients()
+    cpu_executor.start()
+    loop_lag_monitor.start()
+    vercel_files = [config["vercel_file"] for config in PROJECT_REGISTRY.values()]
+    preload_task = asyncio.create_task(
+        asyncio.to_thread(preload_vercel_data, vercel_files)
+    )
+    if PREWARM_ENABLED and response_cache.enabled:
+        prewarm_scheduler.start(PROJECT_REGISTRY)
+    yield
+    await prewarm_scheduler.stop()
+    await loop_lag_monitor.stop()
+    if not preload_task.done():
+        preload_task.cancel()
+    cpu_executor.shutdown()
+    await close_clients()
+
+
 app = FastAPI(
     title="Multi-Project Analytics API",
     description="Unified analytics combining Vercel migration data with PostHog live data",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS middleware for frontend access
@@ -50,6 +120,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency histograms for /metrics (outermost, so it times everything)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, slugs=PROJECT_REGISTRY)
+
 
 # --- ENDPOINTS ---
 
@@ -64,21 +138,168 @@ async def root():
     }
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: fails with 503 until migration data has been preloaded."""
+    if not is_vercel_data_ready():
+        raise HTTPException(status_code=503, detail="Preloading migration data")
+    return {"status": "ready"}
+
+
+@app.get("/internal/pools")
+async def get_pool_stats():
+    """Connection pool and circuit breaker statistics of the PostHog/Cloudflare clients."""
+    return pool_stats()
+
+
+@app.get("/internal/cache")
+async def get_cache_stats():
+    """Hit/miss counters and memory usage of the response cache."""
+    return response_cache.stats()
+
+
+@app.get("/internal/prewarm")
+async def get_prewarm_status():
+    """Last refresh time and duration of every prewarmed project."""
+    return prewarm_scheduler.status()
+
+
+@app.get("/internal/store")
+async def get_store_status():
+    """Sync counters and last closed day of every project in the live store."""
+    return {**live_store.status(), "live_windows": live_windows.stats()}
+
+
+@app.get("/internal/compression")
+async def get_compression_stats():
+    """Responses, compression ratio and CPU time per content encoding."""
+    return compressor.stats()
+
+
+@app.get("/internal/loop")
+async def get_loop_status():
+    """Event loop lag (how long the loop was blocked) and CPU executor counters."""
+    return {"lag": loop_lag_monitor.stats(), "executor": cpu_executor.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics in the text exposition format."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)):
+    """Require the X-Admin-Token header when ADMIN_TOKEN is configured."""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def get_project_or_404(project_slug: str) -> dict:
+    config = get_project_config(project_slug)
+    if config is None:
+        raise HTTPException(
+            status_code=404, detail=f"Project '{project_slug}' not found."
+        )
+    return config
+
+
+@app.post("/admin/{project_slug}/refresh", dependencies=[Depends(require_admin)])
+async def refresh_project(project_slug: str):
+    """Rebuild every prewarmed period of a project's /stats response now."""
+    config = get_project_or_404(project_slug)
+    return await prewarm_scheduler.refresh(project_slug, config)
+
+
+@app.post("/admin/{project_slug}/purge", dependencies=[Depends(require_admin)])
+async def purge_project(project_slug: str):
+    """Drop every cached response of a project."""
+    get_project_or_404(project_slug)
+    return {"project": project_slug, "purged": prewarm_scheduler.purge(project_slug)}
+
+
+@cache
+def projects_entry() -> CacheEntry:
+    """The /projects body and its ETag (the registry is static, so built once)."""
+    projects = list_available_projects()
+    response = ProjectListResponse(
+        projects=[ProjectInfo(**p) for p in projects], total=len(projects)
+    )
+    return CacheEntry(dumps(response))
+
+
 @app.get("/api/v1/projects", response_model=ProjectListResponse)
-async def get_projects():
+async def get_projects(request: Request):
     """
     List all projects available on this dashboard.
 
     Returns a list of projects with their slugs and display names.
     """
-    projects = list_available_projects()
-    return ProjectListResponse(
-        projects=[ProjectInfo(**p) for p in projects], total=len(projects)
-    )
+    return await conditional_response(projects_entry(), request.headers)
+
+
+@app.get("/api/v1/stats", response_model=AggregateStats)
+async def get_aggregate_stats(
+    request: Request,
+    projects: str = Query(
+        default="all",
+        pattern=r"^[\w-]+(,[\w-]+)*$",
+        description='Comma-separated project slugs, or "all"',
+    ),
+    days: int = Query(
+        default=30,
+        ge=0,
+        le=3650,
+        description="Number of days to fetch data for (0 for lifetime)",
+    ),
+    resolution: Resolution | None = Query(
+        default=None,
+        description="Timeseries rollup: hour, day, week, month, or auto (coarsest tier that still gives enough points); defaults to day",
+    ),
+    limit: int | None = Query(
+        default=None,
+        ge=1,
+        le=1000,
+        description='Maximum entries per breakdown; the rest are summed into one "(other)" entry (all entries if omitted)',
+    ),
+):
+    """
+    Get unified analytics stats of several projects, and combined across them.
+
+    Projects are gathered concurrently (bounded by AGGREGATE_CONCURRENCY)
+    through the same caches as /stats, and their timeseries and breakdowns
+    are merged into combined ones.
+
+    Args:
+        projects: Comma-separated project slugs, or "all"
+        days: Number of days to look back (0 for lifetime)
+        resolution: Timeseries rollup tier, "auto", or None for daily
+            buckets (one tier for all projects)
+        limit: Maximum entries per breakdown (None for all)
+
+    Returns:
+        AggregateStats with per-project and combined timeseries and stats
+    """
+    if projects == "all":
+        slugs = list(PROJECT_REGISTRY)
+    else:
+        slugs = list(dict.fromkeys(projects.split(",")))
+    unknown = [slug for slug in slugs if get_project_config(slug) is None]
+    if unknown:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Projects not found: {', '.join(unknown)}. Use /api/v1/projects to see available projects.",
+        )
+
+    configs = {slug: get_project_config(slug) for slug in slugs}
+    entry = await get_aggregate_body(configs, days, resolution, limit)
+    return await conditional_response(entry, request.headers)
 
 
 @app.get("/api/v1/{project_slug}/stats", response_model=AllStats)
 async def get_project_stats(
+    request: Request,
     project_slug: str,
     days: int = Query(
         default=30,
@@ -86,15 +307,36 @@ async def get_project_stats(
         le=3650,
         description="Number of days to fetch data for (0 for lifetime)",
     ),
+    resolution: Resolution | None = Query(
+        default=None,
+        description="Timeseries rollup: hour, day, week, month, or auto (coarsest tier that still gives enough points); defaults to day",
+    ),
+    limit: int | None = Query(
+        default=None,
+        ge=1,
+        le=1000,
+        description='Maximum entries per breakdown; the rest are summed into one "(other)" entry (all entries if omitted)',
+    ),
+    timeout_ms: int | None = Query(
+        default=None,
+        ge=0,
+        le=60000,
+        description="Latency budget in milliseconds: live data not ready by then is left out and its sections marked partial (0 for none; defaults to REQUEST_TIMEOUT_MS)",
+    ),
 ):
     """
     Get unified analytics stats for a specific project.
 
-    Combines Vercel migration data with live PostHog data.
+    Combines Vercel migration data with live PostHog data. Responses are
+    cached in-process (see RESPONSE_CACHE_* settings) and carry an ETag;
+    a matching If-None-Match is answered with 304.
 
     Args:
         project_slug: The URL slug of the project (e.g., "portfolio", "blog")
         days: Number of days to look back (1-365, default: 30)
+        resolution: Timeseries rollup tier, "auto", or None for daily buckets
+        limit: Maximum entries per breakdown (None for all)
+        timeout_ms: Latency budget of a rebuild (None for the server default)
 
     Returns:
         AllStats object containing merged timeseries and breakdown stats
@@ -107,61 +349,64 @@ async def get_project_stats(
             detail=f"Project '{project_slug}' not found. Use /api/v1/projects to see available projects.",
         )
 
-    ph_id = config["ph_id"]
-    cf_site_tag = config.get("cf_site_tag", "")
-    vercel_file = config["vercel_file"]
-    analytics_provider = config.get("analytics_provider", "posthog")
+    entry = await get_stats_body(
+        project_slug, config, days, resolution, limit, timeout_ms
+    )
+    return await conditional_response(entry, request.headers)
 
-    # 1. Load Vercel migration data and filter by days
-    vercel_data = load_vercel_data(vercel_file)
-    if vercel_data is None:
-        vercel_data = get_empty_stats()
 
-    # Filter Vercel data to match the requested day range (days=0 means lifetime/no filter)
-    filter_days = days if days > 0 else None
-    filtered_vercel_timeseries = filter_timeseries_by_date(
-        vercel_data.timeseries, filter_days
-    )
-    filtered_vercel_stats = filter_stats_by_date(vercel_data.stats, filter_days)
+@app.get("/api/v1/{project_slug}/bundle", response_model=StatsBundle)
+async def get_project_bundle(
+    request: Request,
+    project_slug: str,
+    periods: str = Query(
+        default="7,30,90,0",
+        pattern=r"^\d+(,\d+)*$",
+        description="Comma-separated periods in days (0 for lifetime), at most 10",
+    ),
+    resolution: Resolution | None = Query(
+        default=None,
+        description="Timeseries rollup: hour, day, week, month, or auto (coarsest tier that still gives enough points); defaults to day",
+    ),
+    limit: int | None = Query(
+        default=None,
+        ge=1,
+        le=1000,
+        description='Maximum entries per breakdown; the rest are summed into one "(other)" entry (all entries if omitted)',
+    ),
+):
+    """
+    Get unified analytics stats for several periods of a project at once.
 
-    # 2. Fetch live analytics data based on provider
-    live_timeseries = []
-    live_breakdowns = {}
+    The live data of the widest period is fetched once and every period is
+    sliced from it, so switching periods on the dashboard needs no further
+    requests.
 
-    # For lifetime (days=0), use a large value for queries
-    query_days = days if days > 0 else 3650  # ~10 years for lifetime
+    Args:
+        project_slug: The URL slug of the project
+        periods: Comma-separated numbers of days (0 for lifetime)
+        resolution: Timeseries rollup tier, "auto", or None for daily buckets
+        limit: Maximum entries per breakdown (None for all)
 
-    if analytics_provider == "cloudflare" and cf_site_tag:
-        # Fetch from Cloudflare Web Analytics
-        ts_task = fetch_cf_timeseries(cf_site_tag, query_days)
-        breakdowns_task = fetch_cf_all_breakdowns(cf_site_tag, query_days)
-        live_timeseries, live_breakdowns = await asyncio.gather(
-            ts_task, breakdowns_task
-        )
-    elif ph_id:
-        # Fetch from PostHog
-        ts_task = fetch_timeseries(ph_id, query_days)
-        breakdowns_task = fetch_all_breakdowns(ph_id, query_days)
-        live_timeseries, live_breakdowns = await asyncio.gather(
-            ts_task, breakdowns_task
+    Returns:
+        StatsBundle with the timeseries and breakdown stats of each period
+    """
+    config = get_project_or_404(project_slug)
+
+    days_list = list(dict.fromkeys(int(days) for days in periods.split(",")))
+    if len(days_list) > 10 or any(days > 3650 for days in days_list):
+        raise HTTPException(
+            status_code=422,
+            detail="At most 10 periods, each between 0 and 3650 days.",
         )
 
-    # 3. Merge Vercel and live data
-    merged_timeseries = merge_timeseries(filtered_vercel_timeseries, live_timeseries)
-    merged_stats = merge_stats(filtered_vercel_stats, live_breakdowns)
-
-    # 4. Build unified response
-    return AllStats(
-        metadata=Metadata(
-            export_date=datetime.now(timezone.utc), source=f"unified_{project_slug}"
-        ),
-        timeseries=merged_timeseries,
-        stats=merged_stats,
-    )
+    entry = await get_bundle_body(project_slug, config, days_list, resolution, limit)
+    return await conditional_response(entry, request.headers)
 
 
 @app.get("/api/v1/{project_slug}/timeseries")
 async def get_project_timeseries(
+    request: Request,
     project_slug: str,
     days: int = Query(
         default=30,
@@ -169,6 +414,16 @@ async def get_project_timeseries(
         le=3650,
         description="Number of days to fetch data for (0 for lifetime)",
     ),
+    resolution: Resolution | None = Query(
+        default=None,
+        description="Timeseries rollup: hour, day, week, month, or auto (coarsest tier that still gives enough points); defaults to day",
+    ),
+    timeout_ms: int | None = Query(
+        default=None,
+        ge=0,
+        le=60000,
+        description="Latency budget in milliseconds: live data not ready by then is left out and its sections marked partial (0 for none; defaults to REQUEST_TIMEOUT_MS)",
+    ),
 ):
     """
     Get only timeseries data for a specific project.
@@ -181,33 +436,10 @@ async def get_project_timeseries(
             status_code=404, detail=f"Project '{project_slug}' not found."
         )
 
-    ph_id = config["ph_id"]
-    cf_site_tag = config.get("cf_site_tag", "")
-    vercel_file = config["vercel_file"]
-    analytics_provider = config.get("analytics_provider", "posthog")
-
-    # Load Vercel data and filter by days (days=0 means lifetime/no filter)
-    filter_days = days if days > 0 else None
-    vercel_data = load_vercel_data(vercel_file)
-    vercel_ts = (
-        filter_timeseries_by_date(vercel_data.timeseries, filter_days)
-        if vercel_data
-        else []
+    entry = await get_timeseries_body(
+        project_slug, config, days, resolution, timeout_ms
     )
-
-    # Fetch live timeseries based on provider
-    live_ts = []
-    query_days = days if days > 0 else 3650  # ~10 years for lifetime
-
-    if analytics_provider == "cloudflare" and cf_site_tag:
-        live_ts = await fetch_cf_timeseries(cf_site_tag, query_days)
-    elif ph_id:
-        live_ts = await fetch_timeseries(ph_id, query_days)
-
-    # Merge and return
-    merged = merge_timeseries(vercel_ts, live_ts)
-
-    return {"project": project_slug, "days": days, "timeseries": merged}
+    return await conditional_response(entry, request.headers)
 
 
 # --- MAIN ENTRY POINT ---
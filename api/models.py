@@ -14,6 +14,13 @@ class Metadata(BaseModel):
 
     export_date: datetime
     source: str
+    # Set when the live data could not be refreshed and an older response
+    # is served instead; data_age is its age in seconds (None if unknown)
+    degraded: bool = False
+    data_age: float | None = None
+    # Set when the response was cut short by its deadline (timeout_ms):
+    # section name ("timeseries" or a breakdown) -> "complete" or "partial"
+    sections: dict[str, str] | None = None
 
 
 class TimeseriesEntry(BaseModel):
@@ -53,6 +60,29 @@ class AllStats(BaseModel):
     stats: Stats
 
 
+class PeriodStats(BaseModel):
+    """Timeseries and breakdowns of one period or project (AllStats without metadata)."""
+
+    timeseries: list[TimeseriesEntry]
+    stats: Stats
+
+
+class StatsBundle(BaseModel):
+    """Stats of several periods, keyed by days ("0" for lifetime)."""
+
+    metadata: Metadata
+    periods: dict[str, PeriodStats]
+
+
+class AggregateStats(BaseModel):
+    """Stats of several projects, and combined across them."""
+
+    metadata: Metadata
+    resolution: str
+    projects: dict[str, PeriodStats]
+    combined: PeriodStats
+
+
 class ProjectInfo(BaseModel):
     """Information about an available project."""
 
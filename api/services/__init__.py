@@ -5,31 +5,162 @@ from .posthog import (
     fetch_timeseries,
     fetch_breakdown,
     fetch_all_breakdowns,
+    fetch_batched,
+    fetch_posthog_stats,
+    fetch_daily_rows,
 )
 from .cloudflare import (
     fetch_cf_timeseries,
-    fetch_cf_all_breakdowns,
+    fetch_cf_stats,
+    fetch_cf_daily_rows,
+    fetch_cf_daily_rows_batch,
 )
 from .vercel import (
     load_vercel_data,
+    load_vercel_dataset,
+    preload_vercel_data,
+    is_vercel_data_ready,
+    clear_vercel_cache,
     get_empty_stats,
     filter_timeseries_by_date,
     filter_stats_by_date,
+    filter_dataset_timeseries,
+    dataset_stat_totals,
+    timeseries_window,
+    timeseries_extent,
+    VercelDataset,
+)
+from .rollup import Resolution, choose_resolution
+from .clients import start_clients, close_clients, pool_stats
+from .breaker import CircuitBreaker, CircuitOpenError, get_breaker, breaker_stats
+from .singleflight import upstream_flights, coalesce
+from .metrics import (
+    metrics,
+    timed,
+    MetricsMiddleware,
+    METRICS_ENABLED,
+    METRICS_CONTENT_TYPE,
+)
+from .cache import response_cache, CacheEntry, PartialBody, body_etag
+from .deadline import request_deadline, REQUEST_TIMEOUT_MS
+from .executor import cpu_executor, loop_lag_monitor
+from .compression import compressor
+from .packing import pack_live_data, unpack_live_data
+from .records import TimeseriesRecord, StatRecord
+from .serialization import dumps, FastJSONResponse, etag_matches, conditional_response
+from .stats import (
+    assemble_project_stats,
+    assemble_project_timeseries,
+    build_stats_body,
+    build_timeseries_body,
+    get_stats_body,
+    get_timeseries_body,
+    refresh_stats_body,
+    build_bundle_body,
+    get_bundle_body,
+    fetch_periods_window,
+    fetch_live_stats,
+    fetch_live_timeseries,
+    fetch_live_breakdowns,
+)
+from .livestore import live_store, LIVE_STORE_ENABLED
+from .window import live_windows, LiveWindow
+from .aggregate import build_aggregate_body, get_aggregate_body
+from .prewarm import prewarm_scheduler, PREWARM_ENABLED
+from .merger import (
+    merge_stat_lists,
+    merge_timeseries,
+    merge_stats,
+    merge_stat_totals,
+    sum_stat_totals,
+    format_stat_totals,
+    OTHER_KEY,
 )
-from .merger import merge_stat_lists, merge_timeseries, merge_stats
 
 __all__ = [
     "query_posthog",
     "fetch_timeseries",
     "fetch_breakdown",
     "fetch_all_breakdowns",
+    "fetch_batched",
+    "fetch_posthog_stats",
+    "fetch_daily_rows",
     "fetch_cf_timeseries",
-    "fetch_cf_all_breakdowns",
+    "fetch_cf_stats",
+    "fetch_cf_daily_rows",
+    "fetch_cf_daily_rows_batch",
     "load_vercel_data",
+    "load_vercel_dataset",
+    "preload_vercel_data",
+    "is_vercel_data_ready",
+    "clear_vercel_cache",
     "get_empty_stats",
     "filter_timeseries_by_date",
     "filter_stats_by_date",
+    "filter_dataset_timeseries",
+    "dataset_stat_totals",
+    "timeseries_window",
+    "timeseries_extent",
+    "VercelDataset",
+    "Resolution",
+    "choose_resolution",
+    "start_clients",
+    "close_clients",
+    "pool_stats",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "get_breaker",
+    "breaker_stats",
+    "upstream_flights",
+    "coalesce",
+    "metrics",
+    "timed",
+    "MetricsMiddleware",
+    "METRICS_ENABLED",
+    "METRICS_CONTENT_TYPE",
+    "response_cache",
+    "CacheEntry",
+    "PartialBody",
+    "body_etag",
+    "request_deadline",
+    "REQUEST_TIMEOUT_MS",
+    "cpu_executor",
+    "loop_lag_monitor",
+    "compressor",
+    "pack_live_data",
+    "unpack_live_data",
+    "TimeseriesRecord",
+    "StatRecord",
+    "dumps",
+    "FastJSONResponse",
+    "etag_matches",
+    "conditional_response",
+    "assemble_project_stats",
+    "assemble_project_timeseries",
+    "build_stats_body",
+    "build_timeseries_body",
+    "get_stats_body",
+    "get_timeseries_body",
+    "build_bundle_body",
+    "get_bundle_body",
+    "fetch_periods_window",
+    "refresh_stats_body",
+    "fetch_live_stats",
+    "fetch_live_timeseries",
+    "fetch_live_breakdowns",
+    "live_store",
+    "LIVE_STORE_ENABLED",
+    "live_windows",
+    "build_aggregate_body",
+    "get_aggregate_body",
+    "LiveWindow",
+    "prewarm_scheduler",
+    "PREWARM_ENABLED",
     "merge_stat_lists",
     "merge_timeseries",
     "merge_stats",
+    "merge_stat_totals",
+    "sum_stat_totals",
+    "format_stat_totals",
+    "OTHER_KEY",
 ]
@@ -0,0 +1,164 @@
+"""
+Cross-Project Aggregates
+
+Combines several projects into one response: every project's timeseries
+and breakdowns, plus combined ones across all of them. The live data of
+each project is gathered concurrently, through the same caches /stats uses
+(live windows, live store, coalesced upstream fetches), bounded by one
+semaphore shared by all aggregate requests; the live store rows are synced
+for all projects first, in batched upstream queries where the provider
+supports them. Merging runs in the CPU executor, and the combined results
+are N-way merges of the per-project ones (breakdowns are summed before the
+top-`limit` cut).
+"""
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .cache import CacheEntry, response_cache
+from .executor import cpu_executor
+from .merger import format_stat_totals, merge_timeseries, sum_stat_totals
+from .rollup import choose_resolution
+from .stats import (
+    build_stat_totals,
+    build_timeseries,
+    cached_live_window,
+    data_bounds,
+    gather_live_stats,
+    live_upstreams,
+    lookback_days,
+    resolve_resolution,
+    serialize_response,
+    sync_live_projects,
+    unpack_live_stats,
+)
+from .vercel import load_vercel_dataset
+from .window import LiveWindow
+
+# Maximum number of projects gathered concurrently, across all requests
+AGGREGATE_CONCURRENCY = int(os.getenv("AGGREGATE_CONCURRENCY", "4"))
+
+# First element of aggregate response cache keys (project keys use the slug)
+AGGREGATE_KEY = "*"
+
+_semaphore = asyncio.Semaphore(AGGREGATE_CONCURRENCY)
+
+
+def _aggregate_body_job(
+    projects: list[tuple[str, Path, bytes | tuple | LiveWindow]],
+    days: int,
+    resolution: str | None,
+    limit: int | None,
+) -> bytes:
+    # Runs in the CPU executor
+    loaded = []
+    for slug, vercel_file, live in projects:
+        live_timeseries, live_breakdowns = unpack_live_stats(live, days)
+        loaded.append(
+            (slug, load_vercel_dataset(vercel_file), live_timeseries, live_breakdowns)
+        )
+
+    # One tier for every project, so the combined timeseries lines up; for
+    # lifetime `auto`, from the span of all projects' data
+    if resolution == "auto" and days <= 0:
+        bounds = [
+            bound
+            for _, vercel_data, live_timeseries, _ in loaded
+            for bound in data_bounds(vercel_data, live_timeseries)
+        ]
+        tier = choose_resolution(max(bounds) - min(bounds) if bounds else 0)
+    else:
+        tier = resolve_resolution(resolution, days, None, [])
+
+    per_project = {}
+    timeseries_lists = []
+    totals_list = []
+    for slug, vercel_data, live_timeseries, live_breakdowns in loaded:
+        timeseries, _ = build_timeseries(vercel_data, days, live_timeseries, tier)
+        totals = build_stat_totals(vercel_data, days, live_breakdowns)
+        per_project[slug] = {
+            "timeseries": timeseries,
+            "stats": format_stat_totals(totals, limit),
+        }
+        timeseries_lists.append(timeseries)
+        totals_list.append(totals)
+
+    return serialize_response(
+        {
+            "metadata": {
+                "export_date": datetime.now(timezone.utc),
+                "source": "unified_aggregate",
+            },
+            "resolution": tier,
+            "projects": per_project,
+            "combined": {
+                "timeseries": merge_timeseries(*timeseries_lists, resolution=tier),
+                "stats": format_stat_totals(sum_stat_totals(*totals_list), limit),
+            },
+        }
+    )
+
+
+async def build_aggregate_body(
+    projects: dict[str, dict],
+    days: int,
+    resolution: str | None = None,
+    limit: int | None = None,
+) -> bytes:
+    """
+    Serialized stats of several projects and their combination.
+
+    Args:
+        projects: Project slug -> registry entry
+        days: Number of days to look back (0 for lifetime)
+        resolution: Timeseries resolution ("auto", a rollup tier, or None
+            for daily buckets), the same for every project
+        limit: Maximum number of entries per breakdown (None for all); the
+            rest are summed into one "(other)" entry
+
+    Returns:
+        The serialized AggregateStats
+    """
+
+    async def gather(config: dict) -> bytes | tuple | LiveWindow:
+        async with _semaphore:
+            return await gather_live_stats(config, days)
+
+    # Sync the projects without a cached window together first (batched
+    # upstream queries), so each one below reads its rows locally
+    await sync_live_projects(
+        config
+        for config in projects.values()
+        if cached_live_window(config, lookback_days(days)) is None
+    )
+    lives = await asyncio.gather(*(gather(config) for config in projects.values()))
+    return await cpu_executor.run(
+        _aggregate_body_job,
+        [
+            (slug, config["vercel_file"], live)
+            for (slug, config), live in zip(projects.items(), lives)
+        ],
+        days,
+        resolution,
+        limit,
+    )
+
+
+async def get_aggregate_body(
+    projects: dict[str, dict],
+    days: int,
+    resolution: str | None = None,
+    limit: int | None = None,
+) -> CacheEntry:
+    """Serialized build_aggregate_body() response and its ETag, served from the cache."""
+
+    async def compute() -> bytes:
+        return await build_aggregate_body(projects, days, resolution, limit)
+
+    return await response_cache.get_or_compute(
+        (AGGREGATE_KEY, "aggregate", tuple(projects), days, resolution, limit),
+        compute,
+        live_upstreams(*projects.values()),
+    )
@@ -0,0 +1,291 @@
+"""
+Upstream Circuit Breakers
+
+One circuit breaker per upstream (PostHog, Cloudflare). After
+BREAKER_FAILURE_THRESHOLD consecutive failed requests (transport errors,
+timeouts, 429 or 5xx responses) the breaker opens and requests fail
+immediately with CircuitOpenError instead of each waiting out the HTTP
+timeout. After BREAKER_RESET_TIMEOUT seconds it half-opens: one trial
+request goes through, and closes the breaker again if it succeeds. A trial
+that ends without an outcome (cancelled, or failing on something other
+than the upstream) is released, so the next request becomes the trial.
+
+Idempotent requests are retried up to UPSTREAM_RETRIES times on transient
+errors, with jittered exponential backoff. A response whose computation
+saw one of its upstream requests fail is not cached; the last good response
+is served instead, marked as degraded (see cache.py). Failures are tracked
+per computation, so one project's failed request doesn't mark concurrent
+healthy computations as degraded.
+"""
+
+import asyncio
+import os
+import random
+import time
+import weakref
+from collections.abc import Coroutine, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from .metrics import metrics
+
+# Consecutive failed requests that open a breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# Seconds an open breaker rejects requests before letting a trial through
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# Retries of an idempotent request after a transient error
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+# Base delay of the retry backoff in seconds (doubled on every retry)
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.25"))
+
+# Response statuses counted as upstream failures (and retried)
+FAILURE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Upstreams whose requests failed in the current computation (see track_failures())
+_failed_upstreams: ContextVar[set[str] | None] = ContextVar(
+    "failed_upstreams", default=None
+)
+# Failed upstreams of the tasks started by start_tracked()
+_task_failures: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+@contextmanager
+def track_failures() -> Iterator[set[str]]:
+    """
+    Collect the upstreams whose requests fail in the current context, and
+    in the tasks it starts meanwhile (they copy the context, so they share
+    the set, also after the block ends).
+
+    Yields:
+        The set the failed upstreams are added to
+    """
+    failed: set[str] = set()
+    token = _failed_upstreams.set(failed)
+    try:
+        yield failed
+    finally:
+        _failed_upstreams.reset(token)
+
+
+def note_failures(upstreams: Iterable[str]) -> None:
+    """Add failed upstreams to the current computation's set, if it has one."""
+    failed = _failed_upstreams.get()
+    if failed is not None:
+        failed.update(upstreams)
+
+
+async def _tracked(coro: Coroutine, failed: set[str]):
+    _failed_upstreams.set(failed)
+    return await coro
+
+
+def start_tracked(coro: Coroutine) -> asyncio.Task:
+    """
+    Run a coroutine shared by several computations as a task with its own
+    failure set, instead of the one of the computation that started it.
+    Every computation awaiting it adds its failures with collect_failures().
+    """
+    failed: set[str] = set()
+    task = asyncio.create_task(_tracked(coro, failed))
+    _task_failures[task] = failed
+    return task
+
+
+def collect_failures(task: asyncio.Task) -> None:
+    """Add the failed upstreams of a start_tracked() task to the current computation."""
+    note_failures(_task_failures.get(task, ()))
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of sending a request while an upstream's breaker is open."""
+
+
+def retryable(error: httpx.HTTPError) -> bool:
+    """
+    Whether a failed request may be retried.
+
+    Read timeouts are not: the upstream is slow, and retrying would multiply
+    both the wait and its load.
+    """
+    return isinstance(error, httpx.TransportError) and not isinstance(
+        error, httpx.ReadTimeout
+    )
+
+
+def retry_delay(attempt: int) -> float:
+    """Jittered backoff before retry number `attempt` (0-based), in seconds."""
+    return random.uniform(0, UPSTREAM_RETRY_BACKOFF * 2**attempt)
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker of one upstream.
+
+    Args:
+        name: Upstream name ("posthog" or "cloudflare")
+        failure_threshold: Consecutive failures that open the breaker
+        reset_timeout: Seconds the breaker stays open before a trial request
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.counters = {
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rejected": 0,
+            "opened": 0,
+        }
+
+    @property
+    def state(self) -> str:
+        """CLOSED, OPEN, or HALF_OPEN once the reset timeout has passed."""
+        if (
+            self._state == OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Whether requests are currently rejected without a trial."""
+        return self.state == OPEN
+
+    def allow(self) -> bool:
+        """
+        Whether a request may be sent now. In the half-open state, only
+        one trial request is let through at a time.
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial_in_flight:
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+        self.counters["rejected"] += 1
+        note_failures((self.name,))
+        return False
+
+    def release(self) -> None:
+        """
+        End the half-open trial, whatever its outcome: one that was cancelled
+        or failed on something other than the upstream leaves the breaker
+        half-open for the next request to try.
+        """
+        self._trial_in_flight = False
+
+    def check(self) -> bool:
+        """
+        Returns:
+            Whether the request is the half-open trial (release() it once
+            the request is done)
+
+        Raises:
+            CircuitOpenError: If a request may not be sent now
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        return self._state == HALF_OPEN
+
+    def record_success(self) -> None:
+        self.counters["successes"] += 1
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+        self._state = CLOSED
+
+    def record_failure(self) -> None:
+        self.counters["failures"] += 1
+        self._consecutive_failures += 1
+        self._trial_in_flight = False
+        note_failures((self.name,))
+        if (
+            self._state == HALF_OPEN
+            or self._consecutive_failures >= self.failure_threshold
+        ):
+            if self._state != OPEN:
+                self.counters["opened"] += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        """State, counters and settings of the breaker."""
+        open_for = (
+            round(time.monotonic() - self._opened_at, 1)
+            if self._state != CLOSED
+            else None
+        )
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "open_for": open_for,
+            **self.counters,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+        }
+
+
+upstream_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """The circuit breaker of an upstream, created on first use."""
+    breaker = upstream_breakers.get(upstream)
+    if breaker is None:
+        breaker = upstream_breakers[upstream] = CircuitBreaker(
+            upstream, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT
+        )
+    return breaker
+
+
+def upstreams_open(upstreams: Iterable[str]) -> bool:
+    """Whether any of the upstreams' breakers is open."""
+    return any(get_breaker(upstream).is_open for upstream in upstreams)
+
+
+# Breaker states as /metrics gauge values
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+metrics.callback(
+    "analytics_upstream_breaker_state",
+    "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)",
+    "gauge",
+    lambda: [
+        ((name,), STATE_VALUES[breaker.state])
+        for name, breaker in upstream_breakers.items()
+    ],
+    ("upstream",),
+)
+metrics.callback(
+    "analytics_upstream_breaker_events_total",
+    "Circuit breaker successes, failures, retries, rejections and openings",
+    "counter",
+    lambda: [
+        ((name, event), count)
+        for name, breaker in upstream_breakers.items()
+        for event, count in breaker.counters.items()
+    ],
+    ("upstream", "event"),
+)
+
+
+def breaker_stats() -> dict:
+    """Breaker state and counters of every upstream, plus the retry settings."""
+    return {
+        "retries": UPSTREAM_RETRIES,
+        "retry_backoff": UPSTREAM_RETRY_BACKOFF,
+        "upstreams": {
+            name: breaker.stats() for name, breaker in upstream_breakers.items()
+        },
+    }
@@ -0,0 +1,411 @@
+"""
+Response Cache
+
+In-process LRU cache of serialized API responses with a TTL and
+stale-while-revalidate: a fresh entry is served as-is, a stale one is
+served immediately while a background task recomputes it, and memory is
+bounded by the total size of the cached bodies in bytes. Every entry
+carries an ETag computed once when it is stored, so conditional requests
+are answered without touching the body, and keeps the compressed variants
+of its body (see compression.py), which count towards the memory bound.
+
+Responses built from upstream data are never cached when one of their own
+upstream calls failed: the last good response of the key is served instead
+(however old), marked as degraded with its age, and while an upstream's
+circuit breaker is open its stale responses are served that way without
+recomputing them (see breaker.py). Likewise, a response cut short by its
+request's deadline is sent uncached, and the complete one is stored once
+its live data arrives (see deadline.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+
+from .breaker import track_failures, upstreams_open
+from .metrics import metrics
+
+# Seconds an entry is served without revalidation
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# Extra seconds a stale entry may be served while it is refreshed
+RESPONSE_CACHE_STALE_TTL = float(os.getenv("RESPONSE_CACHE_STALE_TTL", "600"))
+# Upper bound on the total size of cached bodies
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 << 20)))
+# Cache-Control lifetimes sent to browsers/CDNs (default: the cache's own)
+CACHE_CONTROL_MAX_AGE = int(os.getenv("CACHE_CONTROL_MAX_AGE", RESPONSE_CACHE_TTL))
+CACHE_CONTROL_STALE = int(os.getenv("CACHE_CONTROL_STALE", RESPONSE_CACHE_STALE_TTL))
+CACHE_CONTROL = (
+    f"public, max-age={CACHE_CONTROL_MAX_AGE}, "
+    f"stale-while-revalidate={CACHE_CONTROL_STALE}"
+)
+
+
+def body_etag(body: bytes) -> str:
+    """
+    Strong ETag of a response body (a short BLAKE2b hash of all of its
+    bytes, quoted), so two different bodies never share an ETag.
+    """
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def annotate_body(body: bytes, fields: dict) -> bytes:
+    """
+    Add fields to a serialized response body: into its metadata object if
+    it starts with one, otherwise at the top level.
+    """
+    marker = json.dumps(fields, separators=(",", ":")).encode()[1:-1]
+    prefix = b'{"metadata":{' if body.startswith(b'{"metadata":{') else b"{"
+    rest = body[len(prefix) :]
+    return prefix + marker + (b"," if rest[:1] not in (b"}", b"") else b"") + rest
+
+
+def mark_degraded(body: bytes, data_age: float | None) -> bytes:
+    """Add "degraded": true and "data_age" (seconds, or null if unknown) to a body."""
+    return annotate_body(
+        body,
+        {
+            "degraded": True,
+            "data_age": None if data_age is None else round(data_age, 1),
+        },
+    )
+
+
+@dataclass(slots=True)
+class PartialBody:
+    """
+    A body built before all of its data arrived (returned by a compute
+    function instead of bytes), and the awaitable producing the complete
+    body.
+    """
+
+    body: bytes
+    complete: Awaitable[bytes]
+
+
+class CacheEntry:
+    """A cached response body, its compressed variants and bookkeeping."""
+
+    __slots__ = ("body", "etag", "encodings", "created", "size", "refreshing", "owner")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = body_etag(body)
+        self.encodings: dict[str, bytes] = {}
+        self.created = time.monotonic()
+        self.size = len(body) + sys.getsizeof(self)
+        self.refreshing = False
+        # The cache holding this entry, if any (for size accounting)
+        self.owner: ResponseCache | None = None
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def add_encoding(self, encoding: str, data: bytes) -> None:
+        """Keep the body compressed with an encoding (e.g. "gzip")."""
+        if encoding in self.encodings:
+            return
+        self.encodings[encoding] = data
+        self.size += len(data)
+        if self.owner is not None:
+            self.owner._grow(len(data))
+
+    def degraded(self, data_age: float | None) -> "CacheEntry":
+        """
+        An uncached copy of this entry marked as degraded (see
+        mark_degraded()); its ETag is that of the marked body, so clients
+        holding the normal response receive the marker.
+        """
+        return CacheEntry(mark_degraded(self.body, data_age))
+
+
+class ResponseCache:
+    """
+    LRU cache of response bodies with TTL and stale-while-revalidate.
+
+    Args:
+        ttl: Seconds an entry is fresh (0 disables the cache)
+        stale_ttl: Seconds past the TTL a stale entry may still be served
+        max_bytes: Upper bound on the total size of cached entries
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._refresh_tasks: set[asyncio.Task] = set()
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "evictions": 0,
+            "degraded": 0,
+            "fallbacks": 0,
+            "partial": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[bytes | PartialBody]],
+        upstreams: Iterable[str] = (),
+    ) -> CacheEntry:
+        """
+        Return the cached entry for a key, computing it on a miss.
+
+        Args:
+            key: Cache key, e.g. (project_slug, endpoint, days)
+            compute: Coroutine factory producing the serialized body (or a
+                PartialBody, see recompute())
+            upstreams: Upstreams the body is built from (see recompute())
+
+        Returns:
+            The entry holding the response body and its ETag (a degraded
+            or partial copy when the upstreams are failing or slow)
+        """
+        upstreams = tuple(upstreams)
+        if not self.enabled:
+            return await self.recompute(key, compute, upstreams)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = entry.age
+            if age < self.ttl:
+                self.counters["hits"] += 1
+                self._entries.move_to_end(key)
+                return entry
+            if upstreams_open(upstreams):
+                # Fail fast to the last good response instead of
+                # recomputing from an upstream known to be down
+                self.counters["fallbacks"] += 1
+                self._entries.move_to_end(key)
+                return entry.degraded(age)
+            if age < self.ttl + self.stale_ttl:
+                self.counters["stale_hits"] += 1
+                self._entries.move_to_end(key)
+                if not entry.refreshing:
+                    entry.refreshing = True
+                    task = asyncio.create_task(
+                        self._refresh(key, entry, compute, upstreams)
+                    )
+                    self._refresh_tasks.add(task)
+                    task.add_done_callback(self._refresh_tasks.discard)
+                return entry
+
+        self.counters["misses"] += 1
+        return await self.recompute(key, compute, upstreams)
+
+    async def recompute(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[bytes | PartialBody]],
+        upstreams: Iterable[str] = (),
+    ) -> CacheEntry:
+        """
+        Compute a body and store it, unless an upstream call failed meanwhile.
+
+        Failed (or rejected) calls to the upstreams are tracked for this
+        computation only, including the shared fetches it awaits (see
+        breaker.track_failures()). If one failed, the body is likely missing
+        live data: it is not stored, and the last good entry of the key is
+        returned as degraded instead, if there is one.
+
+        A PartialBody (cut short by a deadline) is returned uncached, and
+        its complete body is stored in the background once it is ready.
+
+        Args:
+            key: Cache key
+            compute: Coroutine factory producing the serialized body or a
+                PartialBody
+            upstreams: Upstreams the body is built from ("posthog",
+                "cloudflare")
+
+        Returns:
+            The stored entry, or an uncached partial entry, or a degraded
+            copy of the last good entry or of the new body
+        """
+        upstreams = tuple(upstreams)
+        with track_failures() as failed:
+            body = await compute()
+            if isinstance(body, PartialBody):
+                self.counters["partial"] += 1
+                # Started while tracking, so its fetches (and the completion
+                # itself) keep adding their failures to `failed`
+                task = asyncio.create_task(
+                    self._complete(key, body.complete, upstreams, failed)
+                )
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+                return CacheEntry(body.body)
+        return self._store(key, body, upstreams, failed)
+
+    async def _complete(
+        self,
+        key: Hashable,
+        complete: Awaitable[bytes],
+        upstreams: tuple[str, ...],
+        failed: set[str],
+    ) -> None:
+        """Store the complete body of a partial response once it is ready."""
+        try:
+            self._store(key, await complete, upstreams, failed)
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            print(f"Error completing cached response {key}: {e}")
+
+    def _store(
+        self, key: Hashable, body: bytes, upstreams: tuple[str, ...], failed: set[str]
+    ) -> CacheEntry:
+        """Store a body whose computation saw the `failed` upstreams fail (see recompute())."""
+        if failed.isdisjoint(upstreams):
+            return self.set(key, body)
+
+        self.counters["degraded"] += 1
+        last = self._entries.get(key)
+        if last is not None:
+            self.counters["fallbacks"] += 1
+            return last.degraded(last.age)
+        return CacheEntry(body).degraded(None)
+
+    async def _refresh(
+        self,
+        key: Hashable,
+        entry: CacheEntry,
+        compute: Callable[[], Awaitable[bytes]],
+        upstreams: tuple[str, ...],
+    ) -> None:
+        """Recompute a stale entry in the background."""
+        try:
+            await self.recompute(key, compute, upstreams)
+        except Exception as e:
+            self.counters["refresh_errors"] += 1
+            print(f"Error refreshing cached response {key}: {e}")
+            return
+        finally:
+            entry.refreshing = False
+        self.counters["refreshes"] += 1
+
+    def set(self, key: Hashable, body: bytes) -> CacheEntry:
+        """
+        Store a body, evicting least recently used entries to fit.
+
+        Returns:
+            The new entry (returned but not stored if the cache is disabled
+            or the body alone exceeds max_bytes)
+        """
+        entry = CacheEntry(body)
+        if not self.enabled:
+            return entry
+
+        self.delete(key)
+        if entry.size > self.max_bytes:
+            return entry
+
+        self._entries[key] = entry
+        entry.owner = self
+        self._grow(entry.size)
+        return entry
+
+    def _grow(self, size: int) -> None:
+        """Account for added bytes, evicting least recently used entries to fit."""
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            evicted.owner = None
+            self._bytes -= evicted.size
+            self.counters["evictions"] += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Remove one entry if present."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.owner = None
+            self._bytes -= entry.size
+
+    def purge(self, predicate: Callable[[Hashable], bool] | None = None) -> int:
+        """
+        Remove every entry, or only those whose key matches a predicate.
+
+        Returns:
+            Number of entries removed
+        """
+        keys = [k for k in self._entries if predicate is None or predicate(k)]
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+    def stats(self) -> dict:
+        """Counters, hit ratio and memory usage of the cache."""
+        lookups = sum(self.counters[name] for name in ("hits", "stale_hits", "misses"))
+        served = self.counters["hits"] + self.counters["stale_hits"]
+        return {
+            **self.counters,
+            "hit_ratio": served / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "stale_ttl": self.stale_ttl,
+        }
+
+
+# Shared cache for /stats and /timeseries responses
+response_cache = ResponseCache(
+    ttl=RESPONSE_CACHE_TTL,
+    stale_ttl=RESPONSE_CACHE_STALE_TTL,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+)
+
+# Cache lookup results, as counted by get_or_compute()
+LOOKUP_RESULTS = ("hits", "stale_hits", "misses")
+
+metrics.callback(
+    "analytics_cache_lookups_total",
+    "Response cache lookups by result (hits, stale_hits, misses)",
+    "counter",
+    lambda: [((name,), response_cache.counters[name]) for name in LOOKUP_RESULTS],
+    ("result",),
+)
+metrics.callback(
+    "analytics_cache_events_total",
+    "Response cache refreshes, evictions, degraded and partial responses",
+    "counter",
+    lambda: [
+        ((name,), count)
+        for name, count in response_cache.counters.items()
+        if name not in LOOKUP_RESULTS
+    ],
+    ("event",),
+)
+metrics.callback(
+    "analytics_cache_hit_ratio",
+    "Share of response cache lookups served from the cache (fresh or stale)",
+    "gauge",
+    lambda: [((), response_cache.stats()["hit_ratio"])],
+)
+metrics.callback(
+    "analytics_cache_bytes",
+    "Memory used by cached response bodies and their compressed variants",
+    "gauge",
+    lambda: [((), response_cache.stats()["bytes"])],
+)
+metrics.callback(
+    "analytics_cache_entries",
+    "Cached responses",
+    "gauge",
+    lambda: [((), response_cache.stats()["entries"])],
+)
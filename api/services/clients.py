@@ -0,0 +1,233 @@
+"""
+Shared HTTP Clients
+
+One long-lived, pooled httpx.AsyncClient per upstream (PostHog, Cloudflare),
+so repeated queries reuse TCP/TLS connections instead of opening a new
+client per call. Clients are created and closed in the FastAPI lifespan.
+Every request goes through the upstream's circuit breaker, and idempotent
+requests are retried on transient errors (see breaker.py). Every attempt's
+latency and outcome is recorded in the /metrics histograms (see metrics.py).
+"""
+
+import asyncio
+import importlib.util
+import os
+import time
+
+import httpx
+
+from .breaker import (
+    FAILURE_STATUSES,
+    UPSTREAM_RETRIES,
+    breaker_stats,
+    get_breaker,
+    retry_delay,
+    retryable,
+)
+from .metrics import metrics
+from .singleflight import upstream_flights
+
+# Connection pool configuration (shared by every upstream client)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+
+UPSTREAMS = ["posthog", "cloudflare"]
+
+_clients: dict[str, httpx.AsyncClient] = {}
+_request_counts: dict[str, dict[str, int]] = {
+    upstream: {"requests": 0, "errors": 0, "in_flight": 0} for upstream in UPSTREAMS
+}
+
+upstream_duration = metrics.histogram(
+    "analytics_upstream_duration_seconds",
+    "Upstream request latency, per attempt",
+    ("upstream",),
+)
+upstream_failures = metrics.counter(
+    "analytics_upstream_errors_total",
+    "Failed upstream request attempts (transport errors, timeouts, 429 and 5xx)",
+    ("upstream",),
+)
+upstream_timeouts = metrics.counter(
+    "analytics_upstream_timeouts_total",
+    "Timed out upstream request attempts",
+    ("upstream",),
+)
+for name in UPSTREAMS:
+    # Export zeros from startup, so rate() works before the first failure
+    upstream_failures.inc(name, amount=0)
+    upstream_timeouts.inc(name, amount=0)
+metrics.callback(
+    "analytics_upstream_in_flight",
+    "Upstream requests currently waiting on a response",
+    "gauge",
+    lambda: [
+        ((name,), counts["in_flight"]) for name, counts in _request_counts.items()
+    ],
+    ("upstream",),
+)
+metrics.callback(
+    "analytics_upstream_coalesced_in_flight",
+    "Coalesced upstream fetches currently in flight",
+    "gauge",
+    lambda: [((), upstream_flights.stats()["in_flight"])],
+)
+
+
+def _http2_available() -> bool:
+    # HTTP/2 needs the optional h2 package (installed via httpx[http2])
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=HTTP_TIMEOUT,
+    )
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    """
+    Get the shared client for an upstream, creating it on first use.
+
+    Args:
+        upstream: Upstream name ("posthog" or "cloudflare")
+
+    Returns:
+        The pooled AsyncClient for that upstream
+    """
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = _clients[upstream] = _create_client()
+    return client
+
+
+async def _send(upstream: str, url: str, **kwargs) -> httpx.Response:
+    """POST once through an upstream's shared client, tracking request counters and metrics."""
+    counts = _request_counts[upstream]
+    counts["requests"] += 1
+    counts["in_flight"] += 1
+    started = time.perf_counter()
+    try:
+        response = await get_client(upstream).post(url, **kwargs)
+    except httpx.HTTPError as e:
+        counts["errors"] += 1
+        upstream_failures.inc(upstream)
+        if isinstance(e, httpx.TimeoutException):
+            upstream_timeouts.inc(upstream)
+        raise
+    finally:
+        counts["in_flight"] -= 1
+        upstream_duration.observe(time.perf_counter() - started, upstream)
+    if response.status_code in FAILURE_STATUSES:
+        upstream_failures.inc(upstream)
+    return response
+
+
+async def post(
+    upstream: str, url: str, *, idempotent: bool = True, **kwargs
+) -> httpx.Response:
+    """
+    POST through an upstream's shared client and circuit breaker.
+
+    Transport errors, 429 and 5xx responses count as failures of the
+    upstream. Idempotent requests (every analytics query is read-only) are
+    retried up to UPSTREAM_RETRIES times on transient errors, after a
+    jittered backoff; read timeouts are not retried.
+
+    Args:
+        upstream: Upstream name ("posthog" or "cloudflare")
+        url: Request URL
+        idempotent: Whether the request may be retried
+        **kwargs: Passed through to AsyncClient.post
+
+    Returns:
+        The HTTP response (of the last attempt)
+
+    Raises:
+        CircuitOpenError: If the upstream's breaker is open
+        httpx.HTTPError: On transport errors (status codes are not checked)
+    """
+    breaker = get_breaker(upstream)
+    retries = UPSTREAM_RETRIES if idempotent else 0
+    for attempt in range(retries + 1):
+        if attempt:
+            breaker.counters["retries"] += 1
+            await asyncio.sleep(retry_delay(attempt - 1))
+        trial = breaker.check()
+        try:
+            response = await _send(upstream, url, **kwargs)
+        except httpx.HTTPError as e:
+            breaker.record_failure()
+            if attempt == retries or not retryable(e):
+                raise
+            continue
+        finally:
+            if trial:
+                # Also when cancelled or failing otherwise, so the breaker
+                # isn't left waiting on a trial that never reports back
+                breaker.release()
+        if response.status_code not in FAILURE_STATUSES:
+            breaker.record_success()
+            return response
+        breaker.record_failure()
+        if attempt == retries:
+            return response
+
+
+async def start_clients() -> None:
+    """Open the shared client of every upstream (called on startup)."""
+    for upstream in UPSTREAMS:
+        get_client(upstream)
+
+
+async def close_clients() -> None:
+    """Close every shared client and its pooled connections (called on shutdown)."""
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def pool_stats() -> dict[str, dict]:
+    """
+    Connection pool statistics for every upstream.
+
+    Returns:
+        Mapping of upstream name to request counters and, when the client is
+        open, the number of pooled connections by state and HTTP version,
+        plus the request coalescing counters
+    """
+    stats = {}
+    for upstream in UPSTREAMS:
+        entry: dict = {**_request_counts[upstream], "open": False}
+        client = _clients.get(upstream)
+        if client is not None and not client.is_closed:
+            entry["open"] = True
+            entry["http2"] = _http2_available()
+            # httpcore's pool is not part of httpx's public API; read it defensively
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            connections = list(getattr(pool, "connections", []))
+            entry["connections"] = len(connections)
+            entry["idle_connections"] = sum(1 for c in connections if c.is_idle())
+            entry["http2_connections"] = sum(
+                1 for c in connections if "HTTP/2" in c.info()
+            )
+        stats[upstream] = entry
+    return {
+        "limits": {
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": HTTP_KEEPALIVE_EXPIRY,
+        },
+        "upstreams": stats,
+        "single_flight": upstream_flights.stats(),
+        "breakers": breaker_stats(),
+    }
@@ -4,11 +4,14 @@ Cloudflare Web Analytics Service Layer
 Handles all interactions with Cloudflare's GraphQL API for RUM (Real User Monitoring) data.
 """
 
+import asyncio
 import os
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import httpx
 
-from models import StatEntry, TimeseriesEntry
+from .records import StatRecord, TimeseriesRecord
+from .clients import post
+from .singleflight import coalesce
 
 
 # Cloudflare API Configuration
@@ -16,6 +19,56 @@ CF_API_TOKEN = os.getenv("CLOUDFLARE_API_TOKEN", "")
 CF_ACCOUNT_TAG = os.getenv("CLOUDFLARE_ACCOUNT_TAG", "")
 CF_API_URL = "https://api.cloudflare.com/client/v4/graphql"
 
+# Map our standard field names to Cloudflare dimensions
+CF_DIMENSIONS = {
+    "path": "requestPath",
+    "os_name": "userAgentOS",
+    "device_type": "userAgentDevice",
+    "referrer": "refererHost",
+    "country": "countryName",
+}
+
+# Alias of the timeseries selection in a combined stats document
+TIMESERIES_ALIAS = "timeseries"
+
+# Maximum number of groups Cloudflare returns for one selection
+CF_GROUP_LIMIT = 5000
+# Ranges longer than this are fetched as daily instead of hourly groups
+CF_HOURLY_MAX_DAYS = int(os.getenv("CF_HOURLY_MAX_DAYS", "30"))
+# Maximum number of timeseries windows fetched concurrently
+CF_WINDOW_CONCURRENCY = int(os.getenv("CF_WINDOW_CONCURRENCY", "4"))
+# Maximum number of site tags batched into one daily rows document
+CF_BATCH_SITES = int(os.getenv("CF_BATCH_SITES", "10"))
+
+
+async def post_graphql(query: str, variables: dict) -> dict:
+    """
+    Execute a GraphQL query, raising on errors instead of returning {}.
+
+    Args:
+        query: The GraphQL query string
+        variables: Query variables
+
+    Returns:
+        The response data (which may still carry GraphQL errors)
+
+    Raises:
+        httpx.HTTPError: If the request fails or returns an error status
+    """
+    headers = {
+        "Authorization": f"Bearer {CF_API_TOKEN}",
+        "Content-Type": "application/json",
+    }
+
+    response = await post(
+        "cloudflare",
+        CF_API_URL,
+        headers=headers,
+        json={"query": query, "variables": variables},
+    )
+    response.raise_for_status()
+    return response.json()
+
 
 async def query_cloudflare(query: str, variables: dict) -> dict:
     """
@@ -31,220 +84,495 @@ async def query_cloudflare(query: str, variables: dict) -> dict:
     if not CF_API_TOKEN or not CF_ACCOUNT_TAG:
         return {}
 
-    headers = {
-        "Authorization": f"Bearer {CF_API_TOKEN}",
-        "Content-Type": "application/json",
-    }
+    try:
+        return await post_graphql(query, variables)
+    except httpx.HTTPError as e:
+        print(f"Cloudflare API error: {e}")
+        return {}
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                CF_API_URL,
-                headers=headers,
-                json={"query": query, "variables": variables},
-                timeout=20.0,
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            print(f"Cloudflare API error: {e}")
-            return {}
+
+def _time_window(days: int) -> tuple[str, str]:
+    """ISO timestamps for the start and end of a `days` lookback window."""
+    now = datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).isoformat(), now.isoformat()
+
+
+def _account_groups(
+    result: dict, alias: str = "rumPageloadEventsAdaptiveGroups"
+) -> list:
+    """Extract the groups of one selection from a GraphQL response."""
+    groups = (
+        result.get("data", {})
+        .get("viewer", {})
+        .get("accounts", [{}])[0]
+        .get(alias, [])
+    )
+    return groups or []
 
 
-async def fetch_cf_timeseries(site_tag: str, days: int = 30) -> list[TimeseriesEntry]:
+def _timeseries_plan(
+    days: int, now: datetime | None = None
+) -> tuple[str, list[tuple[datetime, datetime]]]:
     """
-    Fetch timeseries pageview/visit data from Cloudflare Web Analytics.
+    Choose the time dimension and split a lookback range into windows.
+
+    Ranges up to CF_HOURLY_MAX_DAYS use hourly groups, longer ones daily
+    groups. Each window spans at most CF_GROUP_LIMIT groups, so no
+    selection is truncated by Cloudflare's group limit.
 
     Args:
-        site_tag: The Cloudflare site tag
         days: Number of days to look back
+        now: End of the range (defaults to the current time)
 
     Returns:
-        List of TimeseriesEntry objects
-    """
-    now = datetime.now(timezone.utc)
-    from_date = (now - timedelta(days=days)).isoformat()
-    to_date = now.isoformat()
-
-    query = """
-    query RumTimeseries($accountTag: string!, $filter: ZoneRumPageloadEventsAdaptiveGroupsFilter_InputObject!) {
-        viewer {
-            accounts(filter: {accountTag: $accountTag}) {
-                rumPageloadEventsAdaptiveGroups(limit: 5000, filter: $filter, orderBy: [datetimeHour_ASC]) {
-                    count
-                    sum {
-                        visits
-                    }
-                    dimensions {
-                        ts: datetimeHour
-                    }
-                }
-            }
-        }
-    }
+        Tuple of (Cloudflare time dimension, list of [start, end) windows)
     """
+    end = now or datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+
+    if days <= CF_HOURLY_MAX_DAYS:
+        dimension, step = "datetimeHour", timedelta(hours=CF_GROUP_LIMIT)
+    else:
+        dimension, step = "datetimeDay", timedelta(days=CF_GROUP_LIMIT)
+
+    windows = []
+    while start < end:
+        windows.append((start, min(start + step, end)))
+        start += step
+    return dimension, windows
+
+
+def _accumulate_daily(groups: list, daily: dict[str, list[int]]) -> None:
+    """Add timeseries groups (hourly or daily) into per-day [pageviews, visitors]."""
+    for group in groups:
+        ts = group.get("dimensions", {}).get("ts", "")
+        if not ts:
+            continue
+
+        date_obj = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        day_key = date_obj.strftime("%Y-%m-%d")
+
+        pageviews = group.get("count", 0)
+        visitors = group.get("sum", {}).get("visits", 0)
+
+        if day_key in daily:
+            daily[day_key][0] += pageviews
+            daily[day_key][1] += visitors
+        else:
+            daily[day_key] = [pageviews, visitors]
+
+
+def _daily_entries(daily: dict[str, list[int]]) -> list[TimeseriesRecord]:
+    """Build sorted daily TimeseriesRecord objects from per-day totals."""
+    return [
+        TimeseriesRecord(
+            date=datetime.fromisoformat(f"{day_key}T00:00:00+00:00"),
+            pageviews=pageviews,
+            visitors=visitors,
+            bounce_rate=0.0,
+        )
+        for day_key, (pageviews, visitors) in sorted(daily.items())
+    ]
 
-    variables = {
-        "accountTag": CF_ACCOUNT_TAG,
-        "filter": {
-            "AND": [
-                {"datetime_geq": from_date, "datetime_leq": to_date},
-                {"siteTag": site_tag},
-                {"bot": 0},
-            ]
-        },
-    }
 
-    result = await query_cloudflare(query, variables)
+def _aggregate_daily(groups: list) -> list[TimeseriesRecord]:
+    """Aggregate timeseries groups into daily TimeseriesRecord objects."""
+    daily: dict[str, list[int]] = {}
+    _accumulate_daily(groups, daily)
+    return _daily_entries(daily)
 
-    try:
-        groups = (
-            result.get("data", {})
-            .get("viewer", {})
-            .get("accounts", [{}])[0]
-            .get("rumPageloadEventsAdaptiveGroups", [])
+
+def _parse_breakdown(groups: list) -> list[StatRecord]:
+    """Convert breakdown groups into StatRecord objects with normalized keys."""
+    entries = []
+    for group in groups:
+        key = group.get("dimensions", {}).get("key", "")
+        if not key:
+            key = "(unknown)"
+
+        # Normalize key to lowercase
+        normalized_key = key.lower() if key else key
+
+        entries.append(
+            StatRecord(
+                key=normalized_key,
+                pageviews=group.get("count", 0),
+                visitors=group.get("sum", {}).get("visits", 0),
+            )
         )
 
-        # Aggregate by day
-        daily_data: dict[str, TimeseriesEntry] = {}
-        for group in groups:
-            ts = group.get("dimensions", {}).get("ts", "")
-            if not ts:
-                continue
+    return entries
 
-            date_obj = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            day_key = date_obj.strftime("%Y-%m-%d")
-
-            pageviews = group.get("count", 0)
-            visitors = group.get("sum", {}).get("visits", 0)
-
-            if day_key in daily_data:
-                daily_data[day_key].pageviews += pageviews
-                daily_data[day_key].visitors += visitors
-            else:
-                daily_data[day_key] = TimeseriesEntry(
-                    date=datetime.fromisoformat(f"{day_key}T00:00:00+00:00"),
-                    pageviews=pageviews,
-                    visitors=visitors,
-                    bounce_rate=0.0,
-                )
 
-        return sorted(daily_data.values(), key=lambda x: x.date)
-    except Exception as e:
-        print(f"Error parsing Cloudflare timeseries: {e}")
-        return []
+def _site_filter(site_tag: str, start: str, end: str, inclusive: bool) -> dict:
+    """GraphQL filter for one site's non-bot pageloads in a time range."""
+    end_op = "datetime_leq" if inclusive else "datetime_lt"
+    return {
+        "AND": [
+            {"datetime_geq": start, end_op: end},
+            {"siteTag": site_tag},
+            {"bot": 0},
+        ]
+    }
 
 
-async def fetch_cf_breakdown(
-    site_tag: str, dimension: str, days: int = 30, limit: int = 15
-) -> list[StatEntry]:
+@coalesce("cloudflare")
+async def fetch_cf_timeseries(site_tag: str, days: int = 30) -> list[TimeseriesRecord]:
     """
-    Fetch breakdown statistics for a specific dimension from Cloudflare.
+    Fetch timeseries pageview/visit data from Cloudflare Web Analytics.
+
+    Long ranges are split into windows that each fit under Cloudflare's
+    group limit and fetched concurrently (at most CF_WINDOW_CONCURRENCY at
+    a time); ranges over CF_HOURLY_MAX_DAYS use daily groups. Each window is
+    folded into the per-day totals as soon as it arrives.
 
     Args:
         site_tag: The Cloudflare site tag
-        dimension: The dimension to break down by (userAgentOS, userAgentBrowser, countryName, refererHost, requestPath)
         days: Number of days to look back
-        limit: Maximum number of results to return
 
     Returns:
-        List of StatEntry objects
+        List of daily TimeseriesRecord objects
     """
-    now = datetime.now(timezone.utc)
-    from_date = (now - timedelta(days=days)).isoformat()
-    to_date = now.isoformat()
+    dimension, windows = _timeseries_plan(days)
 
     query = f"""
-    query GetRumBreakdown($accountTag: string!, $siteTag: string!, $from: Time!, $to: Time!) {{
+    query RumTimeseries($accountTag: string!, $filter: ZoneRumPageloadEventsAdaptiveGroupsFilter_InputObject!) {{
         viewer {{
-            accounts(filter: {{ accountTag: $accountTag }}) {{
-                rumPageloadEventsAdaptiveGroups(
-                    limit: {limit}
-                    filter: {{ datetime_geq: $from, datetime_leq: $to, siteTag: $siteTag, bot: 0 }}
-                    orderBy: [sum_visits_DESC]
-                ) {{
+            accounts(filter: {{accountTag: $accountTag}}) {{
+                rumPageloadEventsAdaptiveGroups(limit: {CF_GROUP_LIMIT}, filter: $filter, orderBy: [{dimension}_ASC]) {{
+                    count
+                    sum {{
+                        visits
+                    }}
                     dimensions {{
-                        key: {dimension}
+                        ts: {dimension}
                     }}
+                }}
+            }}
+        }}
+    }}
+    """
+
+    semaphore = asyncio.Semaphore(CF_WINDOW_CONCURRENCY)
+
+    async def fetch_window(start: datetime, end: datetime, last: bool) -> dict:
+        variables = {
+            "accountTag": CF_ACCOUNT_TAG,
+            "filter": _site_filter(
+                site_tag, start.isoformat(), end.isoformat(), inclusive=last
+            ),
+        }
+        async with semaphore:
+            return await query_cloudflare(query, variables)
+
+    tasks = [
+        fetch_window(start, end, i == len(windows) - 1)
+        for i, (start, end) in enumerate(windows)
+    ]
+
+    daily: dict[str, list[int]] = {}
+    for next_result in asyncio.as_completed(tasks):
+        result = await next_result
+        try:
+            _accumulate_daily(_account_groups(result), daily)
+        except Exception as e:
+            print(f"Error parsing Cloudflare timeseries: {e}")
+
+    return _daily_entries(daily)
+
+
+def build_cf_stats_query(
+    limit: int = 15, timeseries_dimension: str | None = "datetimeHour"
+) -> str:
+    """
+    Build one GraphQL document for everything the stats page needs.
+
+    The document holds one aliased rumPageloadEventsAdaptiveGroups selection
+    for the timeseries and one per breakdown field, all sharing the same
+    $filter variable.
+
+    Args:
+        limit: Maximum number of results per breakdown
+        timeseries_dimension: Time dimension of the timeseries selection
+            (None to leave the timeseries out)
+
+    Returns:
+        The GraphQL query string
+    """
+    selections = []
+    if timeseries_dimension:
+        selections.append(f"""
+                {TIMESERIES_ALIAS}: rumPageloadEventsAdaptiveGroups(limit: {CF_GROUP_LIMIT}, filter: $filter, orderBy: [{timeseries_dimension}_ASC]) {{
                     count
                     sum {{
                         visits
                     }}
-                }}
+                    dimensions {{
+                        ts: {timeseries_dimension}
+                    }}
+                }}""")
+    for field, cf_dim in CF_DIMENSIONS.items():
+        selections.append(f"""
+                {field}: rumPageloadEventsAdaptiveGroups(limit: {limit}, filter: $filter, orderBy: [sum_visits_DESC]) {{
+                    count
+                    sum {{
+                        visits
+                    }}
+                    dimensions {{
+                        key: {cf_dim}
+                    }}
+                }}""")
+
+    return f"""
+    query RumStats($accountTag: string!, $filter: ZoneRumPageloadEventsAdaptiveGroupsFilter_InputObject!) {{
+        viewer {{
+            accounts(filter: {{accountTag: $accountTag}}) {{{"".join(selections)}
             }}
         }}
     }}
     """
 
+
+def parse_cf_stats(
+    result: dict,
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    """
+    Split a build_cf_stats_query() response into the existing return shapes.
+
+    Args:
+        result: The GraphQL response
+
+    Returns:
+        Tuple of (daily timeseries, breakdowns keyed by field name)
+    """
+    try:
+        timeseries = _aggregate_daily(_account_groups(result, TIMESERIES_ALIAS))
+    except Exception as e:
+        print(f"Error parsing Cloudflare timeseries: {e}")
+        timeseries = []
+
+    breakdowns: dict[str, list[StatRecord]] = {}
+    for field in CF_DIMENSIONS:
+        try:
+            breakdowns[field] = _parse_breakdown(_account_groups(result, field))
+        except Exception as e:
+            print(f"Error parsing Cloudflare breakdown: {e}")
+            breakdowns[field] = []
+
+    return timeseries, breakdowns
+
+
+@coalesce("cloudflare")
+async def fetch_cf_stats(
+    site_tag: str, days: int = 30
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    """
+    Fetch the timeseries and all breakdowns from Cloudflare.
+
+    When the whole timeseries fits in one selection this is a single
+    request; otherwise the breakdowns are fetched in one request alongside
+    the windowed timeseries fetch.
+
+    Args:
+        site_tag: The Cloudflare site tag
+        days: Number of days to look back
+
+    Returns:
+        Tuple of (timeseries, breakdowns)
+    """
+    from_date, to_date = _time_window(days)
+    dimension, windows = _timeseries_plan(days)
+    single_request = len(windows) <= 1
+
     variables = {
         "accountTag": CF_ACCOUNT_TAG,
-        "siteTag": site_tag,
-        "from": from_date,
-        "to": to_date,
+        "filter": _site_filter(site_tag, from_date, to_date, inclusive=True),
     }
+    query = build_cf_stats_query(
+        timeseries_dimension=dimension if single_request else None
+    )
 
-    result = await query_cloudflare(query, variables)
+    if single_request:
+        result = await query_cloudflare(query, variables)
+        return parse_cf_stats(result)
 
-    try:
-        groups = (
-            result.get("data", {})
-            .get("viewer", {})
-            .get("accounts", [{}])[0]
-            .get("rumPageloadEventsAdaptiveGroups", [])
+    result, timeseries = await asyncio.gather(
+        query_cloudflare(query, variables), fetch_cf_timeseries(site_tag, days)
+    )
+    _, breakdowns = parse_cf_stats(result)
+    return timeseries, breakdowns
+
+
+def _site_prefix(index: int, sites: int) -> str:
+    """Alias prefix of a site's selections in a document querying `sites` sites."""
+    return "" if sites == 1 else f"s{index}_"
+
+
+def build_cf_daily_query(sites: int = 1) -> str:
+    """
+    Build one GraphQL document returning per-day timeseries and breakdowns.
+
+    Like build_cf_stats_query(), but every selection is also grouped by
+    date, so the groups can be stored as daily rows. With several sites,
+    each site gets its own aliased selections (see _site_prefix()) and
+    filter variable ($filter0, $filter1, ...), so every site keeps the
+    full group limit of its selections.
+
+    Args:
+        sites: Number of sites queried by the document
+
+    Returns:
+        The GraphQL query string
+    """
+    variables = ["$accountTag: string!"]
+    selections = []
+    for index in range(sites):
+        prefix = _site_prefix(index, sites)
+        filter_var = "$filter" if sites == 1 else f"$filter{index}"
+        variables.append(
+            f"{filter_var}: ZoneRumPageloadEventsAdaptiveGroupsFilter_InputObject!"
         )
+        selections.append(f"""
+                {prefix}{TIMESERIES_ALIAS}: rumPageloadEventsAdaptiveGroups(limit: {CF_GROUP_LIMIT}, filter: {filter_var}, orderBy: [date_ASC]) {{
+                    count
+                    sum {{
+                        visits
+                    }}
+                    dimensions {{
+                        day: date
+                    }}
+                }}""")
+        for field, cf_dim in CF_DIMENSIONS.items():
+            selections.append(f"""
+                {prefix}{field}: rumPageloadEventsAdaptiveGroups(limit: {CF_GROUP_LIMIT}, filter: {filter_var}, orderBy: [sum_visits_DESC]) {{
+                    count
+                    sum {{
+                        visits
+                    }}
+                    dimensions {{
+                        day: date
+                        key: {cf_dim}
+                    }}
+                }}""")
+
+    return f"""
+    query RumDaily({", ".join(variables)}) {{
+        viewer {{
+            accounts(filter: {{accountTag: $accountTag}}) {{{"".join(selections)}
+            }}
+        }}
+    }}
+    """
 
-        entries = []
-        for group in groups:
-            key = group.get("dimensions", {}).get("key", "")
-            if not key:
-                key = "(unknown)"
 
-            # Normalize key to lowercase
-            normalized_key = key.lower() if key else key
+def _day_filter(site_tag: str, start: date, end: date) -> dict:
+    """GraphQL filter for one site's pageloads on the days [start, end)."""
+    return _site_filter(
+        site_tag,
+        f"{start.isoformat()}T00:00:00Z",
+        f"{end.isoformat()}T00:00:00Z",
+        inclusive=False,
+    )
 
-            entries.append(
-                StatEntry(
-                    key=normalized_key,
-                    pageviews=group.get("count", 0),
-                    visitors=group.get("sum", {}).get("visits", 0),
+
+def _parse_daily_rows(result: dict, limit: int, prefix: str = "") -> list[tuple]:
+    """
+    Turn one site's selections of a build_cf_daily_query() response into
+    (day, field, key, pageviews, visitors) rows; `prefix` is the site's
+    alias prefix.
+    """
+    rows = []
+    for group in _account_groups(result, prefix + TIMESERIES_ALIAS):
+        day = group.get("dimensions", {}).get("day", "")
+        if day:
+            rows.append(
+                (
+                    day,
+                    TIMESERIES_ALIAS,
+                    "",
+                    group.get("count", 0),
+                    group.get("sum", {}).get("visits", 0),
                 )
             )
 
-        return entries
-    except Exception as e:
-        print(f"Error parsing Cloudflare breakdown: {e}")
-        return []
+    for field in CF_DIMENSIONS:
+        per_day: dict[str, int] = {}
+        groups = _account_groups(result, prefix + field)
+        # Groups arrive ordered by visits; keep the top `limit` of every day
+        for group, entry in zip(groups, _parse_breakdown(groups)):
+            day = group.get("dimensions", {}).get("day", "")
+            if not day or per_day.get(day, 0) >= limit:
+                continue
+            per_day[day] = per_day.get(day, 0) + 1
+            rows.append((day, field, entry.key, entry.pageviews, entry.visitors))
 
+    return rows
 
-async def fetch_cf_all_breakdowns(
-    site_tag: str, days: int = 30
-) -> dict[str, list[StatEntry]]:
+
+async def fetch_cf_daily_rows(
+    site_tag: str, start: date, end: date, limit: int = 100
+) -> list[tuple]:
     """
-    Fetch all breakdown statistics in parallel from Cloudflare.
+    Fetch per-day timeseries and breakdown rows for [start, end).
 
     Args:
         site_tag: The Cloudflare site tag
-        days: Number of days to look back
+        start: First day to include
+        end: Day after the last day to include
+        limit: Maximum number of results per field and day
 
     Returns:
-        Dictionary mapping field names to lists of StatEntry objects
-    """
-    import asyncio
+        List of (day, field, key, pageviews, visitors) tuples; timeseries
+        rows use TIMESERIES_ALIAS as the field and an empty key
 
-    # Map our standard field names to Cloudflare dimensions
-    dimension_map = {
-        "path": "requestPath",
-        "os_name": "userAgentOS",
-        "device_type": "userAgentDevice",
-        "referrer": "refererHost",
-        "country": "countryName",
+    Raises:
+        httpx.HTTPError: If the query fails (so callers never mistake an
+            error for days without traffic)
+    """
+    variables = {
+        "accountTag": CF_ACCOUNT_TAG,
+        "filter": _day_filter(site_tag, start, end),
     }
+    result = await post_graphql(build_cf_daily_query(), variables)
+    if result.get("errors"):
+        raise httpx.HTTPError(f"Cloudflare GraphQL errors: {result['errors']}")
 
-    tasks = {
-        field: fetch_cf_breakdown(site_tag, cf_dim, days)
-        for field, cf_dim in dimension_map.items()
-    }
+    return _parse_daily_rows(result, limit)
+
+
+async def fetch_cf_daily_rows_batch(
+    site_tags: list[str], start: date, end: date, limit: int = 100
+) -> dict[str, list[tuple]]:
+    """
+    Fetch the daily rows of several sites for [start, end) in one request.
+
+    Every site gets its own aliased selections in the document, so the
+    rows of each site are exactly what fetch_cf_daily_rows() returns for it.
 
-    results = await asyncio.gather(*tasks.values())
+    Args:
+        site_tags: The Cloudflare site tags (at most CF_BATCH_SITES is
+            advisable, to keep the document's query cost down)
+        start: First day to include
+        end: Day after the last day to include
+        limit: Maximum number of results per field and day
+
+    Returns:
+        Site tag -> list of (day, field, key, pageviews, visitors) tuples
 
-    return dict(zip(tasks.keys(), results))
+    Raises:
+        httpx.HTTPError: If the query fails
+    """
+    if len(site_tags) == 1:
+        return {site_tags[0]: await fetch_cf_daily_rows(site_tags[0], start, end, limit)}
+
+    variables = {"accountTag": CF_ACCOUNT_TAG}
+    for index, site_tag in enumerate(site_tags):
+        variables[f"filter{index}"] = _day_filter(site_tag, start, end)
+    result = await post_graphql(build_cf_daily_query(len(site_tags)), variables)
+    if result.get("errors"):
+        raise httpx.HTTPError(f"Cloudflare GraphQL errors: {result['errors']}")
+
+    return {
+        site_tag: _parse_daily_rows(result, limit, _site_prefix(index, len(site_tags)))
+        for index, site_tag in enumerate(site_tags)
+    }
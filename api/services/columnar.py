@@ -0,0 +1,362 @@
+"""
+Columnar Migration Data Format
+
+Compiles Vercel migration JSON exports into a compact binary file that is
+memory-mapped read-only, so every worker process shares the same pages
+instead of holding its own copy of the parsed Python objects.
+
+File layout (native byte order, every column 8-byte aligned):
+    magic       8 bytes   b"VCOL0001"
+    header_len  uint32    length of the JSON header that follows
+    header      JSON      metadata, source signature and column directory
+    columns     raw arrays, located via the header's column directory
+
+Columns:
+    ts.date / ts.pageviews / ts.visitors / ts.bounce_rate / ts.migration_date
+    stats.<dimension>.key / .pageviews / .visitors / .migration_date
+    strings.offsets / strings.data   (dictionary-encoded breakdown keys)
+
+Dates are int64 epoch seconds, counts int32, and migration dates int32
+proleptic ordinals (0 when absent). Breakdown keys are int32 indexes into
+the string table.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from models import AllStats, Metadata, StatEntry, Stats, TimeseriesEntry
+
+COLUMNAR_MAGIC = b"VCOL0001"
+COLUMNAR_SUFFIX = ".vcol"
+
+# Directory for compiled files (defaults to next to the source JSON)
+COLUMNAR_DIR = os.getenv("VERCEL_COLUMNAR_DIR", "")
+
+STAT_DIMENSIONS = ["path", "device_type", "referrer", "os_name", "country"]
+
+_HEADER_LEN = struct.Struct("<I")
+_ALIGN = 8
+
+_timeseries_adapter = TypeAdapter(list[TimeseriesEntry])
+_stat_entries_adapter = TypeAdapter(list[StatEntry])
+
+
+def columnar_path(json_path: Path) -> Path:
+    """Location of the compiled columnar file for a migration JSON file."""
+    json_path = Path(json_path)
+    directory = Path(COLUMNAR_DIR) if COLUMNAR_DIR else json_path.parent
+    return directory / (json_path.stem + COLUMNAR_SUFFIX)
+
+
+def _source_signature(json_path: Path) -> list[int]:
+    st = json_path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _to_epoch(value: datetime) -> int:
+    # Naive timestamps in the exports are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _to_ordinal(value: date | None) -> int:
+    return value.toordinal() if value is not None else 0
+
+
+def _from_ordinal(value: int) -> date | None:
+    return date.fromordinal(value) if value else None
+
+
+def encode_columnar(json_path: Path) -> bytes:
+    """
+    Encode a Vercel migration JSON file into the columnar binary format.
+
+    Args:
+        json_path: Path to the source JSON export
+
+    Returns:
+        The encoded file contents
+    """
+    json_path = Path(json_path)
+    signature = _source_signature(json_path)
+
+    with open(json_path, "r") as f:
+        data = AllStats(**json.load(f))
+    # Readers binary-search the date column, so guarantee it is sorted
+    data.timeseries.sort(key=lambda e: _to_epoch(e.date))
+
+    columns: dict[str, array] = {
+        "ts.date": array("q", (_to_epoch(e.date) for e in data.timeseries)),
+        "ts.pageviews": array("i", (e.pageviews for e in data.timeseries)),
+        "ts.visitors": array("i", (e.visitors for e in data.timeseries)),
+        "ts.bounce_rate": array("d", (e.bounce_rate for e in data.timeseries)),
+        "ts.migration_date": array(
+            "i", (_to_ordinal(e.migration_date) for e in data.timeseries)
+        ),
+    }
+
+    # Dictionary-encode breakdown keys across all dimensions
+    string_ids: dict[str, int] = {}
+    for dimension in STAT_DIMENSIONS:
+        entries: list[StatEntry] = getattr(data.stats, dimension)
+        columns[f"stats.{dimension}.key"] = array(
+            "i", (string_ids.setdefault(e.key, len(string_ids)) for e in entries)
+        )
+        columns[f"stats.{dimension}.pageviews"] = array(
+            "i", (e.pageviews for e in entries)
+        )
+        columns[f"stats.{dimension}.visitors"] = array(
+            "i", (e.visitors for e in entries)
+        )
+        columns[f"stats.{dimension}.migration_date"] = array(
+            "i", (_to_ordinal(e.migration_date) for e in entries)
+        )
+
+    encoded = [key.encode("utf-8") for key in string_ids]
+    offsets = array("q", [0])
+    for raw in encoded:
+        offsets.append(offsets[-1] + len(raw))
+    columns["strings.offsets"] = offsets
+    columns["strings.data"] = array("B", b"".join(encoded))
+
+    # Lay out columns after the header, each aligned to 8 bytes
+    directory: dict[str, list] = {}
+    position = 0
+    for name, values in columns.items():
+        directory[name] = [position, values.typecode, len(values)]
+        position += values.itemsize * len(values)
+        position += -position % _ALIGN
+
+    header = json.dumps(
+        {
+            "byteorder": sys.byteorder,
+            "source": signature,
+            "metadata": data.metadata.model_dump(mode="json"),
+            "columns": directory,
+        }
+    ).encode("utf-8")
+    data_start = len(COLUMNAR_MAGIC) + _HEADER_LEN.size + len(header)
+    data_start += -data_start % _ALIGN
+
+    out = bytearray(data_start + position)
+    out[: len(COLUMNAR_MAGIC)] = COLUMNAR_MAGIC
+    _HEADER_LEN.pack_into(out, len(COLUMNAR_MAGIC), len(header))
+    header_start = len(COLUMNAR_MAGIC) + _HEADER_LEN.size
+    out[header_start : header_start + len(header)] = header
+    for name, values in columns.items():
+        start = data_start + directory[name][0]
+        raw = values.tobytes()
+        out[start : start + len(raw)] = raw
+    return bytes(out)
+
+
+def compile_columnar(json_path: Path, out_path: Path | None = None) -> Path:
+    """
+    Compile a Vercel migration JSON file into a columnar binary file.
+
+    The file is written to a temporary name and atomically renamed, so
+    concurrent workers never observe a partially written file.
+
+    Args:
+        json_path: Path to the source JSON export
+        out_path: Destination path (defaults to columnar_path(json_path))
+
+    Returns:
+        Path of the compiled file
+    """
+    json_path = Path(json_path)
+    out_path = Path(out_path) if out_path else columnar_path(json_path)
+    encoded = encode_columnar(json_path)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_bytes(encoded)
+        os.replace(tmp_path, out_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    return out_path
+
+
+class ColumnarData:
+    """
+    Read-only view of columnar migration data.
+
+    Columns are exposed as typed memoryviews over the underlying buffer
+    (normally a shared read-only mmap); nothing is copied until rows are
+    materialized as Pydantic models.
+    """
+
+    def __init__(self, buffer: bytes | mmap.mmap, name: str = "<memory>"):
+        self.name = name
+        self._buffer = buffer
+
+        buffer = memoryview(buffer)
+        if bytes(buffer[: len(COLUMNAR_MAGIC)]) != COLUMNAR_MAGIC:
+            raise ValueError(f"{name} is not a columnar migration file")
+
+        (header_len,) = _HEADER_LEN.unpack_from(buffer, len(COLUMNAR_MAGIC))
+        header_start = len(COLUMNAR_MAGIC) + _HEADER_LEN.size
+        header = json.loads(bytes(buffer[header_start : header_start + header_len]))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{name} was compiled with a different byte order")
+
+        data_start = header_start + header_len
+        data_start += -data_start % _ALIGN
+
+        self.source_signature: list[int] = header["source"]
+        self.metadata = Metadata(**header["metadata"])
+        self.columns: dict[str, memoryview] = {}
+        for column, (offset, typecode, length) in header["columns"].items():
+            start = data_start + offset
+            size = array(typecode).itemsize * length
+            if start + size > len(buffer):
+                raise ValueError(f"{name} is truncated")
+            self.columns[column] = buffer[start : start + size].cast(typecode)
+
+        # The string table is small; decode it once
+        offsets = self.columns["strings.offsets"]
+        blob = self.columns["strings.data"]
+        self.strings: list[str] = [
+            bytes(blob[offsets[i] : offsets[i + 1]]).decode("utf-8")
+            for i in range(len(offsets) - 1)
+        ]
+
+    @classmethod
+    def open(cls, path: Path) -> "ColumnarData":
+        """Memory-map a compiled file read-only."""
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapping, str(path))
+
+    def __len__(self) -> int:
+        return len(self.columns["ts.date"])
+
+    def timeseries(
+        self, start: int = 0, stop: int | None = None
+    ) -> list[TimeseriesEntry]:
+        """
+        Materialize rows [start:stop] of the hourly timeseries.
+
+        Args:
+            start: Index of the first row
+            stop: Index past the last row (None for the end)
+
+        Returns:
+            List of TimeseriesEntry objects
+        """
+        cols = self.columns
+        window = slice(start, stop)
+        rows = [
+            {
+                "date": ts,
+                "pageviews": pageviews,
+                "visitors": visitors,
+                "bounce_rate": bounce_rate,
+                "migration_date": _from_ordinal(migration),
+            }
+            for ts, pageviews, visitors, bounce_rate, migration in zip(
+                cols["ts.date"][window],
+                cols["ts.pageviews"][window],
+                cols["ts.visitors"][window],
+                cols["ts.bounce_rate"][window],
+                cols["ts.migration_date"][window],
+            )
+        ]
+        return _timeseries_adapter.validate_python(rows)
+
+    def stat_entries(self, dimension: str) -> list[StatEntry]:
+        """Materialize the raw breakdown rows of one dimension."""
+        strings = self.strings
+        prefix = f"stats.{dimension}."
+        cols = self.columns
+        rows = [
+            {
+                "key": strings[key],
+                "pageviews": pageviews,
+                "visitors": visitors,
+                "migration_date": _from_ordinal(migration),
+            }
+            for key, pageviews, visitors, migration in zip(
+                cols[prefix + "key"],
+                cols[prefix + "pageviews"],
+                cols[prefix + "visitors"],
+                cols[prefix + "migration_date"],
+            )
+        ]
+        return _stat_entries_adapter.validate_python(rows)
+
+    def to_all_stats(self) -> AllStats:
+        """Materialize the full dataset as an AllStats object."""
+        return AllStats(
+            metadata=self.metadata,
+            timeseries=self.timeseries(),
+            stats=Stats(**{dim: self.stat_entries(dim) for dim in STAT_DIMENSIONS}),
+        )
+
+
+def open_columnar(json_path: Path) -> ColumnarData:
+    """
+    Memory-map the compiled form of a migration JSON file.
+
+    The JSON export stays the source of truth: the binary file is
+    (re)compiled whenever it is missing or was built from a different
+    version of the JSON file. If the compiled file can't be written
+    (e.g. a read-only deployment), the encoded data is kept in memory.
+
+    Args:
+        json_path: Path to the source JSON export
+
+    Returns:
+        ColumnarData view over the compiled file
+
+    Raises:
+        FileNotFoundError: If the source JSON file doesn't exist
+    """
+    json_path = Path(json_path)
+    signature = _source_signature(json_path)
+    path = columnar_path(json_path)
+
+    if path.exists():
+        try:
+            data = ColumnarData.open(path)
+            if data.source_signature == signature:
+                return data
+        except (ValueError, KeyError, TypeError, struct.error):
+            # Not a compiled file, or a damaged one: compile it again
+            pass
+
+    try:
+        compile_columnar(json_path, path)
+        return ColumnarData.open(path)
+    except OSError as e:
+        if not json_path.exists():
+            raise
+        print(f"Could not write columnar file {path}, keeping it in memory: {e}")
+        return ColumnarData(encode_columnar(json_path), str(json_path))
+
+
+def main():
+    """Compile every registered migration file (python -m services.columnar)."""
+    from config import PROJECT_REGISTRY
+
+    for slug, config in PROJECT_REGISTRY.items():
+        json_path = config["vercel_file"]
+        if not json_path.exists():
+            continue
+        out_path = compile_columnar(json_path)
+        print(f"{slug}: {json_path.stat().st_size} -> {out_path.stat().st_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
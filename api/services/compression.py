@@ -0,0 +1,189 @@
+"""
+Response Compression
+
+Lifetime /stats and /timeseries bodies are large, repetitive JSON and
+compress 7-50x. Responses are compressed with the best encoding the client
+accepts (brotli when the brotli package is installed, otherwise gzip),
+unless they are smaller than COMPRESSION_MIN_BYTES.
+
+Compression runs in the CPU executor, once per cache entry and encoding:
+the compressed bytes are kept on the entry, so hot responses are served
+precompressed. Compression ratio and CPU time are counted per encoding.
+"""
+
+import gzip
+import os
+import time
+
+from .cache import CacheEntry
+from .executor import cpu_executor
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Smaller bodies are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "6"))
+
+# Supported encodings, most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress_body(body: bytes, encoding: str) -> tuple[bytes, float]:
+    """
+    Compress a body (runs in the CPU executor).
+
+    Args:
+        body: Serialized response body
+        encoding: "br" or "gzip"
+
+    Returns:
+        The compressed bytes and the CPU time spent, in milliseconds
+    """
+    started = time.thread_time()
+    if encoding == "br":
+        data = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return data, (time.thread_time() - started) * 1000
+
+
+def parse_accept_encoding(header: str | None) -> dict[str, float]:
+    """
+    Parse an Accept-Encoding header into {coding: q-value}.
+
+    Args:
+        header: e.g. "gzip, deflate, br;q=0.9"
+
+    Returns:
+        Lower-cased codings and their weights (1.0 if not given)
+    """
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class Compressor:
+    """
+    Negotiates, applies and counts response compression.
+
+    Args:
+        enabled: Whether responses are compressed at all
+        min_bytes: Bodies below this size are sent uncompressed
+    """
+
+    def __init__(self, enabled: bool, min_bytes: int):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.counters = {"uncompressed": 0, "below_threshold": 0}
+        self.encoding_counters = {
+            encoding: {
+                "responses": 0,
+                "precompressed": 0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "cpu_ms": 0.0,
+            }
+            for encoding in ENCODINGS
+        }
+
+    def negotiate(self, accept_encoding: str | None) -> str | None:
+        """
+        Pick the encoding for a request.
+
+        Args:
+            accept_encoding: The request's Accept-Encoding header
+
+        Returns:
+            The accepted encoding with the highest weight (ties go to the
+            server's preference), or None for an uncompressed response
+        """
+        if not self.enabled:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_q = None, 0.0
+        for encoding in ENCODINGS:
+            q = accepted.get(encoding, wildcard)
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def selects(self, accept_encoding: str | None, size: int) -> bool:
+        """Whether a body of this size would be sent compressed."""
+        return self.negotiate(accept_encoding) is not None and size >= self.min_bytes
+
+    async def encode(
+        self, entry: CacheEntry, accept_encoding: str | None
+    ) -> tuple[bytes, str | None]:
+        """
+        The body of an entry in the encoding the client prefers, compressing
+        it on first use.
+
+        Args:
+            entry: Cache entry holding the serialized body
+            accept_encoding: The request's Accept-Encoding header
+
+        Returns:
+            The bytes to send and their encoding (None if uncompressed)
+        """
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            self.counters["uncompressed"] += 1
+            return entry.body, None
+        if len(entry.body) < self.min_bytes:
+            self.counters["below_threshold"] += 1
+            return entry.body, None
+
+        counters = self.encoding_counters[encoding]
+        counters["responses"] += 1
+        data = entry.encodings.get(encoding)
+        if data is not None:
+            counters["precompressed"] += 1
+            return data, encoding
+
+        data, cpu_ms = await cpu_executor.run(compress_body, entry.body, encoding)
+        entry.add_encoding(encoding, data)
+        counters["bytes_in"] += len(entry.body)
+        counters["bytes_out"] += len(data)
+        counters["cpu_ms"] += cpu_ms
+        return data, encoding
+
+    def stats(self) -> dict:
+        """Per-encoding counts, compression ratio and CPU time."""
+        encodings = {}
+        for encoding, counters in self.encoding_counters.items():
+            bytes_out = counters["bytes_out"]
+            encodings[encoding] = {
+                **counters,
+                "cpu_ms": round(counters["cpu_ms"], 1),
+                "ratio": (
+                    round(counters["bytes_in"] / bytes_out, 2) if bytes_out else None
+                ),
+            }
+        return {
+            "enabled": self.enabled,
+            "min_bytes": self.min_bytes,
+            **self.counters,
+            "encodings": encodings,
+        }
+
+
+compressor = Compressor(enabled=COMPRESSION_ENABLED, min_bytes=COMPRESSION_MIN_BYTES)
@@ -0,0 +1,73 @@
+"""
+Request Deadlines
+
+A /stats or /timeseries request may carry a latency budget (`timeout_ms`,
+or the REQUEST_TIMEOUT_MS server default). Its live data is fetched as
+separate sections (the timeseries, and the breakdowns alone or together
+depending on the live store and how the provider batches them); when the
+deadline passes, the response is built from the Vercel data and the
+sections that finished, and marks every section as "complete" or "partial".
+
+The deadline bounds how long a request waits, not the upstream fetches
+themselves: those are coalesced and shared with other callers, so they
+keep running, and the complete response is cached once they finish. The
+live store's syncs are waited on for the first SYNC_WAIT_SHARE of the
+budget only, leaving the rest to read the stored rows, so a late sync
+doesn't turn data already stored into partial sections (see livestore.py).
+"""
+
+import asyncio
+import os
+from contextvars import ContextVar
+
+# Default latency budget of /stats and /timeseries in milliseconds (0 = none)
+REQUEST_TIMEOUT_MS = int(os.getenv("REQUEST_TIMEOUT_MS", "0"))
+
+COMPLETE, PARTIAL = "complete", "partial"
+
+# Share of a request's remaining budget spent waiting on live store syncs
+SYNC_WAIT_SHARE = 0.8
+
+# Deadline (event loop time) until which the fetches started in the current
+# context wait on live store syncs (see sync_deadline())
+current_deadline: ContextVar[float | None] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+def request_deadline(timeout_ms: int | None) -> float | None:
+    """
+    The event loop time a request's live data must be ready by.
+
+    Args:
+        timeout_ms: The request's budget (None for REQUEST_TIMEOUT_MS, 0
+            for no deadline)
+
+    Returns:
+        The deadline, or None if the request has none
+    """
+    if timeout_ms is None:
+        timeout_ms = REQUEST_TIMEOUT_MS
+    if timeout_ms <= 0:
+        return None
+    return asyncio.get_running_loop().time() + timeout_ms / 1000
+
+
+def time_left(deadline: float) -> float:
+    """Seconds until a deadline (0 once it has passed)."""
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+def sync_deadline(deadline: float) -> float:
+    """
+    The deadline of the live store syncs a request waits on (the fetches'
+    current_deadline), SYNC_WAIT_SHARE of its remaining budget from now.
+    """
+    return asyncio.get_running_loop().time() + SYNC_WAIT_SHARE * time_left(deadline)
+
+
+def section_status(sections: list[str], partial: list[str]) -> dict[str, str]:
+    """Map every section to COMPLETE or PARTIAL."""
+    return {
+        section: PARTIAL if section in partial else COMPLETE for section in sections
+    }
@@ -0,0 +1,226 @@
+"""
+CPU Offload
+
+Building a response (loading migration data, merging it with live data and
+serializing the result) is CPU work, and on the event loop it stalls every
+other request on the worker, even ones that only list projects. Those
+phases run in a configurable pool instead:
+
+    thread   a ThreadPoolExecutor (default; no copying of inputs)
+    process  a ProcessPoolExecutor; inputs are passed as compact buffers,
+             and each process memory-maps the same columnar files
+    inline   run on the event loop (the previous behaviour)
+
+A loop lag monitor measures how late a periodic timer fires, which is how
+long the loop was blocked, to confirm that stalls are gone. Job durations
+and lag probes are also recorded as /metrics histograms (see metrics.py).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+from .metrics import LAG_BUCKETS, PHASE_BUCKETS, metrics
+
+CPU_EXECUTOR = os.getenv("CPU_EXECUTOR", "thread").lower()
+# Pool size (0 = min(4, CPU count))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+# Seconds between loop lag probes
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+# Probes later than this (ms) are counted as stalls
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "100"))
+# Number of recent probes kept for the percentiles
+LOOP_LAG_SAMPLES = 240
+
+cpu_job_duration = metrics.histogram(
+    "analytics_cpu_job_duration_seconds",
+    "CPU executor job duration, including the wait for a worker",
+    ("job",),
+    PHASE_BUCKETS,
+)
+loop_lag = metrics.histogram(
+    "analytics_event_loop_lag_seconds",
+    "How much later than scheduled the loop lag probe woke up",
+    (),
+    LAG_BUCKETS,
+)
+
+
+class CpuExecutor:
+    """
+    Runs synchronous CPU-bound functions off the event loop.
+
+    Args:
+        kind: "thread", "process" or "inline"
+        workers: Pool size
+    """
+
+    def __init__(self, kind: str, workers: int):
+        if kind not in ("thread", "process", "inline"):
+            raise ValueError(f"Unknown CPU_EXECUTOR: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self._executor: Executor | None = None
+        self.counters = {"tasks": 0, "errors": 0, "in_flight": 0, "busy_ms": 0.0}
+
+    @property
+    def uses_processes(self) -> bool:
+        """Whether arguments cross a process boundary (and should be compact)."""
+        return self.kind == "process"
+
+    def start(self) -> None:
+        """Create the pool (called on startup)."""
+        if self.kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="cpu"
+            )
+        elif self.kind == "process":
+            # Spawn, don't fork: a forked child would inherit locks held by
+            # other threads (e.g. the migration data preload) mid-operation
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self) -> None:
+        """Shut the pool down (called on shutdown)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run fn(*args) in the pool and wait for its result.
+
+        Falls back to calling fn inline when the pool isn't running (e.g.
+        outside the app lifespan).
+
+        Args:
+            fn: Module-level function (picklable for process pools)
+            *args: Its arguments
+
+        Returns:
+            fn's return value
+        """
+        self.counters["tasks"] += 1
+        self.counters["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            if self._executor is None:
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        except Exception:
+            self.counters["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.counters["in_flight"] -= 1
+            self.counters["busy_ms"] += elapsed * 1000
+            cpu_job_duration.observe(elapsed, fn.__name__)
+
+    def stats(self) -> dict:
+        """Pool settings and task counters."""
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "running": self._executor is not None,
+            **self.counters,
+            "busy_ms": round(self.counters["busy_ms"], 1),
+        }
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than scheduled a periodic
+    asyncio.sleep() wakes up.
+
+    Args:
+        interval: Seconds between probes
+        warn_ms: Lag above which a probe counts as a stall
+    """
+
+    def __init__(self, interval: float, warn_ms: float):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self._samples: deque[float] = deque(maxlen=LOOP_LAG_SAMPLES)
+        self._task: asyncio.Task | None = None
+        self.max_ms = 0.0
+        self.stalls = 0
+        self.probes = 0
+
+    def start(self) -> None:
+        """Start probing (called on startup)."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop probing (called on shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def record(self, lag_ms: float) -> None:
+        """Record one probe's lag in milliseconds."""
+        self._samples.append(lag_ms)
+        self.probes += 1
+        self.max_ms = max(self.max_ms, lag_ms)
+        loop_lag.observe(lag_ms / 1000)
+        if lag_ms > self.warn_ms:
+            self.stalls += 1
+
+    def stats(self) -> dict:
+        """Recent lag percentiles, the maximum seen and the stall count."""
+        samples = sorted(self._samples)
+
+        def percentile(p: float) -> float | None:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 2)
+
+        return {
+            "running": self._task is not None,
+            "interval": self.interval,
+            "probes": self.probes,
+            "last_ms": round(self._samples[-1], 2) if samples else None,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_ms, 2),
+            "stalls": self.stalls,
+            "stall_threshold_ms": self.warn_ms,
+        }
+
+
+cpu_executor = CpuExecutor(kind=CPU_EXECUTOR, workers=CPU_WORKERS)
+loop_lag_monitor = LoopLagMonitor(interval=LOOP_LAG_INTERVAL, warn_ms=LOOP_LAG_WARN_MS)
+
+metrics.callback(
+    "analytics_cpu_jobs_in_flight",
+    "CPU executor jobs running or waiting for a worker",
+    "gauge",
+    lambda: [((), cpu_executor.counters["in_flight"])],
+)
+metrics.callback(
+    "analytics_event_loop_stalls_total",
+    "Loop lag probes above LOOP_LAG_WARN_MS",
+    "counter",
+    lambda: [((), loop_lag_monitor.stalls)],
+)
+metrics.callback(
+    "analytics_event_loop_lag_max_seconds",
+    "Largest loop lag seen since startup",
+    "gauge",
+    lambda: [((), loop_lag_monitor.max_ms / 1000)],
+)
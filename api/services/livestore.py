@@ -0,0 +1,579 @@
+"""
+Live Data Store
+
+Local SQLite store of the daily timeseries and breakdown rows of every
+live project (PostHog or Cloudflare). Closed days never change upstream, so
+a sync only queries the days after the last closed day plus the current
+partial day, and /stats is served from a local range scan of the stored
+rows. Long lookbacks (lifetime is ~10 years) stop costing a full upstream
+query, and they keep working from the local rows while the upstream is
+slow or down.
+
+Breakdown rows are stored per day (top LIVE_STORE_DAILY_LIMIT values per
+field and day), so a window's visitors are the sum of daily unique
+visitors.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from .records import StatRecord, TimeseriesRecord
+from . import cloudflare, posthog
+from .breaker import collect_failures, start_tracked
+from .deadline import current_deadline, time_left
+from .singleflight import upstream_flights
+
+LIVE_STORE_ENABLED = os.getenv("LIVE_STORE_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+LIVE_STORE_PATH = os.getenv(
+    "LIVE_STORE_PATH", str(Path(__file__).parent.parent / "data" / "live.sqlite3")
+)
+# Minimum seconds between two upstream syncs of the same project
+LIVE_STORE_SYNC_INTERVAL = float(os.getenv("LIVE_STORE_SYNC_INTERVAL", "60"))
+# Seconds a request waits on a sync before serving the stored rows
+LIVE_STORE_SYNC_WAIT = float(os.getenv("LIVE_STORE_SYNC_WAIT", "2"))
+# Closed days re-queried on every sync, to pick up late-arriving events
+LIVE_STORE_RESYNC_DAYS = int(os.getenv("LIVE_STORE_RESYNC_DAYS", "1"))
+# Breakdown values kept per field and day
+LIVE_STORE_DAILY_LIMIT = int(os.getenv("LIVE_STORE_DAILY_LIMIT", "100"))
+# Maximum number of upstream chunk queries run concurrently during a sync
+LIVE_STORE_SYNC_CONCURRENCY = 4
+
+# Per provider: daily rows fetcher, batched fetcher of several projects'
+# rows (None if the provider has none) and its maximum batch size,
+# timeseries marker, days per upstream query, days fetched on the first
+# sync, and whether credentials are set
+SYNC_SOURCES = {
+    "posthog": {
+        "fetch": posthog.fetch_daily_rows,
+        "fetch_batch": None,
+        "batch_size": 1,
+        "timeseries": posthog.TIMESERIES_DIMENSION,
+        # Keeps each query under HogQL's 50k row limit
+        "chunk_days": 90,
+        "backfill_days": 3650,
+        "configured": lambda: bool(posthog.PH_API_KEY),
+    },
+    "cloudflare": {
+        "fetch": cloudflare.fetch_cf_daily_rows,
+        # One aliased GraphQL document per chunk for several site tags
+        "fetch_batch": cloudflare.fetch_cf_daily_rows_batch,
+        "batch_size": cloudflare.CF_BATCH_SITES,
+        "timeseries": cloudflare.TIMESERIES_ALIAS,
+        # Keeps each selection under Cloudflare's group limit
+        "chunk_days": 7,
+        # Cloudflare Web Analytics retains about six months of data
+        "backfill_days": 190,
+        "configured": lambda: bool(
+            cloudflare.CF_API_TOKEN and cloudflare.CF_ACCOUNT_TAG
+        ),
+    },
+}
+
+BREAKDOWN_FIELDS = ["path", "device_type", "referrer", "os_name", "country"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_timeseries (
+    provider TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    pageviews INTEGER NOT NULL,
+    visitors INTEGER NOT NULL,
+    PRIMARY KEY (provider, project_id, day)
+);
+CREATE TABLE IF NOT EXISTS daily_breakdowns (
+    provider TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    day TEXT NOT NULL,
+    key TEXT NOT NULL,
+    pageviews INTEGER NOT NULL,
+    visitors INTEGER NOT NULL,
+    PRIMARY KEY (provider, project_id, dimension, day, key)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    provider TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    closed_through TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    PRIMARY KEY (provider, project_id)
+);
+"""
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _chunk_ranges(start: date, end: date, chunk_days: int) -> list[tuple[date, date]]:
+    """Split [start, end) into consecutive ranges of at most chunk_days days."""
+    chunk = timedelta(days=chunk_days)
+    chunks = []
+    while start < end:
+        chunks.append((start, min(start + chunk, end)))
+        start += chunk
+    return chunks
+
+
+class LiveStore:
+    """
+    SQLite store of daily live rows with delta-only upstream sync.
+
+    Args:
+        path: Location of the SQLite database file
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._schema_ready = False
+        self._last_sync: dict[tuple[str, str], float] = {}
+        self.counters = {
+            "syncs": 0,
+            "batched_syncs": 0,
+            "sync_errors": 0,
+            "chunks": 0,
+            "rows": 0,
+        }
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, committing on success and always closing it."""
+        if not self._schema_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._schema_ready:
+                # WAL lets worker processes read while another one syncs
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- sync ---
+
+    def _closed_through(self, provider: str, project_id: str) -> date | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT closed_through FROM sync_state WHERE provider = ? AND project_id = ?",
+                (provider, project_id),
+            ).fetchone()
+        return date.fromisoformat(row[0]) if row else None
+
+    def _write_chunk(
+        self,
+        provider: str,
+        project_id: str,
+        start: date,
+        end: date,
+        rows: list[tuple],
+        closed_through: date | None,
+    ) -> None:
+        """Replace the stored rows of [start, end) and advance the sync state."""
+        marker = SYNC_SOURCES[provider]["timeseries"]
+        scope = (provider, project_id, start.isoformat(), end.isoformat())
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM daily_timeseries WHERE provider = ? AND project_id = ? AND day >= ? AND day < ?",
+                scope,
+            )
+            conn.execute(
+                "DELETE FROM daily_breakdowns WHERE provider = ? AND project_id = ? AND day >= ? AND day < ?",
+                scope,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_timeseries VALUES (?, ?, ?, ?, ?)",
+                [
+                    (provider, project_id, day, pageviews, visitors)
+                    for day, dimension, _, pageviews, visitors in rows
+                    if dimension == marker
+                ],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_breakdowns VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (provider, project_id, dimension, day, key, pageviews, visitors)
+                    for day, dimension, key, pageviews, visitors in rows
+                    if dimension != marker
+                ],
+            )
+            if closed_through is not None:
+                conn.execute(
+                    """
+                    INSERT INTO sync_state VALUES (?, ?, ?, ?)
+                    ON CONFLICT (provider, project_id) DO UPDATE SET
+                        closed_through = MAX(closed_through, excluded.closed_through),
+                        synced_at = excluded.synced_at
+                    """,
+                    (
+                        provider,
+                        project_id,
+                        closed_through.isoformat(),
+                        datetime.now(timezone.utc).isoformat(),
+                    ),
+                )
+
+    async def _sync_range(
+        self, provider: str, project_ids: list[str], start: date, today: date
+    ) -> bool:
+        """
+        Fetch and store [start, today] of projects sharing every chunk query.
+
+        Returns:
+            Whether every chunk was fetched (False if storing stopped at a
+            failed chunk, leaving the rest of the range for the next sync)
+        """
+        source = SYNC_SOURCES[provider]
+        chunks = _chunk_ranges(start, today + timedelta(days=1), source["chunk_days"])
+        semaphore = asyncio.Semaphore(LIVE_STORE_SYNC_CONCURRENCY)
+
+        async def fetch_chunk(
+            chunk_start: date, chunk_end: date
+        ) -> dict[str, list[tuple]]:
+            async with semaphore:
+                if len(project_ids) == 1:
+                    rows = await source["fetch"](
+                        project_ids[0], chunk_start, chunk_end, LIVE_STORE_DAILY_LIMIT
+                    )
+                    return {project_ids[0]: rows}
+                return await source["fetch_batch"](
+                    project_ids, chunk_start, chunk_end, LIVE_STORE_DAILY_LIMIT
+                )
+
+        results = await asyncio.gather(
+            *(fetch_chunk(s, e) for s, e in chunks), return_exceptions=True
+        )
+
+        self.counters["syncs"] += len(project_ids)
+        if len(project_ids) > 1:
+            self.counters["batched_syncs"] += len(project_ids)
+        failed = any(isinstance(result, Exception) for result in results)
+        for project_id in project_ids:
+            # Store chunks in order, stopping at the first failure so the
+            # sync state never skips over a gap
+            for (chunk_start, chunk_end), result in zip(chunks, results):
+                if isinstance(result, Exception):
+                    self.counters["sync_errors"] += 1
+                    print(f"Live store sync error ({provider} {project_id}): {result}")
+                    break
+                rows = result.get(project_id, [])
+                # Today is still partial; it is never marked closed
+                closed_through = min(chunk_end, today) - timedelta(days=1)
+                await asyncio.to_thread(
+                    self._write_chunk,
+                    provider,
+                    project_id,
+                    chunk_start,
+                    chunk_end,
+                    rows,
+                    closed_through if closed_through >= chunk_start else None,
+                )
+                self.counters["chunks"] += 1
+                self.counters["rows"] += len(rows)
+        return not failed
+
+    async def _sync(self, provider: str, project_ids: list[str]) -> list[str]:
+        """Sync several projects, returning those whose whole range was stored."""
+        source = SYNC_SOURCES[provider]
+        today = _today()
+        # Projects starting on the same day share every chunk query (synced
+        # projects all restart at the resync day, new ones at the backfill)
+        starts: dict[date, list[str]] = {}
+        for project_id in project_ids:
+            closed = await asyncio.to_thread(self._closed_through, provider, project_id)
+            if closed is None:
+                start = today - timedelta(days=source["backfill_days"])
+            else:
+                start = closed - timedelta(days=LIVE_STORE_RESYNC_DAYS - 1)
+            starts.setdefault(start, []).append(project_id)
+
+        ranges = list(starts.values())
+        complete = await asyncio.gather(
+            *(
+                self._sync_range(provider, ids, start, today)
+                for start, ids in starts.items()
+            )
+        )
+        return [
+            project_id
+            for ids, synced in zip(ranges, complete)
+            if synced
+            for project_id in ids
+        ]
+
+    async def sync(self, provider: str, project_id: str) -> None:
+        """
+        Fetch the days after the last closed day (and today) from upstream.
+
+        Concurrent calls share one sync, and a project is synced at most
+        once every LIVE_STORE_SYNC_INTERVAL seconds. If the store already
+        holds data, waits at most LIVE_STORE_SYNC_WAIT seconds (or until
+        the request's deadline, see deadline.py); the sync keeps running in
+        the background after that.
+
+        Args:
+            provider: "posthog" or "cloudflare"
+            project_id: PostHog project ID or Cloudflare site tag
+        """
+        await self.sync_many(provider, [project_id])
+
+    async def sync_many(self, provider: str, project_ids: list[str]) -> None:
+        """
+        Sync several projects of one provider (see sync()).
+
+        For providers with a batched fetcher (Cloudflare), the projects due
+        for a sync are fetched together, up to the provider's batch size
+        per upstream query, so refreshing every project of the provider
+        costs one round trip per chunk instead of one per project and chunk.
+        A concurrent sync() of one of the projects joins its batch.
+
+        Args:
+            provider: "posthog" or "cloudflare"
+            project_ids: PostHog project IDs or Cloudflare site tags
+        """
+        source = SYNC_SOURCES[provider]
+        if not source["configured"]():
+            return
+
+        cold = False
+        for project_id in project_ids:
+            if (provider, project_id) not in self._last_sync and (
+                await asyncio.to_thread(self._closed_through, provider, project_id)
+            ) is None:
+                cold = True
+                break
+
+        async def run(batch: list[str]) -> None:
+            complete = await self._sync(provider, batch)
+            synced = time.monotonic()
+            # A project whose sync stopped at a failed chunk is retried by
+            # the next request instead of waiting out the interval
+            for project_id in complete:
+                self._last_sync[(provider, project_id)] = synced
+
+        async def join(task: asyncio.Task) -> None:
+            try:
+                await task
+            finally:
+                collect_failures(task)
+
+        now = time.monotonic()
+        due, flights = [], []
+        for project_id in dict.fromkeys(project_ids):
+            key = ("live_store", provider, project_id)
+            last = self._last_sync.get((provider, project_id))
+            if upstream_flights.running(key):
+                # Join the sync already in flight
+                flights.append(
+                    upstream_flights.start(key, lambda batch=[project_id]: run(batch))
+                )
+            elif last is None or now - last >= LIVE_STORE_SYNC_INTERVAL:
+                due.append(project_id)
+
+        size = source["batch_size"] if source["fetch_batch"] else 1
+        for i in range(0, len(due), size):
+            batch = due[i : i + size]
+            task = start_tracked(run(batch))
+            # Registered before anything is awaited, so a concurrent sync()
+            # of one of the projects joins the batch instead of starting one
+            flights.extend(
+                upstream_flights.start(
+                    ("live_store", provider, project_id), lambda task=task: join(task)
+                )
+                for project_id in batch
+            )
+        if not flights:
+            return
+
+        flight = asyncio.gather(*(asyncio.shield(task) for task in flights))
+        try:
+            if cold:
+                # Nothing stored yet: the response needs the backfill
+                await flight
+                return
+            # A request with a deadline (see deadline.py) serves the stored
+            # rows in time rather than waiting on the sync
+            wait = LIVE_STORE_SYNC_WAIT
+            deadline = current_deadline.get()
+            if deadline is not None:
+                wait = min(wait, time_left(deadline))
+            try:
+                await asyncio.wait_for(flight, wait)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            # The syncs' upstream failures count for this computation
+            for task in flights:
+                collect_failures(task)
+
+    # --- reads ---
+
+    def _read_timeseries(
+        self, conn: sqlite3.Connection, provider: str, project_id: str, since: str
+    ) -> list[TimeseriesRecord]:
+        rows = conn.execute(
+            """
+            SELECT day, pageviews, visitors FROM daily_timeseries
+            WHERE provider = ? AND project_id = ? AND day >= ?
+            ORDER BY day ASC
+            """,
+            (provider, project_id, since),
+        ).fetchall()
+        return [
+            TimeseriesRecord(
+                date=datetime.fromisoformat(f"{day}T00:00:00+00:00"),
+                pageviews=pageviews,
+                visitors=visitors,
+                bounce_rate=0.0,
+            )
+            for day, pageviews, visitors in rows
+        ]
+
+    def _read_breakdowns(
+        self,
+        conn: sqlite3.Connection,
+        provider: str,
+        project_id: str,
+        since: str,
+        limit: int,
+    ) -> dict[str, list[StatRecord]]:
+        breakdowns = {}
+        for field in BREAKDOWN_FIELDS:
+            rows = conn.execute(
+                """
+                SELECT key, SUM(pageviews) AS pv, SUM(visitors) FROM daily_breakdowns
+                WHERE provider = ? AND project_id = ? AND dimension = ? AND day >= ?
+                GROUP BY key
+                ORDER BY pv DESC, key ASC
+                LIMIT ?
+                """,
+                (provider, project_id, field, since, limit),
+            ).fetchall()
+            breakdowns[field] = [
+                StatRecord(key=key, pageviews=pageviews, visitors=visitors)
+                for key, pageviews, visitors in rows
+            ]
+        return breakdowns
+
+    def _read_daily_breakdowns(
+        self, conn: sqlite3.Connection, provider: str, project_id: str, since: str
+    ) -> dict[str, list[tuple[str, str, int, int]]]:
+        breakdowns = {field: [] for field in BREAKDOWN_FIELDS}
+        rows = conn.execute(
+            """
+            SELECT dimension, day, key, pageviews, visitors FROM daily_breakdowns
+            WHERE provider = ? AND project_id = ? AND day >= ?
+            ORDER BY dimension, day
+            """,
+            (provider, project_id, since),
+        )
+        for dimension, day, key, pageviews, visitors in rows:
+            if dimension in breakdowns:
+                breakdowns[dimension].append((day, key, pageviews, visitors))
+        return breakdowns
+
+    def _since(self, days: int) -> str:
+        # Same calendar days an upstream `now() - INTERVAL days DAY` query covers
+        return (_today() - timedelta(days=days)).isoformat()
+
+    def read_timeseries(
+        self, provider: str, project_id: str, days: int
+    ) -> list[TimeseriesRecord]:
+        """Stored daily timeseries of the last `days` days."""
+        with self._connect() as conn:
+            return self._read_timeseries(conn, provider, project_id, self._since(days))
+
+    def read_breakdowns(
+        self, provider: str, project_id: str, days: int, limit: int = 15
+    ) -> dict[str, list[StatRecord]]:
+        """Stored top-`limit` breakdowns of the last `days` days."""
+        with self._connect() as conn:
+            return self._read_breakdowns(
+                conn, provider, project_id, self._since(days), limit
+            )
+
+    def read_stats(
+        self, provider: str, project_id: str, days: int, limit: int = 15
+    ) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+        """Stored timeseries and top-`limit` breakdowns of the last `days` days."""
+        since = self._since(days)
+        with self._connect() as conn:
+            return (
+                self._read_timeseries(conn, provider, project_id, since),
+                self._read_breakdowns(conn, provider, project_id, since, limit),
+            )
+
+    def read_window(
+        self, provider: str, project_id: str, days: int
+    ) -> tuple[list[TimeseriesRecord], dict[str, list[tuple[str, str, int, int]]]]:
+        """
+        Stored daily timeseries and daily breakdown rows of the last `days`
+        days (breakdown rows are (day, key, pageviews, visitors), by day).
+        """
+        since = self._since(days)
+        with self._connect() as conn:
+            return (
+                self._read_timeseries(conn, provider, project_id, since),
+                self._read_daily_breakdowns(conn, provider, project_id, since),
+            )
+
+    async def window(
+        self, provider: str, project_id: str, days: int
+    ) -> tuple[list[TimeseriesRecord], dict[str, list[tuple[str, str, int, int]]]]:
+        """Sync a project, then read its daily rows locally (see read_window())."""
+        await self.sync(provider, project_id)
+        return await asyncio.to_thread(self.read_window, provider, project_id, days)
+
+    async def timeseries(
+        self, provider: str, project_id: str, days: int
+    ) -> list[TimeseriesRecord]:
+        """Sync a project, then read its daily timeseries locally."""
+        await self.sync(provider, project_id)
+        return await asyncio.to_thread(self.read_timeseries, provider, project_id, days)
+
+    async def breakdowns(
+        self, provider: str, project_id: str, days: int
+    ) -> dict[str, list[StatRecord]]:
+        """Sync a project, then read its breakdowns locally."""
+        await self.sync(provider, project_id)
+        return await asyncio.to_thread(self.read_breakdowns, provider, project_id, days)
+
+    async def stats(
+        self, provider: str, project_id: str, days: int
+    ) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+        """Sync a project, then read its timeseries and breakdowns locally."""
+        await self.sync(provider, project_id)
+        return await asyncio.to_thread(self.read_stats, provider, project_id, days)
+
+    def status(self) -> dict:
+        """Sync counters and the sync state of every stored project."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT provider, project_id, closed_through, synced_at FROM sync_state"
+            ).fetchall()
+        return {
+            **self.counters,
+            "path": str(self.path),
+            "projects": [
+                {
+                    "provider": provider,
+                    "project_id": project_id,
+                    "closed_through": closed_through,
+                    "synced_at": synced_at,
+                }
+                for provider, project_id, closed_through, synced_at in rows
+            ],
+        }
+
+
+live_store = LiveStore(LIVE_STORE_PATH)
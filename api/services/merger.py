@@ -2,115 +2,371 @@
 Data Merging Service
 
 Handles the unification of Vercel migration data and PostHog live data.
+The merges take any number of inputs, so the same code combines several
+projects into one. Each merge is timed in /metrics (see metrics.py).
 """
 
-from models import StatEntry, TimeseriesEntry, Stats
+from models import StatEntry, Stats
+import heapq
 import sys
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 # Add parent directory to path to import utils
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from utils import get_country_display
+from .columnar import STAT_DIMENSIONS
+from .metrics import timed
+from .records import StatRecord, TimeseriesRecord
+from .rollup import TIERS, bucket_end, bucket_start, to_epoch
 
+# Key of the entry summing every breakdown key beyond a requested limit
+OTHER_KEY = "(other)"
 
-def merge_stat_lists(
-    list_a: list[StatEntry], list_b: list[StatEntry]
-) -> list[StatEntry]:
+
+def _pageviews(item: tuple[str, list[int]]) -> int:
+    return item[1][0]
+
+
+def add_stat_entries(
+    totals: dict[str, list[int]], entries: list[StatRecord] | list[StatEntry]
+) -> dict[str, list[int]]:
     """
-    Merge two lists of StatEntry objects, summing pageviews/visitors for matching keys.
+    Add breakdown entries' pageviews/visitors into a dictionary of per-key totals.
     Keys are normalized to lowercase for case-insensitive matching.
 
     Args:
-        list_a: First list of StatEntry objects (e.g., from Vercel)
-        list_b: Second list of StatEntry objects (e.g., from PostHog)
+        totals: Dictionary of normalized key -> [pageviews, visitors], updated in place
+        entries: StatRecord (or StatEntry) objects to add
 
     Returns:
-        Merged and sorted list of StatEntry objects
+        The updated totals dictionary
     """
-    merged: dict[str, StatEntry] = {}
-
-    for entry in list_a + list_b:
+    for entry in entries:
         # Normalize key to lowercase for case-insensitive matching
         normalized_key = entry.key.lower() if entry.key else entry.key
-        if normalized_key in merged:
-            # Sum the values for duplicate keys
-            merged[normalized_key].pageviews += entry.pageviews
-            merged[normalized_key].visitors += entry.visitors
+        total = totals.get(normalized_key)
+        if total is None:
+            totals[normalized_key] = [entry.pageviews, entry.visitors]
         else:
-            # Create a new copy with normalized key
-            merged[normalized_key] = StatEntry(
-                key=normalized_key, pageviews=entry.pageviews, visitors=entry.visitors
+            # Sum the values for duplicate keys
+            total[0] += entry.pageviews
+            total[1] += entry.visitors
+    return totals
+
+
+def top_stat_entries(
+    totals: dict[str, list[int]], limit: int | None = None
+) -> list[StatRecord]:
+    """
+    The top entries of a dictionary of per-key totals, by pageviews.
+
+    With a limit, only the top `limit` keys are selected (a heap, not a full
+    sort) and the remaining keys are summed into one OTHER_KEY entry.
+
+    Args:
+        totals: Dictionary of normalized key -> [pageviews, visitors]
+        limit: Maximum number of keys to return (None for all)
+
+    Returns:
+        StatRecord objects sorted by pageviews descending
+    """
+    ranked_items = totals.items()
+    if limit is None or len(totals) <= limit:
+        ranked = sorted(ranked_items, key=_pageviews, reverse=True)
+    else:
+        ranked = heapq.nlargest(limit, ranked_items, key=_pageviews)
+
+    entries = [
+        StatRecord(key=key, pageviews=pageviews, visitors=visitors)
+        for key, (pageviews, visitors) in ranked
+    ]
+    if len(ranked) < len(totals):
+        # Everything outside the top keys, as one entry
+        other_pageviews = sum(pageviews for pageviews, _ in totals.values())
+        other_visitors = sum(visitors for _, visitors in totals.values())
+        for entry in entries:
+            other_pageviews -= entry.pageviews
+            other_visitors -= entry.visitors
+        entries.append(
+            StatRecord(
+                key=OTHER_KEY, pageviews=other_pageviews, visitors=other_visitors
             )
+        )
+    return entries
+
+
+@timed
+def merge_stat_lists(
+    *lists: list[StatRecord], limit: int | None = None
+) -> list[StatRecord]:
+    """
+    Merge lists of StatRecord objects, summing pageviews/visitors for matching keys.
+    Keys are normalized to lowercase for case-insensitive matching.
+
+    Args:
+        *lists: Lists of StatRecord objects (e.g., from Vercel and PostHog)
+        limit: Maximum number of entries (None for all); the rest are
+            summed into an OTHER_KEY entry
+
+    Returns:
+        Merged and sorted list of StatRecord objects
+    """
+    totals: dict[str, list[int]] = {}
+    for entries in lists:
+        add_stat_entries(totals, entries)
+    return top_stat_entries(totals, limit)
+
+
+@timed
+def sum_stat_totals(
+    *totals: dict[str, dict[str, list[int]]],
+) -> dict[str, dict[str, list[int]]]:
+    """
+    Sum per-dimension totals (e.g. one per project) into new dictionaries.
+
+    Args:
+        *totals: Dimension -> {normalized key: [pageviews, visitors]}
+
+    Returns:
+        Dimension -> summed {normalized key: [pageviews, visitors]}
+    """
+    summed: dict[str, dict[str, list[int]]] = {d: {} for d in STAT_DIMENSIONS}
+    for dimensions in totals:
+        for dimension, keys in dimensions.items():
+            target = summed.setdefault(dimension, {})
+            for key, (pageviews, visitors) in keys.items():
+                total = target.get(key)
+                if total is None:
+                    target[key] = [pageviews, visitors]
+                else:
+                    total[0] += pageviews
+                    total[1] += visitors
+    return summed
+
 
-    # Sort by pageviews descending
-    return sorted(merged.values(), key=lambda x: x.pageviews, reverse=True)
+# Sorts before every timestamp (the end of "no bucket yet")
+_NEVER = datetime.min.replace(tzinfo=timezone.utc)
 
 
+def _first_key(bucket: list) -> datetime:
+    return bucket[0]
+
+
+def _entry_epoch(entry: TimeseriesRecord) -> int:
+    return to_epoch(entry.date)
+
+
+def _sum_buckets(entries: list[TimeseriesRecord], resolution: str) -> list[list]:
+    """
+    Sum a date-sorted list's entries per bucket, in one pass (a list that
+    turns out not to be sorted is sorted first).
+
+    Entries are compared with the current bucket's bounds, so the epoch
+    and bucket start are only computed when an entry skips past the next
+    bucket (rows with gaps, or month buckets).
+
+    Returns:
+        [bucket start, lone entry (None once the bucket has several),
+        pageviews, visitors, bounced, migration_date] per bucket, in order
+    """
+    if resolution not in TIERS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    width = None if resolution == "month" else timedelta(seconds=TIERS[resolution])
+    buckets: list[list] = []
+    start = end = _NEVER
+    bucket: list = []
+    for entry in entries:
+        moment = entry.date
+        if moment.tzinfo is None:
+            # Naive timestamps are UTC (see to_epoch())
+            moment = moment.replace(tzinfo=timezone.utc)
+        if moment < end:
+            if moment < start:
+                return _sum_buckets(sorted(entries, key=_entry_epoch), resolution)
+            bucket[1] = None
+            bucket[2] += entry.pageviews
+            bucket[3] += entry.visitors
+            bucket[4] += entry.bounce_rate * entry.pageviews
+            if entry.migration_date != bucket[5]:
+                bucket[5] = None
+            continue
+        if width is not None and moment < end + width:
+            start, end = end, end + width
+        else:
+            key = bucket_start(to_epoch(moment), resolution)
+            start = datetime.fromtimestamp(key, timezone.utc)
+            end = datetime.fromtimestamp(bucket_end(key, resolution), timezone.utc)
+        bucket = [
+            start,
+            entry,
+            entry.pageviews,
+            entry.visitors,
+            entry.bounce_rate * entry.pageviews,
+            entry.migration_date,
+        ]
+        buckets.append(bucket)
+    return buckets
+
+
+def _close_bucket(bucket: list) -> TimeseriesRecord:
+    """The merged entry of a bucket built by _sum_buckets() (see make_bucket())."""
+    start, lone, pageviews, visitors, bounced, migration_date = bucket
+    # A lone entry already at its bucket start (e.g. a daily live row) is
+    # reused as is rather than rebuilt
+    if (
+        lone is not None
+        and lone.date == start
+        and lone.date.tzinfo is timezone.utc
+        and (pageviews > 0 or lone.bounce_rate == 0.0)
+    ):
+        return lone
+    return TimeseriesRecord(
+        date=start,
+        pageviews=pageviews,
+        visitors=visitors,
+        bounce_rate=bounced / pageviews if pageviews else 0.0,
+        migration_date=migration_date,
+    )
+
+
+@timed
 def merge_timeseries(
-    list_a: list[TimeseriesEntry], list_b: list[TimeseriesEntry]
-) -> list[TimeseriesEntry]:
+    *lists: list[TimeseriesRecord], resolution: str = "day"
+) -> list[TimeseriesRecord]:
     """
-    Merge two timeseries lists and sort by date.
-    Filters to start from the first non-zero pageview entry.
+    Merge date-sorted timeseries lists into buckets of one resolution.
+
+    Each input is summed per bucket in one pass (e.g. hourly Vercel rows
+    into days), and the resulting bucket runs, already in order, are
+    merge-joined with heapq.merge: O(n + b log k) for n rows, b buckets
+    and k lists. Buckets with the same start, from any list, are summed
+    into one (bounce rate weighted by pageviews). Starts from the first
+    bucket with non-zero pageviews.
 
     Args:
-        list_a: First timeseries list (e.g., from Vercel)
-        list_b: Second timeseries list (e.g., from PostHog)
+        *lists: Timeseries lists (e.g. Vercel and PostHog, or one merged
+            list per project), each sorted by date
+        resolution: Bucket size ("hour", "day", "week", "month")
 
     Returns:
-        Merged and sorted timeseries list starting from first non-zero pageviews
+        Merged timeseries list, one entry per bucket, sorted by date
     """
-    # Combine and sort by date
-    combined = list_a + list_b
-    sorted_data = sorted(combined, key=lambda x: x.date)
+    runs = [_sum_buckets(entries, resolution) for entries in lists if entries]
+    if len(runs) == 1:
+        buckets = runs[0]
+    else:
+        buckets = []
+        for bucket in heapq.merge(*runs, key=_first_key):
+            if not buckets or buckets[-1][0] != bucket[0]:
+                buckets.append(bucket)
+                continue
+            last = buckets[-1]
+            last[1] = None
+            last[2] += bucket[2]
+            last[3] += bucket[3]
+            last[4] += bucket[4]
+            if bucket[5] != last[5]:
+                last[5] = None
+    merged = [_close_bucket(bucket) for bucket in buckets]
 
-    # Find first non-zero pageview entry
+    # Find first non-zero pageview bucket
     first_nonzero_idx = next(
-        (i for i, entry in enumerate(sorted_data) if entry.pageviews > 0), 0
+        (i for i, entry in enumerate(merged) if entry.pageviews > 0), 0
     )
 
-    return sorted_data[first_nonzero_idx:]
+    return merged[first_nonzero_idx:]
 
 
+@timed
 def merge_stats(
-    vercel_stats: Stats, posthog_stats: dict[str, list[StatEntry]]
+    *breakdowns: Stats | dict[str, list[StatRecord]],
+    limit: int | None = None,
 ) -> Stats:
     """
-    Merge Vercel Stats with PostHog breakdown data.
+    Merge Stats objects and/or breakdown dictionaries (e.g. Vercel Stats
+    with PostHog breakdown data, or several projects' breakdowns).
     Formats country codes to display names with flags.
 
     Args:
-        vercel_stats: Stats object from Vercel migration data
-        posthog_stats: Dictionary of PostHog breakdown results
+        *breakdowns: Stats objects or dictionaries of dimension -> StatRecord list
+        limit: Maximum number of entries per dimension (None for all)
 
     Returns:
         Merged Stats object with formatted country names
     """
-    # Merge country data and format the keys
-    merged_countries = merge_stat_lists(
-        vercel_stats.country, posthog_stats.get("country", [])
-    )
+    totals: dict[str, dict[str, list[int]]] = {d: {} for d in STAT_DIMENSIONS}
+    for stats in breakdowns:
+        for dimension in STAT_DIMENSIONS:
+            entries = (
+                getattr(stats, dimension)
+                if isinstance(stats, Stats)
+                else stats.get(dimension, [])
+            )
+            add_stat_entries(totals[dimension], entries)
+    return Stats.model_validate(format_stat_totals(totals, limit), from_attributes=True)
+
+
+@timed
+def merge_stat_totals(
+    vercel_totals: dict[str, dict[str, list[int]]],
+    live_breakdowns: dict[str, list[StatRecord]],
+) -> dict[str, dict[str, list[int]]]:
+    """
+    Merge pre-normalized Vercel per-key totals with live breakdown data.
+
+    The live entries are added into the Vercel totals dictionaries (which
+    are updated in place), before the top-`limit` cut, so several projects'
+    totals can still be summed (see sum_stat_totals and format_stat_totals).
+
+    Args:
+        vercel_totals: Dimension -> {normalized key: [pageviews, visitors]}
+            (see dataset_stat_totals)
+        live_breakdowns: Dictionary of PostHog/Cloudflare breakdown results
+
+    Returns:
+        Dimension -> merged {normalized key: [pageviews, visitors]}
+    """
+    for dimension in STAT_DIMENSIONS:
+        vercel_totals[dimension] = add_stat_entries(
+            vercel_totals.get(dimension, {}), live_breakdowns.get(dimension, [])
+        )
+    return vercel_totals
+
+
+@timed
+def format_stat_totals(
+    totals: dict[str, dict[str, list[int]]], limit: int | None = None
+) -> dict[str, list[StatRecord]]:
+    """
+    Turn per-dimension totals into the top `limit` entries of each
+    dimension, with formatted country names.
+
+    Args:
+        totals: Dimension -> {normalized key: [pageviews, visitors]}
+        limit: Maximum number of entries per dimension (None for all); the
+            rest are summed into an OTHER_KEY entry
+
+    Returns:
+        Dictionary of dimension -> StatRecord list
+    """
+    merged = {
+        dimension: top_stat_entries(totals.get(dimension, {}), limit)
+        for dimension in STAT_DIMENSIONS
+    }
 
     # Format country codes to display names with flags
-    formatted_countries = [
-        StatEntry(
-            key=get_country_display(entry.key),
-            pageviews=entry.pageviews,
-            visitors=entry.visitors,
+    merged["country"] = [
+        (
+            entry
+            if entry.key == OTHER_KEY
+            else StatRecord(
+                key=get_country_display(entry.key),
+                pageviews=entry.pageviews,
+                visitors=entry.visitors,
+            )
         )
-        for entry in merged_countries
+        for entry in merged["country"]
     ]
 
-    return Stats(
-        path=merge_stat_lists(vercel_stats.path, posthog_stats.get("path", [])),
-        device_type=merge_stat_lists(
-            vercel_stats.device_type, posthog_stats.get("device_type", [])
-        ),
-        referrer=merge_stat_lists(
-            vercel_stats.referrer, posthog_stats.get("referrer", [])
-        ),
-        os_name=merge_stat_lists(
-            vercel_stats.os_name, posthog_stats.get("os_name", [])
-        ),
-        country=formatted_countries,
-    )
+    return merged
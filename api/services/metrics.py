@@ -0,0 +1,332 @@
+"""
+Prometheus Metrics
+
+In-process counters and histograms, exposed at GET /metrics in the
+Prometheus text format (no client library or push gateway needed):
+
+    analytics_request_duration_seconds     per route, slug, method and status
+    analytics_upstream_duration_seconds    per upstream request attempt
+    analytics_upstream_errors_total        failed attempts (incl. timeouts)
+    analytics_upstream_timeouts_total      timed out attempts
+    analytics_phase_duration_seconds       migration data loading, filtering
+                                           and merging, per function
+    analytics_cpu_job_duration_seconds     CPU executor jobs, per job
+
+plus the response cache, single-flight, circuit breaker, CPU executor and
+event loop lag counters, which are read from their owners when scraped.
+
+Recording a sample is a bisect and a few additions under a lock, and the
+text is only built on scrape, so metrics stay on in production. Histogram
+buckets are fixed, and label values are bounded (route templates, not
+paths; slugs only of registered projects). With CPU_EXECUTOR=process, the
+phases run in the worker processes and are not included; the CPU job
+durations are.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from functools import wraps
+from typing import Any
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASE_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    A named metric family with a fixed set of label names.
+
+    Args:
+        name: Metric name
+        help: One-line description
+        labels: Label names, in the order values are passed
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        """The HELP, TYPE and sample lines of the family."""
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """A monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *label_values: Any, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    """
+    Observations counted into fixed buckets per label set.
+
+    Args:
+        buckets: Sorted bucket upper bounds (+Inf is implied)
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # Label values -> per-bucket counts (last one +Inf), then the sum
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: Any) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1)
+                series.append(0.0)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        with self._lock:
+            snapshot = [
+                (values, list(series)) for values, series in self._series.items()
+            ]
+        names = (*self.labels, "le")
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                labels = _format_labels(names, (*label_values, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """
+    A counter or gauge whose samples are read when scraped, from state its
+    owner already keeps (e.g. the response cache counters).
+
+    Args:
+        kind: "counter" or "gauge"
+        collect: Returns (label values, value) pairs
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        collect: Callable[[], Iterable[tuple[tuple, float]]],
+        labels: tuple[str, ...] = (),
+    ):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for label_values, value in self.collect():
+            if value is None:
+                continue
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Every metric family of the process, rendered together on scrape."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        collect: Callable[[], Iterable[tuple[tuple, float]]],
+        labels: tuple[str, ...] = (),
+    ) -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, kind, collect, labels))
+
+    def render(self) -> str:
+        """Every metric family in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Metrics error ({metric.name}): {e}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "analytics_request_duration_seconds",
+    "HTTP request latency, until the response body is sent",
+    ("route", "slug", "method", "status"),
+)
+phase_duration = metrics.histogram(
+    "analytics_phase_duration_seconds",
+    "Time spent loading, filtering and merging data, per function",
+    ("phase",),
+    PHASE_BUCKETS,
+)
+
+
+def timed(fn: Callable) -> Callable:
+    """
+    Record every call's duration in analytics_phase_duration_seconds, with
+    the function name as the phase (a no-op when metrics are disabled).
+    """
+    if not METRICS_ENABLED:
+        return fn
+    phase = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            phase_duration.observe(time.perf_counter() - started, phase)
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording analytics_request_duration_seconds.
+
+    Requests are labelled with their route template (e.g.
+    /api/v1/{project_slug}/stats), so label values stay bounded; the slug
+    label is only set for registered projects.
+
+    Args:
+        app: The wrapped ASGI app
+        slugs: Registered project slugs
+    """
+
+    def __init__(self, app, slugs: Iterable[str] = ()):
+        self.app = app
+        self.slugs = frozenset(slugs)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            slug = scope.get("path_params", {}).get("project_slug")
+            request_duration.observe(
+                time.perf_counter() - started,
+                route,
+                slug if slug in self.slugs else "",
+                scope["method"],
+                status,
+            )
@@ -6,16 +6,26 @@ Supports dynamic project ID for multi-project analytics.
 """
 
 import os
-from datetime import datetime
+from datetime import date, datetime, timezone
 import httpx
 
-from models import StatEntry, TimeseriesEntry
+from .records import StatRecord, TimeseriesRecord
+from .clients import post
+from .singleflight import coalesce
 
 
 # PostHog API Configuration
 PH_API_KEY = os.getenv("POSTHOG_API_KEY", "")
 PH_BASE_URL = os.getenv("POSTHOG_BASE_URL", "https://us.posthog.com")
 
+# Batched mode: compute all breakdowns in one HogQL query, and optionally
+# fold the timeseries into the same round trip
+PH_BATCH_BREAKDOWNS = os.getenv("POSTHOG_BATCH_BREAKDOWNS", "true").lower() in ("1", "true", "yes")
+PH_BATCH_TIMESERIES = os.getenv("POSTHOG_BATCH_TIMESERIES", "true").lower() in ("1", "true", "yes")
+
+# Marker for timeseries rows in a batched result
+TIMESERIES_DIMENSION = "__timeseries__"
+
 # Field mapping for PostHog internal property names
 PH_FIELDS = {
     "path": "properties.$pathname",
@@ -25,7 +35,37 @@ PH_FIELDS = {
     "country": "properties.$geoip_country_code"
 }
 
+BREAKDOWN_FIELDS = ["path", "device_type", "referrer", "os_name", "country"]
+
+
+async def post_query(project_id: str, hogql: str) -> list:
+    """
+    Execute a HogQL query, raising on errors instead of returning no rows.
+    
+    Args:
+        project_id: The PostHog project ID
+        hogql: The HogQL query string
+        
+    Returns:
+        List of result rows from the query
+        
+    Raises:
+        httpx.HTTPError: If the request fails or returns an error status
+    """
+    url = f"{PH_BASE_URL}/api/projects/{project_id}/query/"
+    headers = {"Authorization": f"Bearer {PH_API_KEY}"}
+    
+    response = await post(
+        "posthog",
+        url, 
+        headers=headers, 
+        json={"query": {"kind": "HogQLQuery", "query": hogql}},
+    )
+    response.raise_for_status()
+    return response.json().get("results", [])
+
 
+@coalesce("posthog")
 async def query_posthog(project_id: str, hogql: str) -> list:
     """
     Execute a HogQL query against a specific PostHog project.
@@ -40,25 +80,15 @@ async def query_posthog(project_id: str, hogql: str) -> list:
     if not PH_API_KEY:
         return []
     
-    url = f"{PH_BASE_URL}/api/projects/{project_id}/query/"
-    headers = {"Authorization": f"Bearer {PH_API_KEY}"}
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                url, 
-                headers=headers, 
-                json={"query": {"kind": "HogQLQuery", "query": hogql}},
-                timeout=20.0
-            )
-            response.raise_for_status()
-            return response.json().get("results", [])
-        except httpx.HTTPError as e:
-            print(f"PostHog API error: {e}")
-            return []
+    try:
+        return await post_query(project_id, hogql)
+    except httpx.HTTPError as e:
+        print(f"PostHog API error: {e}")
+        return []
 
 
-async def fetch_timeseries(project_id: str, days: int = 30) -> list[TimeseriesEntry]:
+@coalesce("posthog")
+async def fetch_timeseries(project_id: str, days: int = 30) -> list[TimeseriesRecord]:
     """
     Fetch timeseries pageview data from PostHog.
     
@@ -67,7 +97,7 @@ async def fetch_timeseries(project_id: str, days: int = 30) -> list[TimeseriesEn
         days: Number of days to look back
         
     Returns:
-        List of TimeseriesEntry objects
+        List of TimeseriesRecord objects
     """
     query = f"""
         SELECT 
@@ -84,7 +114,7 @@ async def fetch_timeseries(project_id: str, days: int = 30) -> list[TimeseriesEn
     results = await query_posthog(project_id, query)
     
     return [
-        TimeseriesEntry(
+        TimeseriesRecord(
             date=datetime.fromisoformat(row[0]) if isinstance(row[0], str) else row[0],
             pageviews=row[1],
             visitors=row[2],
@@ -94,7 +124,7 @@ async def fetch_timeseries(project_id: str, days: int = 30) -> list[TimeseriesEn
     ]
 
 
-async def fetch_breakdown(project_id: str, field: str, days: int = 30, limit: int = 15) -> list[StatEntry]:
+async def fetch_breakdown(project_id: str, field: str, days: int = 30, limit: int = 15) -> list[StatRecord]:
     """
     Fetch breakdown statistics for a specific field from PostHog.
     
@@ -105,7 +135,7 @@ async def fetch_breakdown(project_id: str, field: str, days: int = 30, limit: in
         limit: Maximum number of results to return
         
     Returns:
-        List of StatEntry objects
+        List of StatRecord objects
     """
     target = PH_FIELDS.get(field, "properties.$pathname")
     
@@ -126,7 +156,7 @@ async def fetch_breakdown(project_id: str, field: str, days: int = 30, limit: in
     results = await query_posthog(project_id, query)
     
     return [
-        StatEntry(
+        StatRecord(
             key=str(row[0]),
             pageviews=row[1],
             visitors=row[2]
@@ -135,23 +165,256 @@ async def fetch_breakdown(project_id: str, field: str, days: int = 30, limit: in
     ]
 
 
-async def fetch_all_breakdowns(project_id: str, days: int = 30) -> dict[str, list[StatEntry]]:
+def build_batched_query(days: int = 30, limit: int = 15, include_timeseries: bool = False) -> str:
+    """
+    Build one HogQL query computing the top-N of every breakdown field.
+
+    Each pageview is expanded into one (field, value) pair per field with
+    ARRAY JOIN, grouped once, and trimmed to the top `limit` values per
+    field with LIMIT BY. Optionally the daily timeseries is appended with
+    UNION ALL, using TIMESERIES_DIMENSION as the field name and the day's
+    epoch seconds as the key.
+    
+    Args:
+        days: Number of days to look back
+        limit: Maximum number of results per field
+        include_timeseries: Whether to fold the timeseries into the query
+        
+    Returns:
+        The HogQL query string (rows are [field, key, pageviews, visitors])
+    """
+    pairs = ",\n                    ".join(
+        f"tuple('{field}', toString({PH_FIELDS[field]}))" for field in BREAKDOWN_FIELDS
+    )
+    
+    parts = [f"""
+            SELECT 
+                pair.1 as dimension,
+                pair.2 as key,
+                count() as pageviews,
+                count(DISTINCT distinct_id) as visitors
+            FROM events 
+            ARRAY JOIN [
+                    {pairs}
+                ] as pair
+            WHERE event = '$pageview' 
+                AND timestamp > now() - INTERVAL {days} DAY
+                AND pair.2 IS NOT NULL
+            GROUP BY dimension, key 
+            ORDER BY dimension ASC, pageviews DESC 
+            LIMIT {limit} BY dimension
+    """]
+    max_rows = limit * len(BREAKDOWN_FIELDS)
+    
+    if include_timeseries:
+        parts.append(f"""
+            SELECT 
+                '{TIMESERIES_DIMENSION}' as dimension,
+                toString(toUnixTimestamp(toStartOfDay(timestamp))) as key, 
+                count() as pageviews, 
+                count(DISTINCT distinct_id) as visitors
+            FROM events 
+            WHERE event = '$pageview' 
+                AND timestamp > now() - INTERVAL {days} DAY
+            GROUP BY key
+    """)
+        max_rows += days + 1
+    
+    # HogQL applies a default LIMIT of 100 rows, so always set one explicitly
+    query = f"""
+        SELECT dimension, key, pageviews, visitors
+        FROM ({"            UNION ALL".join(parts)})
+        LIMIT {max_rows}
+    """
+    
+    return query
+
+
+def parse_batched_results(rows: list) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
     """
-    Fetch all breakdown statistics in parallel.
+    Split the rows of a batched query back into timeseries and breakdowns.
+    
+    Args:
+        rows: Result rows of build_batched_query()
+        
+    Returns:
+        Tuple of (timeseries sorted by date, breakdowns keyed by field name)
+    """
+    timeseries: list[TimeseriesRecord] = []
+    breakdowns: dict[str, list[StatRecord]] = {field: [] for field in BREAKDOWN_FIELDS}
+    
+    for dimension, key, pageviews, visitors in rows:
+        if dimension == TIMESERIES_DIMENSION:
+            timeseries.append(
+                TimeseriesRecord(
+                    date=datetime.fromtimestamp(int(key), timezone.utc),
+                    pageviews=pageviews,
+                    visitors=visitors,
+                    bounce_rate=0.0
+                )
+            )
+        elif dimension in breakdowns:
+            breakdowns[dimension].append(
+                StatRecord(key=str(key), pageviews=pageviews, visitors=visitors)
+            )
+    
+    # The outer SELECT doesn't guarantee the subqueries' ordering
+    timeseries.sort(key=lambda x: x.date)
+    for entries in breakdowns.values():
+        entries.sort(key=lambda x: x.pageviews, reverse=True)
+    return timeseries, breakdowns
+
+
+async def fetch_batched(project_id: str, days: int = 30, limit: int = 15, include_timeseries: bool = False) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    """
+    Fetch every breakdown (and optionally the timeseries) in one round trip.
     
     Args:
         project_id: The PostHog project ID
         days: Number of days to look back
+        limit: Maximum number of results per field
+        include_timeseries: Whether to fold the timeseries into the query
         
     Returns:
-        Dictionary mapping field names to lists of StatEntry objects
+        Tuple of (timeseries, breakdowns); the timeseries is empty unless requested
+    """
+    query = build_batched_query(days, limit, include_timeseries)
+    results = await query_posthog(project_id, query)
+    return parse_batched_results(results)
+
+
+@coalesce("posthog")
+async def fetch_all_breakdowns(project_id: str, days: int = 30) -> dict[str, list[StatRecord]]:
+    """
+    Fetch all breakdown statistics, in one batched query or in parallel.
+    
+    Args:
+        project_id: The PostHog project ID
+        days: Number of days to look back
+        
+    Returns:
+        Dictionary mapping field names to lists of StatRecord objects
     """
     import asyncio
     
-    fields = ["path", "device_type", "referrer", "os_name", "country"]
+    if PH_BATCH_BREAKDOWNS:
+        _, breakdowns = await fetch_batched(project_id, days)
+        return breakdowns
+    
+    fields = BREAKDOWN_FIELDS
     
     # Execute all breakdown queries in parallel
     tasks = [fetch_breakdown(project_id, field, days) for field in fields]
     results = await asyncio.gather(*tasks)
     
     return dict(zip(fields, results))
+
+
+@coalesce("posthog")
+async def fetch_posthog_stats(project_id: str, days: int = 30) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    """
+    Fetch the timeseries and all breakdowns for a project.
+    
+    With batching fully enabled this is a single HogQL query; otherwise the
+    timeseries and breakdown queries run in parallel.
+    
+    Args:
+        project_id: The PostHog project ID
+        days: Number of days to look back
+        
+    Returns:
+        Tuple of (timeseries, breakdowns)
+    """
+    import asyncio
+    
+    if PH_BATCH_BREAKDOWNS and PH_BATCH_TIMESERIES:
+        return await fetch_batched(project_id, days, include_timeseries=True)
+    
+    timeseries, breakdowns = await asyncio.gather(
+        fetch_timeseries(project_id, days),
+        fetch_all_breakdowns(project_id, days)
+    )
+    return timeseries, breakdowns
+
+
+def build_daily_query(start: date, end: date, limit: int = 100) -> str:
+    """
+    Build one HogQL query returning per-day timeseries and breakdown rows.
+
+    Like build_batched_query(), but grouped by calendar day as well, keeping
+    the top `limit` values per field and day.
+
+    Args:
+        start: First day to include
+        end: Day after the last day to include
+        limit: Maximum number of results per field and day
+
+    Returns:
+        The HogQL query string (rows are [day, field, key, pageviews, visitors],
+        timeseries rows use TIMESERIES_DIMENSION and an empty key)
+    """
+    pairs = ",\n                    ".join(
+        f"tuple('{field}', toString({PH_FIELDS[field]}))" for field in BREAKDOWN_FIELDS
+    )
+    window = f"toDate(timestamp) >= toDate('{start.isoformat()}') AND toDate(timestamp) < toDate('{end.isoformat()}')"
+    days = (end - start).days
+    
+    query = f"""
+        SELECT day, dimension, key, pageviews, visitors
+        FROM (
+            SELECT 
+                toString(toDate(timestamp)) as day,
+                pair.1 as dimension,
+                pair.2 as key,
+                count() as pageviews,
+                count(DISTINCT distinct_id) as visitors
+            FROM events 
+            ARRAY JOIN [
+                    {pairs}
+                ] as pair
+            WHERE event = '$pageview' 
+                AND {window}
+                AND pair.2 IS NOT NULL
+            GROUP BY day, dimension, key 
+            ORDER BY day ASC, dimension ASC, pageviews DESC 
+            LIMIT {limit} BY day, dimension
+            UNION ALL
+            SELECT 
+                toString(toDate(timestamp)) as day,
+                '{TIMESERIES_DIMENSION}' as dimension,
+                '' as key,
+                count() as pageviews, 
+                count(DISTINCT distinct_id) as visitors
+            FROM events 
+            WHERE event = '$pageview' 
+                AND {window}
+            GROUP BY day
+        )
+        LIMIT {days * (limit * len(BREAKDOWN_FIELDS) + 1)}
+    """
+    
+    return query
+
+
+async def fetch_daily_rows(project_id: str, start: date, end: date, limit: int = 100) -> list[tuple]:
+    """
+    Fetch per-day timeseries and breakdown rows for [start, end).
+    
+    Args:
+        project_id: The PostHog project ID
+        start: First day to include
+        end: Day after the last day to include
+        limit: Maximum number of results per field and day
+        
+    Returns:
+        List of (day, field, key, pageviews, visitors) tuples
+        
+    Raises:
+        httpx.HTTPError: If the query fails (so callers never mistake an
+            error for days without traffic)
+    """
+    rows = await post_query(project_id, build_daily_query(start, end, limit))
+    return [
+        (day, dimension, str(key) if dimension != TIMESERIES_DIMENSION else "", pageviews, visitors)
+        for day, dimension, key, pageviews, visitors in rows
+    ]
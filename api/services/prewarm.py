@@ -0,0 +1,202 @@
+"""
+Prewarm Scheduler
+
+Keeps the /stats responses of every registered project warm in the
+response cache, so interactive requests almost never wait on PostHog or
+Cloudflare. Each project is refreshed on its own jittered interval (the
+jitter spreads projects out instead of refreshing them in lockstep), and a
+shared semaphore bounds how many responses are rebuilt at once. With the
+live store, the live rows of the widest period are read once per refresh
+and the other periods are sliced from them, and Cloudflare-backed projects
+are synced together in batched upstream queries.
+"""
+
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from .aggregate import AGGREGATE_KEY
+from .cache import response_cache
+from .livestore import LIVE_STORE_ENABLED, SYNC_SOURCES
+from .stats import (
+    fetch_periods_window,
+    live_source,
+    refresh_stats_body,
+    sync_live_projects,
+)
+
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds between refreshes of one project (overridable per project)
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "60"))
+# Fraction of the interval each sleep is randomly shortened or lengthened by
+PREWARM_JITTER = float(os.getenv("PREWARM_JITTER", "0.1"))
+# Maximum number of responses rebuilt concurrently across all projects
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+
+# Periods offered by the dashboard's selector (0 = lifetime)
+PREWARM_PERIODS = [7, 30, 90, 365, 0]
+# Timeseries resolution the dashboard requests
+PREWARM_RESOLUTION = "auto"
+
+
+def project_periods(config: dict) -> list[int]:
+    """Periods to prewarm for a project (registry key "prewarm_periods")."""
+    return config.get("prewarm_periods", PREWARM_PERIODS)
+
+
+def project_interval(config: dict) -> float:
+    """Refresh interval of a project (registry key "prewarm_interval")."""
+    return float(config.get("prewarm_interval", PREWARM_INTERVAL))
+
+
+class PrewarmScheduler:
+    """
+    Periodically rebuilds the cached /stats responses of every project.
+
+    Args:
+        jitter: Fraction of the interval each sleep is randomized by
+        concurrency: Maximum number of concurrent rebuilds
+    """
+
+    def __init__(self, jitter: float, concurrency: int):
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.registry: dict[str, dict] = {}
+        self._status: dict[str, dict] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, registry: dict[str, dict]) -> None:
+        """Start one refresh loop per project (called on startup)."""
+        self.registry = dict(registry)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        for slug in registry:
+            self._status.setdefault(slug, self._empty_status())
+            self._tasks[slug] = asyncio.create_task(self._run(slug))
+
+    async def stop(self) -> None:
+        """Cancel every refresh loop (called on shutdown)."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _empty_status(self) -> dict:
+        return {
+            "last_refresh": None,
+            "duration_ms": None,
+            "refreshes": 0,
+            "errors": 0,
+            "last_error": None,
+            "next_refresh": None,
+        }
+
+    def _sleep_time(self, interval: float) -> float:
+        return max(0.0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def _run(self, slug: str) -> None:
+        config = self.registry[slug]
+        interval = project_interval(config)
+        # Stagger the first refresh so projects don't all start together
+        delay = random.uniform(0, interval * self.jitter)
+        while True:
+            self._status[slug]["next_refresh"] = datetime.fromtimestamp(
+                time.time() + delay, timezone.utc
+            )
+            await asyncio.sleep(delay)
+            await self.refresh(slug)
+            delay = self._sleep_time(interval)
+
+    async def refresh(self, slug: str, config: dict | None = None) -> dict:
+        """
+        Rebuild every prewarmed period of one project now.
+
+        Args:
+            slug: The project slug
+            config: The project's registry entry (defaults to the scheduled one)
+
+        Returns:
+            The project's updated status
+        """
+        config = config if config is not None else self.registry[slug]
+        self.registry.setdefault(slug, config)
+        status = self._status.setdefault(slug, self._empty_status())
+        semaphore = self._semaphore or asyncio.Semaphore(self.concurrency)
+
+        async def refresh_period(days: int) -> None:
+            async with semaphore:
+                await refresh_stats_body(slug, config, days, PREWARM_RESOLUTION)
+
+        started = time.perf_counter()
+        if LIVE_STORE_ENABLED:
+            provider, _ = live_source(config)
+            try:
+                if provider and SYNC_SOURCES[provider]["fetch_batch"]:
+                    # Sync every project of the provider that is due in
+                    # batched round trips; their own refreshes then find
+                    # them synced
+                    await sync_live_projects(
+                        c
+                        for c in self.registry.values()
+                        if live_source(c)[0] == provider
+                    )
+                # One local read of the widest period, which the others
+                # slice (without the store it would cost more upstream
+                # queries than fetching each period)
+                await fetch_periods_window(config, project_periods(config))
+            except Exception as e:
+                print(f"Error fetching live window of {slug}: {e}")
+        results = await asyncio.gather(
+            *(refresh_period(days) for days in project_periods(config)),
+            return_exceptions=True,
+        )
+        status["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        status["last_refresh"] = datetime.now(timezone.utc)
+        status["refreshes"] += 1
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            status["errors"] += len(errors)
+            status["last_error"] = str(errors[0])
+            print(f"Error prewarming {slug}: {errors[0]}")
+        return status
+
+    def purge(self, slug: str) -> int:
+        """
+        Drop every cached response of one project, including aggregates
+        that contain it.
+
+        Returns:
+            Number of cache entries removed
+        """
+        return response_cache.purge(
+            lambda key: key[0] == slug or (key[0] == AGGREGATE_KEY and slug in key[2])
+        )
+
+    def status(self) -> dict:
+        """Scheduler settings and last refresh time/duration per project."""
+        return {
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "jitter": self.jitter,
+            "projects": {
+                slug: {
+                    **self._status.get(slug, self._empty_status()),
+                    "interval": project_interval(config),
+                    "periods": project_periods(config),
+                }
+                for slug, config in self.registry.items()
+            },
+        }
+
+
+prewarm_scheduler = PrewarmScheduler(
+    jitter=PREWARM_JITTER, concurrency=PREWARM_CONCURRENCY
+)
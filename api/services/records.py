@@ -0,0 +1,33 @@
+"""
+Internal Records
+
+Lean `__slots__` dataclasses that carry timeseries points and breakdown
+entries through services/*. They have the same fields, in the same order,
+as the TimeseriesEntry/StatEntry API models, but skip Pydantic validation
+on construction; responses are serialized straight from them (see
+serialization.py), so the models in models.py only describe the schema.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+
+
+@dataclass(slots=True)
+class TimeseriesRecord:
+    """A single timeseries data point (see models.TimeseriesEntry)."""
+
+    date: datetime
+    pageviews: int
+    visitors: int
+    bounce_rate: float
+    migration_date: date | None = None
+
+
+@dataclass(slots=True)
+class StatRecord:
+    """A single breakdown entry (see models.StatEntry)."""
+
+    key: str
+    pageviews: int
+    visitors: int
+    migration_date: date | None = None
@@ -0,0 +1,112 @@
+"""
+Timeseries Rollups
+
+Hour/day/week/month buckets for timeseries entries (UTC; weeks start on
+Monday, months on the 1st). The Vercel migration data is hourly and the
+live providers return daily rows, so both are merged into buckets of one
+tier (see merge_timeseries), and charts over long windows use a coarser
+tier instead of shipping every row.
+"""
+
+from datetime import date, datetime, timezone
+from typing import Literal
+
+from .records import TimeseriesRecord
+
+Resolution = Literal["auto", "hour", "day", "week", "month"]
+
+# Finest to coarsest, with the (average) length of one bucket in seconds
+TIERS = {
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 2629746,
+}
+
+# Bucket used when no resolution is requested
+DEFAULT_RESOLUTION = "day"
+
+# `auto` picks the coarsest tier that still gives at least this many points
+AUTO_MIN_POINTS = 30
+
+
+def choose_resolution(span_seconds: float) -> str:
+    """
+    Coarsest tier that splits a time span into at least AUTO_MIN_POINTS buckets.
+
+    Args:
+        span_seconds: Length of the charted window
+
+    Returns:
+        One of "hour", "day", "week", "month"
+    """
+    chosen = "hour"
+    for tier, seconds in TIERS.items():
+        if span_seconds / seconds >= AUTO_MIN_POINTS:
+            chosen = tier
+    return chosen
+
+
+def bucket_start(epoch: int, resolution: str) -> int:
+    """Epoch seconds of the start of the bucket containing a timestamp."""
+    if resolution == "hour":
+        return epoch - epoch % 3600
+    day = epoch - epoch % 86400
+    if resolution == "day":
+        return day
+    if resolution == "week":
+        # 1970-01-01 was a Thursday; step back to Monday
+        return day - ((day // 86400 + 3) % 7) * 86400
+    if resolution == "month":
+        midnight = datetime.fromtimestamp(day, timezone.utc)
+        return int(midnight.replace(day=1).timestamp())
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def bucket_end(start: int, resolution: str) -> int:
+    """Epoch seconds of the start of the bucket after the one starting at `start`."""
+    if resolution == "month":
+        month = datetime.fromtimestamp(start, timezone.utc)
+        if month.month == 12:
+            return int(month.replace(year=month.year + 1, month=1).timestamp())
+        return int(month.replace(month=month.month + 1).timestamp())
+    if resolution not in TIERS:
+        raise ValueError(f"Unknown resolution: {resolution}")
+    return start + TIERS[resolution]
+
+
+def to_epoch(value: datetime) -> int:
+    """Epoch seconds of a timestamp."""
+    # Naive timestamps are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def make_bucket(
+    start: int,
+    pageviews: int,
+    visitors: int,
+    bounced: float,
+    migration_date: date | None,
+) -> TimeseriesRecord:
+    """
+    Build one rolled-up entry.
+
+    Args:
+        start: Epoch seconds of the bucket start
+        pageviews: Total pageviews in the bucket
+        visitors: Total visitors in the bucket
+        bounced: Sum of bounce_rate * pageviews over the bucket's rows
+        migration_date: Migration date shared by every row (None if mixed)
+
+    Returns:
+        TimeseriesRecord whose bounce rate is the pageview-weighted average
+    """
+    return TimeseriesRecord(
+        date=datetime.fromtimestamp(start, timezone.utc),
+        pageviews=pageviews,
+        visitors=visitors,
+        bounce_rate=bounced / pageviews if pageviews else 0.0,
+        migration_date=migration_date,
+    )
@@ -0,0 +1,142 @@
+"""
+JSON Serialization
+
+Responses are serialized once, at the edge, from plain dicts/lists and the
+records of records.py. orjson is used when it is installed (it encodes
+slots dataclasses and datetimes natively); otherwise the standard library
+encoder produces the same document.
+
+Cached analytics responses are sent with their ETag and a Cache-Control
+header, compressed when the client accepts it (see compression.py), and a
+matching If-None-Match is answered with 304 Not Modified.
+"""
+
+import dataclasses
+import json
+from collections.abc import Mapping
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+from .cache import CACHE_CONTROL, CacheEntry
+from .compression import compressor
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module
+    orjson = None
+
+
+def _isoformat(value: datetime) -> str:
+    # UTC as "Z", like Pydantic and orjson's OPT_UTC_Z
+    text = value.isoformat()
+    if value.utcoffset() is not None and not value.utcoffset():
+        text = text[: -len("+00:00")] + "Z"
+    return text
+
+
+def _default(value):
+    if dataclasses.is_dataclass(value):
+        return {f.name: getattr(value, f.name) for f in dataclasses.fields(value)}
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, datetime):
+        return _isoformat(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """
+    Serialize a response body to compact UTF-8 JSON.
+
+    Args:
+        content: Dicts, lists, scalars, datetimes, records or models
+
+    Returns:
+        The encoded JSON document
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with dumps() (orjson when available).
+
+    Already serialized bodies (bytes, e.g. from the response cache) are sent
+    as they are.
+    """
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag (weak comparison).
+
+    Args:
+        if_none_match: Header value: "*" or a comma-separated list of ETags
+        etag: Current ETag of the resource
+
+    Returns:
+        True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+async def conditional_response(
+    entry: CacheEntry, request_headers: Mapping[str, str]
+) -> Response:
+    """
+    Send a cached body with its ETag and Cache-Control, or 304 if the
+    client already has it (the body is not touched).
+
+    The body is compressed when the client accepts it; the ETag of a
+    compressed response is weak, as its bytes differ from the plain body.
+
+    Args:
+        entry: Cache entry holding the serialized body and its ETag
+        request_headers: The request's headers (If-None-Match,
+            Accept-Encoding)
+
+    Returns:
+        A 304 response or a FastJSONResponse with the body
+    """
+    headers = {"Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(request_headers.get("if-none-match"), entry.etag):
+        compressed = compressor.selects(
+            request_headers.get("accept-encoding"), len(entry.body)
+        )
+        headers["ETag"] = f"W/{entry.etag}" if compressed else entry.etag
+        return Response(status_code=304, headers=headers)
+
+    body, encoding = await compressor.encode(
+        entry, request_headers.get("accept-encoding")
+    )
+    if encoding is None:
+        headers["ETag"] = entry.etag
+    else:
+        headers["ETag"] = f"W/{entry.etag}"
+        headers["Content-Encoding"] = encoding
+    return FastJSONResponse(body, headers=headers)
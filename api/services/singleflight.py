@@ -0,0 +1,111 @@
+"""
+Request Coalescing (single-flight)
+
+Concurrent callers asking for the same upstream data share one in-flight
+fetch instead of each firing their own requests. The shared fetch runs as
+its own task and every caller awaits it through asyncio.shield(), so a
+client that disconnects (cancelling its handler) only stops waiting; the
+fetch keeps running for everyone else. The upstream failures of a shared
+fetch count for every caller awaiting it (see breaker.track_failures()).
+"""
+
+import asyncio
+import functools
+import inspect
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from .breaker import collect_failures, start_tracked
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key."""
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self.counters = {"calls": 0, "shared": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once for all concurrent callers with the same key.
+
+        Args:
+            key: Identifies the fetch, e.g. (provider, project_id, query, days)
+            fn: Coroutine factory performing the fetch
+
+        Returns:
+            The shared result (treat it as read-only; callers share it)
+        """
+        task = self.start(key, fn)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            collect_failures(task)
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """
+        Start fn() for a key, or join the call already in flight, without
+        waiting: the key is running as soon as this returns, so a caller
+        that checks running() next joins it.
+
+        Args:
+            key: Identifies the fetch
+            fn: Coroutine factory performing the fetch
+
+        Returns:
+            The shared task (await it through asyncio.shield, so a
+            cancelled caller doesn't cancel it for the others, then pass it
+            to breaker.collect_failures())
+        """
+        self.counters["calls"] += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = start_tracked(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.counters["shared"] += 1
+        return task
+
+    def running(self, key: Hashable) -> bool:
+        """Whether a fetch with this key is currently in flight."""
+        return key in self._in_flight
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Retrieve the exception so an abandoned failed fetch isn't reported
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Call counters and the number of fetches currently in flight."""
+        return {**self.counters, "in_flight": len(self._in_flight)}
+
+
+# Shared by every provider module
+upstream_flights = SingleFlight()
+
+
+def coalesce(provider: str) -> Callable:
+    """
+    Decorator coalescing concurrent calls of an upstream fetch function.
+
+    Calls are keyed by (provider, function name, bound arguments), so the
+    project id, query and requested window are all part of the key, however
+    the arguments were passed.
+    """
+
+    def decorator(fn: Callable[..., Awaitable[Any]]) -> Callable:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (provider, fn.__name__, tuple(bound.arguments.items()))
+            return await upstream_flights.do(key, lambda: fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,944 @@
+"""
+Project Stats Service
+
+Builds the unified per-project responses (Vercel migration data merged with
+live PostHog/Cloudflare data) and serves them, serialized, through the
+shared response cache. Live data is fetched on the event loop, or sliced
+from a cached wider live window (see window.py); slicing, merging and
+serialization run in the CPU executor.
+"""
+
+import asyncio
+import sqlite3
+from collections.abc import Awaitable, Iterable
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .breaker import note_failures
+from .cache import CacheEntry, PartialBody, annotate_body, response_cache
+from .cloudflare import fetch_cf_stats, fetch_cf_timeseries
+from .deadline import (
+    current_deadline,
+    request_deadline,
+    section_status,
+    sync_deadline,
+    time_left,
+)
+from .executor import cpu_executor
+from .livestore import LIVE_STORE_ENABLED, live_store
+from .columnar import STAT_DIMENSIONS
+from .merger import format_stat_totals, merge_stat_totals, merge_timeseries
+from .packing import pack_live_data, unpack_live_data
+from .posthog import (
+    PH_BATCH_BREAKDOWNS,
+    PH_BATCH_TIMESERIES,
+    fetch_all_breakdowns,
+    fetch_breakdown,
+    fetch_posthog_stats,
+    fetch_timeseries,
+)
+from .records import StatRecord, TimeseriesRecord
+from .rollup import DEFAULT_RESOLUTION, choose_resolution, to_epoch
+from .serialization import dumps
+from .vercel import (
+    VercelDataset,
+    dataset_stat_totals,
+    filter_dataset_timeseries,
+    load_vercel_dataset,
+    timeseries_extent,
+)
+from .window import LiveWindow, live_windows
+
+# For lifetime requests (days=0), query the live providers for ~10 years
+LIFETIME_QUERY_DAYS = 3650
+
+# Sections of a /stats response that live data can leave partial
+LIVE_SECTIONS = ["timeseries", *STAT_DIMENSIONS]
+
+
+def lookback_days(days: int) -> int:
+    """Days of live data to query for a period (0 = lifetime)."""
+    return days if days > 0 else LIFETIME_QUERY_DAYS
+
+
+def live_source(config: dict) -> tuple[str | None, str]:
+    """
+    The live analytics provider of a project and its id there.
+
+    Returns:
+        Tuple of ("cloudflare", site tag), ("posthog", project id), or
+        (None, "") when the project has no live provider configured
+    """
+    cf_site_tag = config.get("cf_site_tag", "")
+    if config.get("analytics_provider", "posthog") == "cloudflare" and cf_site_tag:
+        return "cloudflare", cf_site_tag
+    if config["ph_id"]:
+        return "posthog", config["ph_id"]
+    return None, ""
+
+
+def live_upstreams(*configs: dict) -> tuple[str, ...]:
+    """The upstreams (live providers) the responses of projects are built from."""
+    providers = (live_source(config)[0] for config in configs)
+    return tuple(dict.fromkeys(p for p in providers if p is not None))
+
+
+async def fetch_live_stats(
+    config: dict, days: int
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    """
+    Live timeseries and breakdowns of a project.
+
+    Served from the local live store when it is enabled, falling back to
+    querying the provider directly if the store is unavailable.
+
+    Args:
+        config: The project's registry entry
+        days: Number of days to look back
+
+    Returns:
+        Tuple of (timeseries, breakdowns)
+    """
+    provider, source_id = live_source(config)
+    if provider is None:
+        return [], {}
+
+    if LIVE_STORE_ENABLED:
+        try:
+            return await live_store.stats(provider, source_id, days)
+        except sqlite3.Error as e:
+            print(f"Live store error: {e}")
+
+    if provider == "cloudflare":
+        # One aliased GraphQL request
+        return await fetch_cf_stats(source_id, days)
+    # One batched query when batching is enabled
+    return await fetch_posthog_stats(source_id, days)
+
+
+async def fetch_live_timeseries(config: dict, days: int) -> list[TimeseriesRecord]:
+    """
+    Live timeseries of a project (see fetch_live_stats()).
+
+    Args:
+        config: The project's registry entry
+        days: Number of days to look back
+
+    Returns:
+        List of daily TimeseriesRecord objects
+    """
+    provider, source_id = live_source(config)
+    if provider is None:
+        return []
+
+    if LIVE_STORE_ENABLED:
+        try:
+            return await live_store.timeseries(provider, source_id, days)
+        except sqlite3.Error as e:
+            print(f"Live store error: {e}")
+
+    if provider == "cloudflare":
+        return await fetch_cf_timeseries(source_id, days)
+    return await fetch_timeseries(source_id, days)
+
+
+async def fetch_live_breakdowns(config: dict, days: int) -> dict[str, list[StatRecord]]:
+    """
+    Live breakdowns of a project (see fetch_live_stats()).
+
+    Args:
+        config: The project's registry entry
+        days: Number of days to look back
+
+    Returns:
+        Dictionary mapping field names to lists of StatRecord objects
+    """
+    provider, source_id = live_source(config)
+    if provider is None:
+        return {}
+
+    if LIVE_STORE_ENABLED:
+        try:
+            return await live_store.breakdowns(provider, source_id, days)
+        except sqlite3.Error as e:
+            print(f"Live store error: {e}")
+
+    if provider == "cloudflare":
+        _, breakdowns = await fetch_cf_stats(source_id, days)
+        return breakdowns
+    return await fetch_all_breakdowns(source_id, days)
+
+
+async def sync_live_projects(configs: Iterable[dict]) -> None:
+    """
+    Sync the live store rows of several projects at once, batching the
+    upstream queries of providers that support it (one Cloudflare
+    request per chunk for all site tags).
+
+    Args:
+        configs: The projects' registry entries
+    """
+    if not LIVE_STORE_ENABLED:
+        return
+    by_provider: dict[str, list[str]] = {}
+    for config in configs:
+        provider, source_id = live_source(config)
+        if provider is not None:
+            by_provider.setdefault(provider, []).append(source_id)
+    try:
+        await asyncio.gather(
+            *(
+                live_store.sync_many(provider, source_ids)
+                for provider, source_ids in by_provider.items()
+            )
+        )
+    except sqlite3.Error as e:
+        print(f"Live store error: {e}")
+
+
+def cached_live_window(config: dict, days: int) -> LiveWindow | None:
+    """A fresh cached live window of the project covering `days` days, if any."""
+    provider, source_id = live_source(config)
+    if provider is None:
+        return None
+    return live_windows.get(provider, source_id, days)
+
+
+async def fetch_periods_window(config: dict, periods: list[int]) -> LiveWindow | None:
+    """
+    The live window of the widest of several periods, which the others are
+    sliced from (None if the project has no live provider, or the live
+    store is disabled or unavailable).
+    """
+    provider, source_id = live_source(config)
+    if provider is None or not LIVE_STORE_ENABLED:
+        return None
+    widest = max(lookback_days(days) for days in periods)
+    try:
+        return await live_windows.fetch(provider, source_id, widest)
+    except sqlite3.Error as e:
+        print(f"Live store error: {e}")
+        return None
+
+
+def serialize_response(content) -> bytes:
+    """Serialize a response body (records, dicts or models) to JSON bytes."""
+    return dumps(content)
+
+
+def resolve_resolution(
+    resolution: str | None,
+    days: int,
+    vercel_data: VercelDataset | None,
+    live_timeseries: list[TimeseriesRecord],
+) -> str:
+    """
+    Turn a requested resolution into a rollup tier.
+
+    `auto` picks the coarsest tier that still gives enough points for the
+    window; for lifetime requests the window is the span of the data.
+    Without a resolution, entries are merged per day.
+
+    Returns:
+        "hour", "day", "week" or "month"
+    """
+    if resolution is None:
+        return DEFAULT_RESOLUTION
+    if resolution != "auto":
+        return resolution
+    if days > 0:
+        return choose_resolution(days * 86400)
+
+    bounds = data_bounds(vercel_data, live_timeseries)
+    return choose_resolution(max(bounds) - min(bounds) if bounds else 0)
+
+
+def data_bounds(
+    vercel_data: VercelDataset | None, live_timeseries: list[TimeseriesRecord]
+) -> list[int]:
+    """Epochs of the first and last timeseries rows of each source (may be empty)."""
+    bounds = []
+    if live_timeseries:
+        bounds += [
+            to_epoch(live_timeseries[0].date),
+            to_epoch(live_timeseries[-1].date),
+        ]
+    if vercel_data is not None:
+        bounds += timeseries_extent(vercel_data) or []
+    return bounds
+
+
+def build_timeseries(
+    vercel_data: VercelDataset | None,
+    days: int,
+    live_timeseries: list[TimeseriesRecord],
+    resolution: str | None = None,
+) -> tuple[list[TimeseriesRecord], str]:
+    """
+    Merge the Vercel and live timeseries of a day window.
+
+    The Vercel side comes from its precomputed rollup tier, and both sides
+    are merge-joined into buckets of that tier.
+
+    Args:
+        vercel_data: Loaded migration dataset (None if missing)
+        days: Number of days to look back (0 for lifetime)
+        live_timeseries: Live timeseries entries
+        resolution: "auto", a rollup tier, or None for daily buckets
+
+    Returns:
+        Tuple of (merged timeseries, rollup tier used)
+    """
+    # Filter Vercel data to match the requested day range (days=0 means lifetime/no filter)
+    filter_days = days if days > 0 else None
+    tier = resolve_resolution(resolution, days, vercel_data, live_timeseries)
+
+    vercel_timeseries = (
+        filter_dataset_timeseries(vercel_data, filter_days, tier)
+        if vercel_data is not None
+        else []
+    )
+    return (
+        merge_timeseries(vercel_timeseries, live_timeseries, resolution=tier),
+        tier,
+    )
+
+
+def build_stat_totals(
+    vercel_data: VercelDataset | None,
+    days: int,
+    live_breakdowns: dict[str, list[StatRecord]],
+) -> dict[str, dict[str, list[int]]]:
+    """
+    Per-key breakdown totals of a window's Vercel and live data, before
+    the top-`limit` cut (so several projects' totals can still be summed).
+
+    Args:
+        vercel_data: Loaded migration dataset (None if missing)
+        days: Number of days to look back (0 for lifetime)
+        live_breakdowns: Live breakdown entries per dimension
+
+    Returns:
+        Dimension -> {normalized key: [pageviews, visitors]}
+    """
+    vercel_totals = (
+        dataset_stat_totals(vercel_data, days if days > 0 else None)
+        if vercel_data is not None
+        else {}
+    )
+    return merge_stat_totals(vercel_totals, live_breakdowns)
+
+
+def assemble_project_stats(
+    project_slug: str,
+    vercel_file: Path,
+    days: int,
+    live_timeseries: list[TimeseriesRecord],
+    live_breakdowns: dict[str, list[StatRecord]],
+    resolution: str | None = None,
+    limit: int | None = None,
+) -> dict:
+    """
+    Merge a project's Vercel migration data with already fetched live data.
+
+    This is the CPU-bound half of a /stats response; it does no I/O
+    besides (on first use) mapping the migration file. The result has the
+    shape of AllStats but holds plain records, ready for serialization.
+
+    Args:
+        project_slug: The URL slug of the project
+        vercel_file: Path of the project's migration JSON file
+        days: Number of days to look back (0 for lifetime)
+        live_timeseries: Live timeseries entries
+        live_breakdowns: Live breakdown entries per dimension
+        resolution: Timeseries resolution ("auto", a rollup tier, or None
+            for daily buckets)
+        limit: Maximum number of entries per breakdown (None for all); the
+            rest are summed into one "(other)" entry
+
+    Returns:
+        Dictionary with the metadata, merged timeseries and breakdown stats
+    """
+    # 1. Load Vercel migration data
+    vercel_data = load_vercel_dataset(vercel_file)
+
+    # 2. Merge Vercel (filtered by days) and live data
+    merged_timeseries, _ = build_timeseries(
+        vercel_data, days, live_timeseries, resolution
+    )
+    merged_stats = format_stat_totals(
+        build_stat_totals(vercel_data, days, live_breakdowns), limit
+    )
+
+    # 3. Build unified response
+    return {
+        "metadata": {
+            "export_date": datetime.now(timezone.utc),
+            "source": f"unified_{project_slug}",
+        },
+        "timeseries": merged_timeseries,
+        "stats": merged_stats,
+    }
+
+
+def assemble_project_timeseries(
+    project_slug: str,
+    vercel_file: Path,
+    days: int,
+    live_timeseries: list[TimeseriesRecord],
+    resolution: str | None = None,
+) -> dict:
+    """
+    Merge a project's Vercel timeseries with an already fetched live one.
+
+    Returns:
+        Dictionary with the project slug, days, resolution used and merged
+        timeseries
+    """
+    vercel_data = load_vercel_dataset(vercel_file)
+    merged, tier = build_timeseries(vercel_data, days, live_timeseries, resolution)
+
+    return {
+        "project": project_slug,
+        "days": days,
+        "resolution": tier,
+        "timeseries": merged,
+    }
+
+
+async def gather_live_stats(config: dict, days: int) -> bytes | tuple | LiveWindow:
+    """
+    Live data of a period, in the form handed to the CPU executor: a cached
+    wider window to slice if there is one, otherwise fetched now (packed
+    into a buffer for process pools).
+
+    Args:
+        config: The project's registry entry
+        days: Number of days to look back (0 for lifetime)
+
+    Returns:
+        Input for unpack_live_stats()
+    """
+    query_days = lookback_days(days)
+    window = cached_live_window(config, query_days)
+    if window is not None:
+        return executor_live_window(window, query_days)
+    return executor_live_stats(*await fetch_live_stats(config, query_days))
+
+
+def executor_live_stats(
+    live_timeseries: list[TimeseriesRecord],
+    live_breakdowns: dict[str, list[StatRecord]],
+) -> bytes | tuple:
+    """
+    Fetched live data in the form handed to the CPU executor (packed for
+    process pools).
+    """
+    if cpu_executor.uses_processes:
+        return pack_live_data(live_timeseries, live_breakdowns)
+    return (live_timeseries, live_breakdowns)
+
+
+def executor_live_window(window: LiveWindow, days: int) -> bytes | LiveWindow:
+    """
+    A cached live window in the form handed to the CPU executor: the window
+    itself for threads, which slice it there, or the slice of `days` days
+    packed for process pools (rather than pickling every row of the window).
+    """
+    if cpu_executor.uses_processes:
+        return pack_live_data(*window.slice(days))
+    return window
+
+
+async def _timeseries_section(
+    fetch: Awaitable[list[TimeseriesRecord]],
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    return await fetch, {}
+
+
+async def _breakdowns_section(
+    fetch: Awaitable[dict[str, list[StatRecord]]],
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    return [], await fetch
+
+
+async def _breakdown_section(
+    field: str, fetch: Awaitable[list[StatRecord]]
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    return [], {field: await fetch}
+
+
+def live_section_fetches(config: dict, days: int) -> list[tuple[list[str], Awaitable]]:
+    """
+    The live fetches of a project's /stats data, and the response sections
+    each one provides.
+
+    With the live store, the timeseries and the breakdowns are separate
+    local reads after one shared sync. Without it, Cloudflare and fully
+    batched PostHog answer every section in one upstream query; with
+    PostHog batching turned off, the timeseries and the breakdowns (one
+    query each, or one for all) arrive separately.
+
+    Args:
+        config: The project's registry entry
+        days: Number of days to look back
+
+    Returns:
+        List of (sections, awaitable of (timeseries, breakdowns)) pairs
+    """
+    provider, source_id = live_source(config)
+    if provider is not None and LIVE_STORE_ENABLED:
+        return [
+            (["timeseries"], _timeseries_section(fetch_live_timeseries(config, days))),
+            (STAT_DIMENSIONS, _breakdowns_section(fetch_live_breakdowns(config, days))),
+        ]
+    if provider != "posthog" or (PH_BATCH_BREAKDOWNS and PH_BATCH_TIMESERIES):
+        return [(LIVE_SECTIONS, fetch_live_stats(config, days))]
+
+    fetches = [(["timeseries"], _timeseries_section(fetch_timeseries(source_id, days)))]
+    if PH_BATCH_BREAKDOWNS:
+        fetches.append(
+            (
+                STAT_DIMENSIONS,
+                _breakdowns_section(fetch_all_breakdowns(source_id, days)),
+            )
+        )
+    else:
+        fetches.extend(
+            (
+                [field],
+                _breakdown_section(field, fetch_breakdown(source_id, field, days)),
+            )
+            for field in STAT_DIMENSIONS
+        )
+    return fetches
+
+
+async def gather_live_sections(
+    fetches: list[tuple[list[str], Awaitable]], deadline: float
+) -> tuple[
+    list[TimeseriesRecord],
+    dict[str, list[StatRecord]],
+    list[str],
+    Awaitable[tuple[list[TimeseriesRecord], dict[str, list[StatRecord]], list[str]]]
+    | None,
+]:
+    """
+    Run live fetches until every one has finished or the deadline passes.
+
+    Unfinished fetches keep running (the upstream queries are shared with
+    other callers anyway); the last element awaits them. A fetch that
+    failed is logged and its sections are left out like unfinished ones.
+
+    Args:
+        fetches: (sections, awaitable of (timeseries, breakdowns)) pairs,
+            see live_section_fetches()
+        deadline: Event loop time to stop waiting at
+
+    Returns:
+        Tuple of (timeseries, breakdowns) of the finished fetches, the
+        sections of the unfinished or failed ones, and an awaitable of the
+        complete (timeseries, breakdowns, failed sections) (None if nothing
+        is missing)
+    """
+    # Live store syncs stop being waited on before the deadline, so the
+    # stored rows are still read in time
+    token = current_deadline.set(sync_deadline(deadline))
+    try:
+        tasks = [asyncio.ensure_future(fetch) for _, fetch in fetches]
+    finally:
+        current_deadline.reset(token)
+    await asyncio.wait(tasks, timeout=time_left(deadline))
+    reported: set[asyncio.Future] = set()
+
+    def combine() -> tuple[list, dict, list]:
+        timeseries, breakdowns, missing = [], {}, []
+        for (sections, _), task in zip(fetches, tasks):
+            if not task.done():
+                missing += sections
+                continue
+            if task.cancelled() or task.exception() is not None:
+                if task not in reported:
+                    reported.add(task)
+                    error = "cancelled" if task.cancelled() else task.exception()
+                    print(f"Live section error ({', '.join(sections)}): {error}")
+                missing += sections
+                continue
+            task_timeseries, task_breakdowns = task.result()
+            if "timeseries" in sections:
+                timeseries = task_timeseries
+            breakdowns.update(task_breakdowns)
+        return timeseries, breakdowns, missing
+
+    async def complete() -> tuple[list, dict, list]:
+        await asyncio.wait(tasks)
+        return combine()
+
+    timeseries, breakdowns, partial = combine()
+    return timeseries, breakdowns, partial, (complete() if partial else None)
+
+
+def mark_sections(body: bytes, sections: list[str], partial: list[str]) -> bytes:
+    """A body with the status of every section, if any of them is partial."""
+    if not partial:
+        return body
+    return annotate_body(body, {"sections": section_status(sections, partial)})
+
+
+def partial_body(
+    body: bytes, sections: list[str], partial: list[str], complete: Awaitable[bytes]
+) -> PartialBody:
+    """A body cut short by its deadline, with the status of every section."""
+    return PartialBody(mark_sections(body, sections, partial), complete)
+
+
+def completed_body(
+    body: bytes, config: dict, sections: list[str], failed: list[str]
+) -> bytes:
+    """
+    The complete body of a partial response. Sections whose fetch failed
+    stay marked partial, and count as a failure of the project's live
+    upstream, so the body isn't cached (see ResponseCache.recompute()).
+    """
+    if failed:
+        note_failures(live_upstreams(config))
+    return mark_sections(body, sections, failed)
+
+
+def unpack_live_stats(
+    live: bytes | tuple | LiveWindow, days: int
+) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+    """The (timeseries, breakdowns) of gather_live_stats() output (in the executor)."""
+    if isinstance(live, LiveWindow):
+        return live.slice(lookback_days(days))
+    if isinstance(live, bytes):
+        return unpack_live_data(live)
+    return live
+
+
+def _stats_body_job(
+    project_slug: str,
+    vercel_file: Path,
+    days: int,
+    live: bytes | tuple | LiveWindow,
+    resolution: str | None,
+    limit: int | None,
+) -> bytes:
+    # Runs in the CPU executor
+    live_timeseries, live_breakdowns = unpack_live_stats(live, days)
+    return serialize_response(
+        assemble_project_stats(
+            project_slug,
+            vercel_file,
+            days,
+            live_timeseries,
+            live_breakdowns,
+            resolution,
+            limit,
+        )
+    )
+
+
+def _timeseries_body_job(
+    project_slug: str,
+    vercel_file: Path,
+    days: int,
+    live: bytes | list | LiveWindow,
+    resolution: str | None,
+) -> bytes:
+    if isinstance(live, LiveWindow):
+        live_timeseries = live.slice_timeseries(lookback_days(days))
+    elif isinstance(live, bytes):
+        live_timeseries = unpack_live_data(live)[0]
+    else:
+        live_timeseries = live
+    return serialize_response(
+        assemble_project_timeseries(
+            project_slug, vercel_file, days, live_timeseries, resolution
+        )
+    )
+
+
+async def build_stats_body(
+    project_slug: str,
+    config: dict,
+    days: int,
+    resolution: str | None = None,
+    limit: int | None = None,
+    deadline: float | None = None,
+) -> bytes | PartialBody:
+    """
+    Serialized /stats response of a project (see assemble_project_stats()).
+
+    Live data is sliced from a cached wider window when one is available,
+    otherwise fetched on the event loop; slicing, merging and serialization
+    run in the CPU executor so they never block other requests.
+
+    With a deadline, the live sections that have not arrived by then are
+    left out: the result is a PartialBody whose "sections" metadata marks
+    each section complete or partial.
+    """
+
+    async def run(live: bytes | tuple | LiveWindow) -> bytes:
+        return await cpu_executor.run(
+            _stats_body_job,
+            project_slug,
+            config["vercel_file"],
+            days,
+            live,
+            resolution,
+            limit,
+        )
+
+    query_days = lookback_days(days)
+    if deadline is None or cached_live_window(config, query_days) is not None:
+        return await run(await gather_live_stats(config, days))
+
+    live_timeseries, live_breakdowns, partial, rest = await gather_live_sections(
+        live_section_fetches(config, query_days), deadline
+    )
+    body = await run(executor_live_stats(live_timeseries, live_breakdowns))
+    if not partial:
+        return body
+
+    async def complete() -> bytes:
+        live_timeseries, live_breakdowns, failed = await rest
+        body = await run(executor_live_stats(live_timeseries, live_breakdowns))
+        return completed_body(body, config, LIVE_SECTIONS, failed)
+
+    return partial_body(body, LIVE_SECTIONS, partial, complete())
+
+
+async def build_timeseries_body(
+    project_slug: str,
+    config: dict,
+    days: int,
+    resolution: str | None = None,
+    deadline: float | None = None,
+) -> bytes | PartialBody:
+    """Serialized /timeseries response of a project (see build_stats_body())."""
+
+    async def run(live: bytes | list | LiveWindow) -> bytes:
+        return await cpu_executor.run(
+            _timeseries_body_job,
+            project_slug,
+            config["vercel_file"],
+            days,
+            live,
+            resolution,
+        )
+
+    def packed(live_timeseries: list[TimeseriesRecord]) -> bytes | list:
+        if cpu_executor.uses_processes:
+            return pack_live_data(live_timeseries, {})
+        return live_timeseries
+
+    query_days = lookback_days(days)
+    window = cached_live_window(config, query_days)
+    if window is not None:
+        if cpu_executor.uses_processes:
+            return await run(packed(window.slice_timeseries(query_days)))
+        return await run(window)
+    if deadline is None:
+        return await run(packed(await fetch_live_timeseries(config, query_days)))
+
+    fetch = _timeseries_section(fetch_live_timeseries(config, query_days))
+    live_timeseries, _, partial, rest = await gather_live_sections(
+        [(["timeseries"], fetch)], deadline
+    )
+    body = await run(packed(live_timeseries))
+    if not partial:
+        return body
+
+    async def complete() -> bytes:
+        live_timeseries, _, failed = await rest
+        body = await run(packed(live_timeseries))
+        return completed_body(body, config, ["timeseries"], failed)
+
+    return partial_body(body, ["timeseries"], partial, complete())
+
+
+def _bundle_body_job(
+    project_slug: str,
+    vercel_file: Path,
+    periods: list[int],
+    live: LiveWindow | list[bytes | tuple | LiveWindow],
+    resolution: str | None,
+    limit: int | None,
+) -> bytes:
+    content = {}
+    for i, days in enumerate(periods):
+        live_timeseries, live_breakdowns = unpack_live_stats(
+            live if isinstance(live, LiveWindow) else live[i], days
+        )
+        stats = assemble_project_stats(
+            project_slug,
+            vercel_file,
+            days,
+            live_timeseries,
+            live_breakdowns,
+            resolution,
+            limit,
+        )
+        content[str(days)] = {
+            "timeseries": stats["timeseries"],
+            "stats": stats["stats"],
+        }
+    return serialize_response(
+        {
+            "metadata": {
+                "export_date": datetime.now(timezone.utc),
+                "source": f"unified_{project_slug}",
+            },
+            "periods": content,
+        }
+    )
+
+
+async def build_bundle_body(
+    project_slug: str,
+    config: dict,
+    periods: list[int],
+    resolution: str | None = None,
+    limit: int | None = None,
+) -> bytes:
+    """
+    Serialized /stats responses of several periods (a StatsBundle).
+
+    With the live store, the live data of the widest period is read once,
+    as a window of daily rows, and every period is sliced from it in the
+    CPU executor (before it, for process pools, which get each slice
+    packed); without it, each period is fetched as for /stats.
+
+    Args:
+        project_slug: The URL slug of the project
+        config: The project's registry entry
+        periods: Numbers of days to look back (0 for lifetime)
+        resolution: Timeseries resolution ("auto", a rollup tier, or None
+            for daily buckets)
+        limit: Maximum number of entries per breakdown (None for all)
+
+    Returns:
+        The serialized bundle
+    """
+    live = await fetch_periods_window(config, periods)
+    if live is not None and cpu_executor.uses_processes:
+        live = [executor_live_window(live, lookback_days(days)) for days in periods]
+    elif live is None:
+        # One (coalesced) query per period rather than the widest period's
+        # daily rows in chunks, which would be dozens of queries for lifetime
+        live = await asyncio.gather(
+            *(gather_live_stats(config, days) for days in periods)
+        )
+    return await cpu_executor.run(
+        _bundle_body_job,
+        project_slug,
+        config["vercel_file"],
+        periods,
+        live,
+        resolution,
+        limit,
+    )
+
+
+def stats_cache_key(
+    project_slug: str,
+    days: int,
+    resolution: str | None = None,
+    limit: int | None = None,
+) -> tuple:
+    """Response cache key of a project's /stats body."""
+    return (project_slug, "stats", days, resolution, limit)
+
+
+async def get_stats_body(
+    project_slug: str,
+    config: dict,
+    days: int,
+    resolution: str | None = None,
+    limit: int | None = None,
+    timeout_ms: int | None = None,
+) -> CacheEntry:
+    """
+    Serialized /stats response (see build_stats_body()) and its ETag,
+    served from the cache. A rebuild waits at most `timeout_ms` for live
+    data (None for the REQUEST_TIMEOUT_MS default, 0 for no limit); a
+    partial response is not cached.
+    """
+
+    async def compute() -> bytes | PartialBody:
+        return await build_stats_body(
+            project_slug,
+            config,
+            days,
+            resolution,
+            limit,
+            request_deadline(timeout_ms),
+        )
+
+    return await response_cache.get_or_compute(
+        stats_cache_key(project_slug, days, resolution, limit),
+        compute,
+        live_upstreams(config),
+    )
+
+
+async def refresh_stats_body(
+    project_slug: str, config: dict, days: int, resolution: str | None = None
+) -> CacheEntry:
+    """
+    Rebuild a project's /stats body and store it in the cache (unless its
+    upstream failed meanwhile; the last good body is then kept).
+    """
+
+    async def compute() -> bytes:
+        return await build_stats_body(project_slug, config, days, resolution)
+
+    return await response_cache.recompute(
+        stats_cache_key(project_slug, days, resolution),
+        compute,
+        live_upstreams(config),
+    )
+
+
+async def get_timeseries_body(
+    project_slug: str,
+    config: dict,
+    days: int,
+    resolution: str | None = None,
+    timeout_ms: int | None = None,
+) -> CacheEntry:
+    """
+    Serialized /timeseries response and its ETag, served from the cache
+    (see get_stats_body()).
+    """
+
+    async def compute() -> bytes | PartialBody:
+        return await build_timeseries_body(
+            project_slug, config, days, resolution, request_deadline(timeout_ms)
+        )
+
+    return await response_cache.get_or_compute(
+        (project_slug, "timeseries", days, resolution),
+        compute,
+        live_upstreams(config),
+    )
+
+
+async def get_bundle_body(
+    project_slug: str,
+    config: dict,
+    periods: list[int],
+    resolution: str | None = None,
+    limit: int | None = None,
+) -> CacheEntry:
+    """Serialized build_bundle_body() response and its ETag, served from the cache."""
+
+    async def compute() -> bytes:
+        return await build_bundle_body(project_slug, config, periods, resolution, limit)
+
+    return await response_cache.get_or_compute(
+        (project_slug, "bundle", tuple(periods), resolution, limit),
+        compute,
+        live_upstreams(config),
+    )
@@ -2,34 +2,388 @@
 Vercel Data Service Layer
 
 Handles loading and processing of Vercel migration data from local JSON files.
+Each JSON export is compiled to a memory-mapped columnar file (see
+services/columnar.py) that is cached per process and invalidated by mtime/size,
+together with indexes built over it at load time. Loading and filtering
+are timed per function in /metrics (see metrics.py).
 """
 
-import json
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
 from pathlib import Path
 
 from models import AllStats, Metadata, Stats, TimeseriesEntry
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone, timedelta
+
+from .columnar import STAT_DIMENSIONS, ColumnarData, open_columnar
+from .metrics import timed
+from .records import TimeseriesRecord
+from .rollup import TIERS, bucket_start, make_bucket
+
+
+class TimeseriesIndex:
+    """
+    Prefix-sum index over the hourly timeseries columns.
+
+    Holds the sorted epoch timestamps, cumulative pageview/visitor sums (and
+    bounce_rate * pageviews, for weighted bounce rates) and, for every row,
+    the offset of the next row with non-zero pageviews and of the next row
+    with a different migration date. Any day window is then a binary
+    search, and its totals are O(1).
+    """
+
+    __slots__ = (
+        "epochs",
+        "cum_pageviews",
+        "cum_visitors",
+        "cum_bounced",
+        "next_nonzero",
+        "migration_dates",
+        "next_migration_change",
+    )
+
+    def __init__(self, columns: ColumnarData):
+        pageviews = columns.columns["ts.pageviews"]
+        self.epochs = columns.columns["ts.date"]
+        self.cum_pageviews = array("q", accumulate(pageviews, initial=0))
+        self.cum_visitors = array(
+            "q", accumulate(columns.columns["ts.visitors"], initial=0)
+        )
+        self.cum_bounced = array(
+            "d",
+            accumulate(
+                map(
+                    float.__mul__,
+                    columns.columns["ts.bounce_rate"],
+                    map(float, pageviews),
+                ),
+                initial=0.0,
+            ),
+        )
+
+        # next_nonzero[i] = first j >= i with pageviews[j] > 0 (len if none)
+        n = len(pageviews)
+        next_nonzero = array("i", [n]) * (n + 1)
+        for i in range(n - 1, -1, -1):
+            next_nonzero[i] = i if pageviews[i] > 0 else next_nonzero[i + 1]
+        self.next_nonzero = next_nonzero
+
+        # next_migration_change[i] = first j > i whose migration date differs
+        self.migration_dates = columns.columns["ts.migration_date"]
+        next_change = array("i", [n]) * (n + 1)
+        for i in range(n - 2, -1, -1):
+            same = self.migration_dates[i] == self.migration_dates[i + 1]
+            next_change[i] = next_change[i + 1] if same else i + 1
+        self.next_migration_change = next_change
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def window(self, since: int | None = None) -> tuple[int, int]:
+        """
+        Row range [start, stop) of entries at or after an epoch timestamp,
+        starting from the first non-zero pageview entry.
+
+        Args:
+            since: Epoch seconds of the window start (None for all rows)
+
+        Returns:
+            (start, stop) row offsets
+        """
+        start = 0 if since is None else bisect_left(self.epochs, since)
+        first_nonzero = self.next_nonzero[start]
+        # With no non-zero entries the whole window is kept
+        return (first_nonzero if first_nonzero < len(self) else start), len(self)
+
+    def common_migration_date(self, start: int, stop: int) -> date | None:
+        """Migration date shared by every row in [start, stop) (None if mixed)."""
+        if start >= stop or self.next_migration_change[start] < stop:
+            return None
+        migration = self.migration_dates[start]
+        return date.fromordinal(migration) if migration else None
+
+
+class StatsIndex:
+    """
+    Pre-aggregated breakdown table for one stats dimension.
+
+    Keys are normalized (lowercased) and interned once. Dated rows are
+    grouped by migration_date in ascending order, and for every group the
+    table stores per-key running totals over that group and all later ones
+    (plus the rows without a migration date, which are always included).
+    The aggregate for any cutoff date is then a single table row instead of
+    a re-scan of the raw rows.
+    """
+
+    __slots__ = ("keys", "dates", "pageviews", "visitors", "counts")
+
+    def __init__(self, columns: ColumnarData, dimension: str):
+        prefix = f"stats.{dimension}."
+        raw_keys = columns.columns[prefix + "key"]
+        raw_pageviews = columns.columns[prefix + "pageviews"]
+        raw_visitors = columns.columns[prefix + "visitors"]
+        raw_dates = columns.columns[prefix + "migration_date"]
+
+        # Map every raw string id to an interned, normalized key id
+        key_ids: dict[str, int] = {}
+        normalized: dict[int, int] = {}
+        row_keys: list[int] = []
+        for raw in raw_keys:
+            key_id = normalized.get(raw)
+            if key_id is None:
+                key = sys.intern(columns.strings[raw].lower())
+                key_id = normalized[raw] = key_ids.setdefault(key, len(key_ids))
+            row_keys.append(key_id)
+        self.keys: list[str] = list(key_ids)
+
+        groups: dict[int, list[int]] = {}
+        for row, migration in enumerate(raw_dates):
+            groups.setdefault(migration, []).append(row)
+        undated = groups.pop(0, [])
+        self.dates = array("i", sorted(groups))
+
+        # Table row g covers groups g.. plus undated rows; row len(dates) is
+        # undated rows only. Each table row holds one slot per key.
+        width = len(self.keys)
+        pageviews = [0] * width
+        visitors = [0] * width
+        counts = [0] * width
+
+        def add(rows: list[int]) -> None:
+            for row in rows:
+                key_id = row_keys[row]
+                pageviews[key_id] += raw_pageviews[row]
+                visitors[key_id] += raw_visitors[row]
+                counts[key_id] += 1
+
+        add(undated)
+        table_rows = [(pageviews[:], visitors[:], counts[:])]
+        for migration in reversed(self.dates):
+            add(groups[migration])
+            table_rows.append((pageviews[:], visitors[:], counts[:]))
+        table_rows.reverse()
+
+        self.pageviews = array("q")
+        self.visitors = array("q")
+        self.counts = array("i")
+        for row_pageviews, row_visitors, row_counts in table_rows:
+            self.pageviews.extend(row_pageviews)
+            self.visitors.extend(row_visitors)
+            self.counts.extend(row_counts)
+
+    def totals(self, cutoff: int = 0) -> dict[str, list[int]]:
+        """
+        Unordered [pageviews, visitors] of every key with rows dated on or
+        after a cutoff (keys in order of first appearance).
+
+        Args:
+            cutoff: Proleptic ordinal of the earliest migration date (0 for all)
+
+        Returns:
+            Dictionary of normalized key -> [pageviews, visitors]
+        """
+        width = len(self.keys)
+        base = bisect_left(self.dates, cutoff) * width
+        pageviews = self.pageviews
+        visitors = self.visitors
+        counts = self.counts
+        return {
+            key: [pageviews[base + k], visitors[base + k]]
+            for k, key in enumerate(self.keys)
+            if counts[base + k]
+        }
+
+
+class TimeseriesRollup:
+    """
+    One rollup tier (hour/day/week/month) of the hourly timeseries.
+
+    Stores where each bucket starts, both as an epoch and as a row offset,
+    so the rolled-up entries of any row window come from the prefix sums of
+    a TimeseriesIndex without touching the hourly rows.
+    """
+
+    __slots__ = ("resolution", "index", "starts", "rows")
+
+    def __init__(self, index: TimeseriesIndex, resolution: str):
+        self.resolution = resolution
+        self.index = index
+        self.starts = array("q")
+        # rows[b] is the first row of bucket b; rows[-1] is the row count
+        self.rows = array("i")
+
+        for row, epoch in enumerate(index.epochs):
+            start = bucket_start(epoch, resolution)
+            if not self.starts or start != self.starts[-1]:
+                self.starts.append(start)
+                self.rows.append(row)
+        self.rows.append(len(index))
+
+    def entries(self, start: int, stop: int) -> list[TimeseriesRecord]:
+        """
+        Rolled-up entries of rows [start, stop).
+
+        The first bucket only counts rows from `start` on, so a window
+        beginning mid-bucket isn't inflated by earlier rows.
+        """
+        if start >= stop:
+            return []
+        index = self.index
+        first = bisect_right(self.rows, start) - 1
+        last = bisect_right(self.rows, stop - 1) - 1
+
+        entries = []
+        for bucket in range(first, last + 1):
+            lo = max(self.rows[bucket], start)
+            hi = min(self.rows[bucket + 1], stop)
+            entries.append(
+                make_bucket(
+                    self.starts[bucket],
+                    index.cum_pageviews[hi] - index.cum_pageviews[lo],
+                    index.cum_visitors[hi] - index.cum_visitors[lo],
+                    index.cum_bounced[hi] - index.cum_bounced[lo],
+                    index.common_migration_date(lo, hi),
+                )
+            )
+        return entries
+
+
+class VercelDataset:
+    """Columnar migration data plus the indexes built over it at load time."""
+
+    def __init__(self, columns: ColumnarData):
+        self.columns = columns
+        self.metadata = columns.metadata
+        self.timeseries_index = TimeseriesIndex(columns)
+        self.rollups = {
+            resolution: TimeseriesRollup(self.timeseries_index, resolution)
+            for resolution in TIERS
+        }
+        self.stats_index = {
+            dimension: StatsIndex(columns, dimension) for dimension in STAT_DIMENSIONS
+        }
+        self._all_stats: AllStats | None = None
+
+    def all_stats(self) -> AllStats:
+        """The full dataset as an AllStats object, built on first use."""
+        if self._all_stats is None:
+            self._all_stats = self.columns.to_all_stats()
+        return self._all_stats
+
+
+# Process-wide cache: resolved path -> ((mtime_ns, size), dataset), where
+# the dataset is None for a file version that failed to load.
+_vercel_cache: dict[Path, tuple[tuple[int, int], VercelDataset | None]] = {}
+_vercel_cache_lock = threading.Lock()
+_vercel_preloaded = False
+
+
+@timed
+def load_vercel_dataset(file_path: Path) -> VercelDataset | None:
+    """
+    Load Vercel migration data as a memory-mapped, indexed dataset.
+
+    The dataset is cached for the lifetime of the process and reused until
+    the JSON file's mtime or size changes. A file that can't be parsed is
+    logged once per version and treated as missing.
+
+    Args:
+        file_path: Path to the JSON file
+
+    Returns:
+        VercelDataset or None if file doesn't exist or is invalid
+    """
+    key = Path(file_path).resolve()
+    try:
+        st = key.stat()
+    except FileNotFoundError:
+        _vercel_cache.pop(key, None)
+        return None
+    signature = (st.st_mtime_ns, st.st_size)
+
+    cached = _vercel_cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _vercel_cache_lock:
+        # Another thread may have loaded the file while we waited
+        cached = _vercel_cache.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            data = VercelDataset(open_columnar(key))
+        except FileNotFoundError:
+            _vercel_cache.pop(key, None)
+            return None
+        except (ValueError, OSError) as e:
+            # JSONDecodeError and pydantic's ValidationError are ValueErrors
+            print(f"Error parsing JSON file {file_path}: {e}")
+            _vercel_cache[key] = (signature, None)
+            return None
+
+        _vercel_cache[key] = (signature, data)
+        return data
 
 
 def load_vercel_data(file_path: Path) -> AllStats | None:
     """
     Load Vercel migration data from a JSON file.
 
+    The AllStats object is built once per loaded dataset and shared by every
+    caller (treat it as read-only), so it is cached and invalidated like the
+    dataset itself.
+
     Args:
         file_path: Path to the JSON file
 
     Returns:
         AllStats object or None if file doesn't exist
     """
+    data = load_vercel_dataset(file_path)
+    return data.all_stats() if data is not None else None
+
+
+def preload_vercel_data(file_paths: list[Path]) -> int:
+    """
+    Compile and map every migration file ahead of the first request.
+
+    A file that fails to load is logged and skipped (its project is served
+    without migration data), so one bad export never keeps /ready failing.
+
+    Args:
+        file_paths: Paths of the Vercel migration JSON files
+
+    Returns:
+        Number of files that were loaded successfully
+    """
+    global _vercel_preloaded
+
+    loaded = 0
     try:
-        with open(file_path, "r") as f:
-            data = json.load(f)
-            return AllStats(**data)
-    except FileNotFoundError:
-        return None
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON file {file_path}: {e}")
-        return None
+        for file_path in file_paths:
+            try:
+                if load_vercel_dataset(file_path) is not None:
+                    loaded += 1
+            except Exception as e:
+                print(f"Error preloading migration data {file_path}: {e}")
+    finally:
+        _vercel_preloaded = True
+    return loaded
+
+
+def is_vercel_data_ready() -> bool:
+    """Whether the startup preload of migration data has finished."""
+    return _vercel_preloaded
+
+
+def clear_vercel_cache() -> None:
+    """Drop all cached migration data (the next load re-reads from disk)."""
+    with _vercel_cache_lock:
+        _vercel_cache.clear()
 
 
 def get_empty_stats() -> AllStats:
@@ -67,8 +421,6 @@ def filter_timeseries_by_date(
         )
         return timeseries[first_nonzero_idx:]
 
-    from datetime import timedelta
-
     cutoff = datetime.now(timezone.utc).replace(
         hour=0, minute=0, second=0, microsecond=0
     ) - timedelta(days=days)
@@ -104,8 +456,6 @@ def filter_stats_by_date(stats: "Stats", days: int | None = None) -> "Stats":
     if days is None:
         return stats
 
-    from datetime import timedelta
-
     cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).date()
 
     def filter_and_aggregate(entries: list[StatEntry]) -> list[StatEntry]:
@@ -143,3 +493,96 @@ def filter_stats_by_date(stats: "Stats", days: int | None = None) -> "Stats":
         os_name=filter_and_aggregate(stats.os_name),
         country=filter_and_aggregate(stats.country),
     )
+
+
+def timeseries_window(
+    dataset: VercelDataset, days: int | None = None
+) -> tuple[int, int]:
+    """
+    Row range of the hourly timeseries covered by a day window.
+
+    Uses the same cutoff as filter_timeseries_by_date (midnight UTC, `days`
+    days ago) and starts at the first non-zero pageview entry.
+
+    Args:
+        dataset: Loaded migration dataset
+        days: Number of days to include (None for all)
+
+    Returns:
+        (start, stop) row offsets into the timeseries columns
+    """
+    since = None
+    if days is not None:
+        cutoff = datetime.now(timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) - timedelta(days=days)
+        since = int(cutoff.timestamp())
+    return dataset.timeseries_index.window(since)
+
+
+@timed
+def filter_dataset_timeseries(
+    dataset: VercelDataset, days: int | None = None, resolution: str | None = None
+) -> list[TimeseriesEntry] | list[TimeseriesRecord]:
+    """
+    Indexed equivalent of filter_timeseries_by_date.
+
+    Only the rows inside the window are materialized; with a resolution,
+    only one entry per bucket of that rollup tier.
+
+    Args:
+        dataset: Loaded migration dataset
+        days: Number of days to include (None for all)
+        resolution: Rollup tier ("hour", "day", "week", "month"), or None
+            for the raw rows
+
+    Returns:
+        Filtered list of TimeseriesRecord objects (one per bucket), or of
+        TimeseriesEntry objects for the raw rows
+    """
+    start, stop = timeseries_window(dataset, days)
+    if resolution is not None:
+        return dataset.rollups[resolution].entries(start, stop)
+    return dataset.columns.timeseries(start, stop)
+
+
+def timeseries_extent(
+    dataset: VercelDataset, days: int | None = None
+) -> tuple[int, int] | None:
+    """Epoch seconds of the first and last entries in a day window (None if empty)."""
+    start, stop = timeseries_window(dataset, days)
+    if start >= stop:
+        return None
+    epochs = dataset.timeseries_index.epochs
+    return epochs[start], epochs[stop - 1]
+
+
+def stats_cutoff(days: int | None) -> int:
+    """Proleptic ordinal of the earliest migration date in a day window (0 for all)."""
+    if days is None:
+        return 0
+    return (datetime.now(timezone.utc) - timedelta(days=days)).date().toordinal()
+
+
+@timed
+def dataset_stat_totals(
+    dataset: VercelDataset, days: int | None = None
+) -> dict[str, dict[str, list[int]]]:
+    """
+    Unordered per-key totals of every dimension, for merging before ranking.
+
+    Nothing is sorted and no StatEntry objects are created, so a top-K
+    merge never pays for the long tail of keys.
+
+    Args:
+        dataset: Loaded migration dataset
+        days: Number of days to include (None for all)
+
+    Returns:
+        Dictionary of dimension -> {normalized key: [pageviews, visitors]}
+    """
+    cutoff = stats_cutoff(days)
+    return {
+        dimension: index.totals(cutoff)
+        for dimension, index in dataset.stats_index.items()
+    }
@@ -0,0 +1,195 @@
+"""
+Live Windows
+
+The dashboard switches between periods (7, 30, 90 days, lifetime) of the
+same project. A live window holds the daily live rows of the widest period
+read from the live store (the daily timeseries plus per-day breakdown
+rows), and shorter periods are sliced from it locally instead of being
+read again. The widest fresh window of each project is kept for
+LIVE_WINDOW_TTL seconds.
+
+Sliced breakdowns sum daily rows, so a period's visitors are the sum of
+daily unique visitors, exactly as when the store is read directly. Windows
+only come from the live store: without it, periods are queried upstream
+one by one, which counts distinct visitors over the whole period.
+"""
+
+import heapq
+import os
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from operator import itemgetter
+
+from .livestore import live_store
+from .records import StatRecord, TimeseriesRecord
+from .singleflight import upstream_flights
+
+# Seconds a fetched window is used to answer shorter periods
+LIVE_WINDOW_TTL = float(os.getenv("LIVE_WINDOW_TTL", "60"))
+# Entries per breakdown dimension in a sliced period (as the live fetches return)
+LIVE_BREAKDOWN_LIMIT = 15
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+@dataclass(slots=True)
+class LiveWindow:
+    """
+    Daily live rows of a project's last `days` days, as of `today`.
+
+    Breakdown rows are (day, key, pageviews, visitors) tuples ordered by
+    day, per dimension.
+    """
+
+    days: int
+    today: date
+    timeseries: list[TimeseriesRecord]
+    breakdowns: dict[str, list[tuple[str, str, int, int]]]
+    fetched: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched
+
+    def covers(self, days: int) -> bool:
+        """Whether a period of `days` days can be sliced from this window."""
+        return days <= self.days
+
+    def _since(self, days: int) -> date:
+        # Same calendar days an upstream `now() - INTERVAL days DAY` query covers
+        return self.today - timedelta(days=days)
+
+    def slice_timeseries(self, days: int) -> list[TimeseriesRecord]:
+        """Daily timeseries of the last `days` days."""
+        since = _day_start(self._since(days))
+        start = bisect_left(self.timeseries, since, key=lambda e: e.date)
+        return self.timeseries[start:]
+
+    def slice(
+        self, days: int, limit: int = LIVE_BREAKDOWN_LIMIT
+    ) -> tuple[list[TimeseriesRecord], dict[str, list[StatRecord]]]:
+        """
+        Timeseries and top-`limit` breakdowns of the last `days` days.
+
+        Args:
+            days: Number of days to look back (at most self.days)
+            limit: Maximum number of entries per breakdown
+
+        Returns:
+            Tuple of (timeseries, breakdowns), like a live fetch of `days`
+        """
+        since = self._since(days).isoformat()
+        breakdowns = {}
+        for dimension, rows in self.breakdowns.items():
+            totals: dict[str, list[int]] = {}
+            for i in range(bisect_left(rows, since, key=itemgetter(0)), len(rows)):
+                _, key, pageviews, visitors = rows[i]
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = [pageviews, visitors]
+                else:
+                    total[0] += pageviews
+                    total[1] += visitors
+            # Most pageviews first, ties by key (as the store orders them)
+            top = heapq.nsmallest(
+                limit, totals.items(), key=lambda item: (-item[1][0], item[0])
+            )
+            breakdowns[dimension] = [
+                StatRecord(key=key, pageviews=pageviews, visitors=visitors)
+                for key, (pageviews, visitors) in top
+            ]
+        return self.slice_timeseries(days), breakdowns
+
+
+async def fetch_live_window(provider: str, source_id: str, days: int) -> LiveWindow:
+    """
+    Sync a project's live store rows and read its last `days` days.
+
+    Args:
+        provider: "posthog" or "cloudflare"
+        source_id: PostHog project ID or Cloudflare site tag
+        days: Number of days to look back
+
+    Returns:
+        The window
+
+    Raises:
+        sqlite3.Error: If the live store is unavailable
+    """
+    today = datetime.now(timezone.utc).date()
+    timeseries, breakdowns = await live_store.window(provider, source_id, days)
+    return LiveWindow(
+        days=days, today=today, timeseries=timeseries, breakdowns=breakdowns
+    )
+
+
+class LiveWindowCache:
+    """
+    Keeps the widest fresh live window of every project.
+
+    Args:
+        ttl: Seconds a window may be sliced after it was fetched (0 disables)
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._windows: dict[tuple[str, str], LiveWindow] = {}
+        self.counters = {"fetches": 0, "slices": 0}
+
+    def get(self, provider: str, source_id: str, days: int) -> LiveWindow | None:
+        """
+        A fresh window a period of `days` days can be sliced from.
+
+        Returns:
+            The window, or None if there is none
+        """
+        window = self._windows.get((provider, source_id))
+        if window is None or window.age >= self.ttl or not window.covers(days):
+            return None
+        self.counters["slices"] += 1
+        return window
+
+    async def fetch(self, provider: str, source_id: str, days: int) -> LiveWindow:
+        """
+        A window covering `days` days: the cached one if it is fresh and
+        wide enough, otherwise a new fetch (shared by concurrent callers).
+        """
+        window = self.get(provider, source_id, days)
+        if window is not None:
+            return window
+
+        async def fetch() -> LiveWindow:
+            self.counters["fetches"] += 1
+            return await fetch_live_window(provider, source_id, days)
+
+        window = await upstream_flights.do(
+            ("live_window", provider, source_id, days), fetch
+        )
+        key = (provider, source_id)
+        current = self._windows.get(key)
+        if current is None or current.age >= self.ttl or window.days >= current.days:
+            self._windows[key] = window
+        return window
+
+    def stats(self) -> dict:
+        """Fetch/slice counters and the cached windows."""
+        return {
+            **self.counters,
+            "ttl": self.ttl,
+            "windows": [
+                {
+                    "provider": provider,
+                    "project_id": source_id,
+                    "days": window.days,
+                    "age": round(window.age, 1),
+                }
+                for (provider, source_id), window in self._windows.items()
+            ],
+        }
+
+
+live_windows = LiveWindowCache(ttl=LIVE_WINDOW_TTL)
@@ -0,0 +1,38 @@
+"""Shared fixtures: mocked upstream clients and fresh per-test service state."""
+
+import httpx
+import pytest
+
+from services import clients
+from services.breaker import upstream_breakers
+from services.cache import response_cache
+from services.singleflight import upstream_flights
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    """Start every test with closed breakers, an empty cache and no flights."""
+    upstream_breakers.clear()
+    response_cache.purge()
+    upstream_flights._in_flight.clear()
+    yield
+    upstream_breakers.clear()
+    response_cache.purge()
+    clients._clients.clear()
+
+
+@pytest.fixture
+def mock_upstream():
+    """
+    Route an upstream's shared client through an httpx.MockTransport.
+
+    Usage: mock_upstream("cloudflare", handler), where handler takes an
+    httpx.Request and returns an httpx.Response.
+    """
+
+    def install(upstream: str, handler) -> None:
+        clients._clients[upstream] = httpx.AsyncClient(
+            transport=httpx.MockTransport(handler)
+        )
+
+    return install
@@ -0,0 +1,130 @@
+"""Cross-project aggregates: per-project and combined stats, with bounded fan-out."""
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import aggregate
+from services.merger import OTHER_KEY
+from services.records import StatRecord, TimeseriesRecord
+
+TODAY = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _day(days_ago: int, pageviews: int) -> TimeseriesRecord:
+    return TimeseriesRecord(TODAY - timedelta(days=days_ago), pageviews, 1, 0.0)
+
+
+# Live (timeseries, breakdowns) per project
+LIVE = {
+    "blog": (
+        [_day(2, 4), _day(1, 6)],
+        {"path": [StatRecord("/blog", 5, 2), StatRecord("/", 3, 3)]},
+    ),
+    "jportal": (
+        [_day(1, 1), _day(0, 2)],
+        {"path": [StatRecord("/jportal", 5, 4), StatRecord("/", 3, 1)]},
+    ),
+    "portfolio": ([], {}),
+}
+
+
+class LiveStats:
+    """Stands in for gather_live_stats, recording the peak concurrency."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def __call__(self, config, days):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0)
+            return LIVE[config["slug"]]
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def projects(monkeypatch, tmp_path) -> dict[str, dict]:
+    async def no_sync(configs):
+        list(configs)
+
+    monkeypatch.setattr(aggregate, "gather_live_stats", LiveStats())
+    monkeypatch.setattr(aggregate, "sync_live_projects", no_sync)
+    return {
+        slug: {"slug": slug, "ph_id": "", "vercel_file": tmp_path / f"{slug}.json"}
+        for slug in LIVE
+    }
+
+
+def _build(projects, days=30, resolution=None, limit=None) -> dict:
+    body = asyncio.run(
+        aggregate.build_aggregate_body(projects, days, resolution, limit)
+    )
+    return json.loads(body)
+
+
+def _paths(stats: dict) -> list[tuple[str, int]]:
+    return [(entry["key"], entry["pageviews"]) for entry in stats["path"]]
+
+
+def test_breakdowns_are_combined_before_the_limit(projects):
+    body = _build(projects, limit=1)
+
+    assert _paths(body["projects"]["blog"]["stats"]) == [("/blog", 5), (OTHER_KEY, 3)]
+    assert _paths(body["projects"]["jportal"]["stats"]) == [
+        ("/jportal", 5),
+        (OTHER_KEY, 3),
+    ]
+    # "/" is second in each project but first across both
+    assert _paths(body["combined"]["stats"]) == [("/", 6), (OTHER_KEY, 10)]
+    assert body["combined"]["stats"]["path"][0]["visitors"] == 4
+
+
+def test_combined_timeseries_sums_the_projects(projects):
+    body = _build(projects)
+
+    combined = [entry["pageviews"] for entry in body["combined"]["timeseries"]]
+    assert combined == [4, 7, 2]
+    assert body["projects"]["portfolio"]["timeseries"] == []
+    assert body["resolution"] == "day"
+    assert body["metadata"]["source"] == "unified_aggregate"
+
+
+def test_every_project_uses_one_tier(projects):
+    body = _build(projects, days=0, resolution="auto")
+
+    # Lifetime `auto` tier from the span of all projects' data (3 days)
+    assert body["resolution"] == "hour"
+    dates = [entry["date"] for entry in body["combined"]["timeseries"]]
+    assert len(dates) == len(set(dates)) == 3
+
+
+def test_fan_out_is_bounded(projects, monkeypatch):
+    monkeypatch.setattr(aggregate, "_semaphore", asyncio.Semaphore(2))
+
+    _build(projects)
+
+    assert aggregate.gather_live_stats.calls == 3
+    assert aggregate.gather_live_stats.peak == 2
+
+
+def test_aggregates_are_cached_per_project_set(projects):
+    async def run():
+        first = await aggregate.get_aggregate_body(projects, 30)
+        again = await aggregate.get_aggregate_body(projects, 30)
+        subset = {"blog": projects["blog"]}
+        other = await aggregate.get_aggregate_body(subset, 30)
+        return first, again, other
+
+    first, again, other = asyncio.run(run())
+
+    assert again is first
+    assert other.etag != first.etag
+    assert aggregate.gather_live_stats.calls == 4
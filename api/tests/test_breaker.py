@@ -0,0 +1,213 @@
+"""Circuit breakers, and upstream failures tracked per cached computation."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from services import breaker, clients
+from services.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    get_breaker,
+)
+from services.cache import ResponseCache
+from services.singleflight import upstream_flights
+
+URL = "https://upstream.test/query"
+
+
+@pytest.fixture
+def clock(monkeypatch) -> SimpleNamespace:
+    """A settable monotonic clock for the breakers."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(breaker, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def _opened(clock, threshold: int = 2, reset_timeout: float = 30) -> CircuitBreaker:
+    cb = CircuitBreaker("posthog", threshold, reset_timeout)
+    for _ in range(threshold):
+        cb.check()
+        cb.record_failure()
+    return cb
+
+
+def test_consecutive_failures_open_the_breaker(clock):
+    cb = CircuitBreaker("posthog", failure_threshold=3, reset_timeout=30)
+
+    cb.record_failure()
+    cb.record_failure()
+    cb.record_success()
+    cb.record_failure()
+    cb.record_failure()
+    assert cb.state == CLOSED
+
+    cb.record_failure()
+    assert cb.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        cb.check()
+    assert cb.counters["opened"] == 1
+    assert cb.counters["rejected"] == 1
+
+
+def test_one_trial_at_a_time_once_half_open(clock):
+    cb = _opened(clock)
+    clock.now += 29
+    assert not cb.allow()
+
+    clock.now += 1
+    assert cb.state == HALF_OPEN
+    assert cb.check() is True
+    assert not cb.allow()
+
+    cb.record_success()
+    assert cb.state == CLOSED
+    assert cb.check() is False
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    cb = _opened(clock)
+    clock.now += 30
+    cb.check()
+
+    cb.record_failure()
+
+    assert cb.state == OPEN
+    assert cb.stats()["open_for"] == 0
+    clock.now += 30
+    assert cb.allow()
+
+
+def test_released_trial_lets_the_next_request_try(clock):
+    cb = _opened(clock)
+    clock.now += 30
+    cb.check()
+
+    cb.release()
+
+    assert cb.state == HALF_OPEN
+    assert cb.check() is True
+
+
+def _half_open(clock, upstream: str = "posthog") -> CircuitBreaker:
+    cb = get_breaker(upstream)
+    for _ in range(cb.failure_threshold):
+        cb.record_failure()
+    clock.now += cb.reset_timeout
+    assert cb.state == HALF_OPEN
+    return cb
+
+
+def test_cancelled_trial_request_is_released(clock, mock_upstream):
+    started = asyncio.Event()
+
+    async def hang(request):
+        started.set()
+        await asyncio.Event().wait()
+
+    mock_upstream("posthog", hang)
+    cb = _half_open(clock)
+
+    async def run():
+        trial = asyncio.create_task(clients.post("posthog", URL))
+        await started.wait()
+        # Everyone else is turned away while the trial is in flight
+        with pytest.raises(CircuitOpenError):
+            await clients.post("posthog", URL)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(run())
+
+    assert cb.state == HALF_OPEN
+    assert cb.allow()
+
+
+def test_trial_failing_outside_the_upstream_is_released(clock, mock_upstream):
+    def broken(request):
+        raise RuntimeError("bug in the request code")
+
+    mock_upstream("posthog", broken)
+    cb = _half_open(clock)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(clients.post("posthog", URL))
+
+    assert cb.state == HALF_OPEN
+    assert cb.allow()
+
+
+@pytest.fixture
+def cache() -> ResponseCache:
+    return ResponseCache(ttl=60, stale_ttl=600, max_bytes=1 << 20)
+
+
+def _answer(request: httpx.Request) -> httpx.Response:
+    project = json.loads(request.content)["project"]
+    if project == "down":
+        return httpx.Response(503)
+    return httpx.Response(200, json={"project": project})
+
+
+async def _query(project: str) -> bytes:
+    await asyncio.sleep(0)
+    response = await clients.post("posthog", URL, json={"project": project})
+    return response.content if response.status_code == 200 else b"{}"
+
+
+def test_failures_only_degrade_their_own_computation(cache, mock_upstream, monkeypatch):
+    monkeypatch.setattr(clients, "UPSTREAM_RETRIES", 0)
+    mock_upstream("posthog", _answer)
+
+    async def run():
+        return await asyncio.gather(
+            cache.recompute("up", lambda: _query("up"), ["posthog"]),
+            cache.recompute("down", lambda: _query("down"), ["posthog"]),
+        )
+
+    up, down = asyncio.run(run())
+
+    assert json.loads(up.body) == {"project": "up"}
+    assert cache._entries.get("up") is up
+    assert cache._entries.get("down") is None
+    assert b'"degraded":true' in down.body
+    assert cache.counters["degraded"] == 1
+
+
+def test_shared_fetch_failures_count_for_every_caller(
+    cache, mock_upstream, monkeypatch
+):
+    monkeypatch.setattr(clients, "UPSTREAM_RETRIES", 0)
+    mock_upstream("posthog", _answer)
+
+    def shared():
+        return upstream_flights.do("down", lambda: _query("down"))
+
+    async def run():
+        return await asyncio.gather(
+            cache.recompute("first", shared, ["posthog"]),
+            cache.recompute("joined", shared, ["posthog"]),
+        )
+
+    asyncio.run(run())
+
+    assert upstream_flights.counters["shared"] >= 1
+    assert cache._entries.get("first") is None
+    assert cache._entries.get("joined") is None
+    assert cache.counters["degraded"] == 2
+
+
+def test_other_upstreams_failures_are_ignored(cache, mock_upstream, monkeypatch):
+    monkeypatch.setattr(clients, "UPSTREAM_RETRIES", 0)
+    mock_upstream("posthog", _answer)
+
+    entry = asyncio.run(cache.recompute("cf", lambda: _query("down"), ["cloudflare"]))
+
+    assert cache._entries.get("cf") is entry
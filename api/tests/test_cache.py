@@ -0,0 +1,167 @@
+"""Response cache: TTL, stale-while-revalidate and the LRU memory bound."""
+
+import asyncio
+
+import pytest
+
+from services import cache
+from services.cache import ResponseCache
+
+
+class FakeTime:
+    """Stands in for the time module in services.cache, with a settable clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeTime:
+    fake = FakeTime()
+    monkeypatch.setattr(cache, "time", fake)
+    return fake
+
+
+class Computation:
+    """A compute() coroutine factory returning numbered bodies."""
+
+    def __init__(self, prefix: bytes = b"body", fail: bool = False):
+        self.prefix = prefix
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self) -> bytes:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("compute failed")
+        return b'{"n":"' + self.prefix + str(self.calls).encode() + b'"}'
+
+
+async def _settle(response_cache: ResponseCache) -> None:
+    """Wait for the cache's background refreshes."""
+    while response_cache._refresh_tasks:
+        await asyncio.gather(*response_cache._refresh_tasks)
+
+
+def test_fresh_entry_is_served_without_recomputing(clock):
+    response_cache = ResponseCache(ttl=60, stale_ttl=600, max_bytes=1 << 20)
+    compute = Computation()
+
+    async def run():
+        first = await response_cache.get_or_compute("k", compute)
+        clock.now += 59
+        second = await response_cache.get_or_compute("k", compute)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert second is first
+    assert compute.calls == 1
+    assert response_cache.counters["misses"] == 1
+    assert response_cache.counters["hits"] == 1
+
+
+def test_stale_entry_is_served_while_it_refreshes(clock):
+    response_cache = ResponseCache(ttl=60, stale_ttl=600, max_bytes=1 << 20)
+    compute = Computation()
+
+    async def run():
+        first = await response_cache.get_or_compute("k", compute)
+        clock.now += 61
+        stale = await response_cache.get_or_compute("k", compute)
+        # A second stale hit doesn't start another refresh
+        await response_cache.get_or_compute("k", compute)
+        await _settle(response_cache)
+        fresh = await response_cache.get_or_compute("k", compute)
+        return first, stale, fresh
+
+    first, stale, fresh = asyncio.run(run())
+    assert stale is first
+    assert compute.calls == 2
+    assert fresh.body == b'{"n":"body2"}'
+    assert response_cache.counters["stale_hits"] == 2
+    assert response_cache.counters["refreshes"] == 1
+
+
+def test_entry_past_the_stale_window_is_recomputed(clock):
+    response_cache = ResponseCache(ttl=60, stale_ttl=600, max_bytes=1 << 20)
+    compute = Computation()
+
+    async def run():
+        await response_cache.get_or_compute("k", compute)
+        clock.now += 661
+        return await response_cache.get_or_compute("k", compute)
+
+    entry = asyncio.run(run())
+    assert entry.body == b'{"n":"body2"}'
+    assert response_cache.counters["misses"] == 2
+    assert response_cache.counters["stale_hits"] == 0
+
+
+def test_failed_refresh_keeps_the_stale_entry(clock):
+    response_cache = ResponseCache(ttl=60, stale_ttl=600, max_bytes=1 << 20)
+
+    async def run():
+        first = await response_cache.get_or_compute("k", Computation())
+        clock.now += 61
+        failing = Computation(fail=True)
+        await response_cache.get_or_compute("k", failing)
+        await _settle(response_cache)
+        # The refresh flag is cleared, so the next stale hit retries
+        served = await response_cache.get_or_compute("k", failing)
+        await _settle(response_cache)
+        return first, served, failing
+
+    first, served, failing = asyncio.run(run())
+    assert served is first
+    assert failing.calls == 2
+    assert response_cache.counters["refresh_errors"] == 2
+
+
+def test_least_recently_used_entries_are_evicted_to_fit(clock):
+    probe = cache.CacheEntry(b'{"n":"body1"}')
+    # Room for exactly two entries of this size
+    response_cache = ResponseCache(ttl=60, stale_ttl=600, max_bytes=probe.size * 2)
+    compute = Computation()
+
+    async def run():
+        await response_cache.get_or_compute("a", compute)
+        await response_cache.get_or_compute("b", compute)
+        # Touch "a", so "b" is the least recently used one
+        await response_cache.get_or_compute("a", compute)
+        await response_cache.get_or_compute("c", compute)
+
+    asyncio.run(run())
+    assert list(response_cache._entries) == ["a", "c"]
+    assert response_cache.counters["evictions"] == 1
+    assert response_cache.stats()["bytes"] == probe.size * 2
+
+
+def test_zero_ttl_disables_caching(clock):
+    response_cache = ResponseCache(ttl=0, stale_ttl=600, max_bytes=1 << 20)
+    compute = Computation()
+
+    async def run():
+        await response_cache.get_or_compute("k", compute)
+        return await response_cache.get_or_compute("k", compute)
+
+    entry = asyncio.run(run())
+    assert entry.body == b'{"n":"body2"}'
+    assert compute.calls == 2
+    assert not response_cache._entries
+
+
+def test_purge_by_key_predicate(clock):
+    response_cache = ResponseCache(ttl=60, stale_ttl=600, max_bytes=1 << 20)
+    for key in [
+        ("blog", "stats", 30),
+        ("blog", "timeseries", 30),
+        ("jportal", "stats", 30),
+    ]:
+        response_cache.set(key, b"{}")
+
+    assert response_cache.purge(lambda key: key[0] == "blog") == 2
+    assert list(response_cache._entries) == [("jportal", "stats", 30)]
+    assert response_cache.stats()["bytes"] == cache.CacheEntry(b"{}").size
@@ -0,0 +1,365 @@
+"""Cloudflare timeseries windowing: several windows merge without gaps or overlaps."""
+
+import asyncio
+import json
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+from services import cloudflare
+
+# One synthetic pageload every EVENT_STEP seconds since the epoch
+EVENT_STEP = 600
+
+
+# Fixed end of every planned range (whole seconds, off the event grid)
+NOW = datetime(2026, 3, 14, 15, 9, 26, tzinfo=timezone.utc)
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+class FakeCloudflare:
+    """
+    Answers timeseries queries from a fixed event stream (one pageload and
+    one visit every EVENT_STEP seconds, plus one exactly on every window
+    edge), honouring each request's time filter and grouping by the
+    requested time dimension.
+
+    Args:
+        edges: Epoch seconds of the window edges
+    """
+
+    def __init__(self, edges: set[int]):
+        self.edges = edges
+        self.ranges: list[tuple[datetime, datetime]] = []
+
+    def events(self, start: datetime, end: datetime, inclusive: bool) -> list[int]:
+        lo, hi = start.timestamp(), end.timestamp()
+        first = -(-int(lo) // EVENT_STEP) * EVENT_STEP
+        stream = set(range(first, int(hi) + 1, EVENT_STEP)) | self.edges
+        return sorted(t for t in stream if lo <= t < hi or (inclusive and t == hi))
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        query = body["query"]
+        bounds = body["variables"]["filter"]["AND"][0]
+        start = _parse_time(bounds["datetime_geq"])
+        inclusive = "datetime_leq" in bounds
+        end = _parse_time(bounds["datetime_leq" if inclusive else "datetime_lt"])
+        self.ranges.append((start, end))
+
+        hourly = "ts: datetimeHour" in query
+        buckets: Counter[str] = Counter()
+        for t in self.events(start, end, inclusive):
+            moment = datetime.fromtimestamp(t, timezone.utc)
+            if hourly:
+                buckets[moment.strftime("%Y-%m-%dT%H:00:00Z")] += 1
+            else:
+                buckets[moment.strftime("%Y-%m-%d")] += 1
+
+        groups = [
+            {"count": count, "sum": {"visits": count}, "dimensions": {"ts": ts}}
+            for ts, count in sorted(buckets.items())
+        ]
+        account = {"rumPageloadEventsAdaptiveGroups": groups}
+        # Breakdown selections of a combined stats document
+        account.update({field: [] for field in cloudflare.CF_DIMENSIONS})
+        return httpx.Response(200, json={"data": {"viewer": {"accounts": [account]}}})
+
+    def expected_daily(self, days: int) -> dict[str, int]:
+        """Per-day event counts of the whole range [NOW - days, NOW]."""
+        daily: Counter[str] = Counter()
+        for t in self.events(NOW - timedelta(days=days), NOW, inclusive=True):
+            daily[datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d")] += 1
+        return dict(daily)
+
+
+@pytest.fixture
+def fake_cloudflare(request, monkeypatch, mock_upstream) -> FakeCloudflare:
+    """A FakeCloudflare for a (days, CF_GROUP_LIMIT) parameter, planned at NOW."""
+    days, group_limit = request.param
+    monkeypatch.setattr(cloudflare, "CF_API_TOKEN", "token")
+    monkeypatch.setattr(cloudflare, "CF_ACCOUNT_TAG", "account")
+    monkeypatch.setattr(cloudflare, "CF_GROUP_LIMIT", group_limit)
+    plan = cloudflare._timeseries_plan
+    monkeypatch.setattr(
+        cloudflare, "_timeseries_plan", lambda days, now=None: plan(days, NOW)
+    )
+    _, windows = plan(days, NOW)
+    edges = {int(bound.timestamp()) for window in windows for bound in window}
+    fake = FakeCloudflare(edges)
+    mock_upstream("cloudflare", fake)
+    return fake
+
+
+def _daily_counts(timeseries) -> dict[str, int]:
+    """Pageviews per day, checking the stitched rows are one per day, in order."""
+    days = [entry.date.strftime("%Y-%m-%d") for entry in timeseries]
+    assert days == sorted(set(days)), "duplicate or unordered daily rows"
+    return dict(zip(days, (entry.pageviews for entry in timeseries)))
+
+
+def _calendar(days: int) -> list[str]:
+    """Every calendar day touched by [NOW - days, NOW]."""
+    first = (NOW - timedelta(days=days)).date()
+    return [
+        (first + timedelta(days=n)).isoformat()
+        for n in range((NOW.date() - first).days + 1)
+    ]
+
+
+@pytest.mark.parametrize(
+    "days, group_limit, dimension",
+    [(3, 24, "datetimeHour"), (10, 50, "datetimeHour"), (60, 7, "datetimeDay")],
+)
+def test_timeseries_plan_windows_are_contiguous(
+    days, group_limit, dimension, monkeypatch
+):
+    monkeypatch.setattr(cloudflare, "CF_GROUP_LIMIT", group_limit)
+
+    chosen, windows = cloudflare._timeseries_plan(days, NOW)
+
+    step = timedelta(hours=1) if dimension == "datetimeHour" else timedelta(days=1)
+    assert chosen == dimension
+    assert len(windows) > 1
+    assert windows[0][0] == NOW - timedelta(days=days)
+    assert windows[-1][1] == NOW
+    for (_, end), (next_start, _) in zip(windows, windows[1:]):
+        assert end == next_start
+    assert all(end - start <= step * group_limit for start, end in windows)
+
+
+# Hourly windows of a day, of a few hours and of about two days, then daily ones
+WINDOWED = [(3, 24), (5, 7), (10, 50), (60, 7)]
+
+
+@pytest.mark.parametrize("fake_cloudflare", WINDOWED, indirect=True, ids=str)
+def test_windowed_timeseries_has_no_gaps_or_double_counts(fake_cloudflare, request):
+    days = request.node.callspec.params["fake_cloudflare"][0]
+
+    timeseries = asyncio.run(cloudflare.fetch_cf_timeseries("site", days))
+
+    assert len(fake_cloudflare.ranges) > 1
+    counts = _daily_counts(timeseries)
+    # Days split across windows appear once, summed, and none is missing
+    assert list(counts) == _calendar(days)
+    assert counts == fake_cloudflare.expected_daily(days)
+
+
+@pytest.mark.parametrize("fake_cloudflare", [(3, 24)], indirect=True, ids=str)
+def test_stats_fall_back_to_windowed_timeseries(fake_cloudflare):
+    timeseries, breakdowns = asyncio.run(cloudflare.fetch_cf_stats("site", 3))
+
+    # One breakdowns document plus one request per timeseries window
+    windows = len(cloudflare._timeseries_plan(3)[1])
+    assert windows > 1
+    assert len(fake_cloudflare.ranges) == windows + 1
+    assert list(_daily_counts(timeseries)) == _calendar(3)
+    assert _daily_counts(timeseries) == fake_cloudflare.expected_daily(3)
+    assert set(breakdowns) == set(cloudflare.CF_DIMENSIONS)
+
+
+def _selections(query: str) -> dict[str, str]:
+    """Alias -> selection text of each aliased group selection in a document."""
+    parts = re.split(r"(\w+): rumPageloadEventsAdaptiveGroups", query)[1:]
+    return dict(zip(parts[::2], parts[1::2]))
+
+
+def test_stats_query_has_one_aliased_selection_per_section():
+    selections = _selections(cloudflare.build_cf_stats_query(limit=7))
+
+    assert list(selections) == [cloudflare.TIMESERIES_ALIAS, *cloudflare.CF_DIMENSIONS]
+    assert "ts: datetimeHour" in selections[cloudflare.TIMESERIES_ALIAS]
+    for field, cf_dim in cloudflare.CF_DIMENSIONS.items():
+        assert "limit: 7," in selections[field]
+        assert f"key: {cf_dim}" in selections[field]
+
+    breakdowns_only = cloudflare.build_cf_stats_query(timeseries_dimension=None)
+    assert list(_selections(breakdowns_only)) == list(cloudflare.CF_DIMENSIONS)
+
+
+def _group(count: int, visits: int, **dimensions) -> dict:
+    return {"count": count, "sum": {"visits": visits}, "dimensions": dimensions}
+
+
+STATS_RESPONSE = {
+    "data": {
+        "viewer": {
+            "accounts": [
+                {
+                    "timeseries": [
+                        _group(3, 2, ts="2026-03-13T22:00:00Z"),
+                        _group(4, 1, ts="2026-03-13T23:00:00Z"),
+                        _group(5, 5, ts="2026-03-14T00:00:00Z"),
+                    ],
+                    "path": [_group(9, 6, key="/Blog"), _group(2, 2, key="/")],
+                    "referrer": [_group(4, 3, key="")],
+                    "country": [_group(12, 8, key="IN")],
+                }
+            ]
+        }
+    }
+}
+
+
+def test_stats_response_is_split_into_sections():
+    timeseries, breakdowns = cloudflare.parse_cf_stats(STATS_RESPONSE)
+
+    assert [(e.date.day, e.pageviews, e.visitors) for e in timeseries] == [
+        (13, 7, 3),
+        (14, 5, 5),
+    ]
+    assert [(e.key, e.pageviews, e.visitors) for e in breakdowns["path"]] == [
+        ("/blog", 9, 6),
+        ("/", 2, 2),
+    ]
+    assert breakdowns["referrer"][0].key == "(unknown)"
+    assert breakdowns["country"][0].key == "in"
+    # Selections missing from the response are empty, not errors
+    assert breakdowns["device_type"] == breakdowns["os_name"] == []
+    assert set(breakdowns) == set(cloudflare.CF_DIMENSIONS)
+
+
+def test_stats_fit_in_one_request(monkeypatch, mock_upstream):
+    monkeypatch.setattr(cloudflare, "CF_API_TOKEN", "token")
+    monkeypatch.setattr(cloudflare, "CF_ACCOUNT_TAG", "account")
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=STATS_RESPONSE)
+
+    mock_upstream("cloudflare", handler)
+
+    timeseries, breakdowns = asyncio.run(cloudflare.fetch_cf_stats("site", 7))
+
+    assert len(requests) == 1
+    variables = requests[0]["variables"]
+    assert variables["accountTag"] == "account"
+    assert {"siteTag": "site"} in variables["filter"]["AND"]
+    assert list(_selections(requests[0]["query"]))[0] == cloudflare.TIMESERIES_ALIAS
+    assert (timeseries, breakdowns) == cloudflare.parse_cf_stats(STATS_RESPONSE)
+
+
+class FakeDailyCloudflare:
+    """
+    Answers build_cf_daily_query() documents: each aliased selection gets
+    groups derived from the site tag in its filter variable, so answers
+    for different sites never coincide.
+    """
+
+    DAYS = ["2026-03-01", "2026-03-02"]
+
+    def __init__(self):
+        self.requests: list[dict] = []
+
+    def groups(self, site_tag: str, selection: str) -> list[dict]:
+        weight = sum(map(ord, site_tag))
+        if selection == cloudflare.TIMESERIES_ALIAS:
+            return [
+                _group(weight + i, i + 1, day=day) for i, day in enumerate(self.DAYS)
+            ]
+        # Three keys a day, most visits first
+        return [
+            _group(
+                weight - rank, 3 - rank, day=day, key=f"{site_tag}-{selection}-{rank}"
+            )
+            for rank in range(3)
+            for day in self.DAYS
+        ]
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        self.requests.append(body)
+        query, variables = body["query"], body["variables"]
+        declared = re.findall(r"\$(\w+): ", query.split(") {")[0])
+        assert sorted(declared) == sorted(variables)
+
+        account = {}
+        for alias, filter_var in re.findall(
+            r"(\w+): rumPageloadEventsAdaptiveGroups\(limit: \d+, filter: \$(\w+)",
+            query,
+        ):
+            (site_tag,) = [
+                part["siteTag"]
+                for part in variables[filter_var]["AND"]
+                if "siteTag" in part
+            ]
+            # The groups follow the filter, whatever the alias says
+            account[alias] = self.groups(site_tag, re.sub(r"^s\d+_", "", alias))
+        return httpx.Response(200, json={"data": {"viewer": {"accounts": [account]}}})
+
+
+@pytest.fixture
+def fake_daily(monkeypatch, mock_upstream) -> FakeDailyCloudflare:
+    monkeypatch.setattr(cloudflare, "CF_ACCOUNT_TAG", "account")
+    fake = FakeDailyCloudflare()
+    mock_upstream("cloudflare", fake)
+    return fake
+
+
+def test_batched_daily_rows_match_one_query_per_site(fake_daily):
+    start, end = date(2026, 3, 1), date(2026, 3, 3)
+    sites = ["alpha", "beta", "gamma"]
+
+    async def run():
+        batch = await cloudflare.fetch_cf_daily_rows_batch(sites, start, end, limit=2)
+        single = {
+            site: await cloudflare.fetch_cf_daily_rows(site, start, end, limit=2)
+            for site in sites
+        }
+        return batch, single
+
+    batch, single = asyncio.run(run())
+
+    assert batch == single
+    assert len(fake_daily.requests) == 1 + len(sites)
+    batched = fake_daily.requests[0]
+    assert sorted(batched["variables"]) == [
+        "accountTag",
+        "filter0",
+        "filter1",
+        "filter2",
+    ]
+    aliases = re.findall(r"(\w+): rumPageloadEventsAdaptiveGroups", batched["query"])
+    assert len(aliases) == len(sites) * (1 + len(cloudflare.CF_DIMENSIONS))
+    assert {alias.split("_", 1)[0] for alias in aliases} == {"s0", "s1", "s2"}
+
+    rows = batch["beta"]
+    timeseries = [row for row in rows if row[1] == cloudflare.TIMESERIES_ALIAS]
+    assert [row[0] for row in timeseries] == FakeDailyCloudflare.DAYS
+    # At most `limit` keys per field and day, the most visited ones
+    paths = [row for row in rows if row[1] == "path"]
+    assert {row[2] for row in paths} == {"beta-path-0", "beta-path-1"}
+    assert len(paths) == 2 * len(FakeDailyCloudflare.DAYS)
+
+
+def test_one_site_batch_is_a_plain_query(fake_daily):
+    rows = asyncio.run(
+        cloudflare.fetch_cf_daily_rows_batch(
+            ["alpha"], date(2026, 3, 1), date(2026, 3, 3)
+        )
+    )
+
+    assert list(rows) == ["alpha"]
+    assert "s0_" not in fake_daily.requests[0]["query"]
+    assert "filter" in fake_daily.requests[0]["variables"]
+
+
+def test_daily_query_errors_are_raised(monkeypatch, mock_upstream):
+    mock_upstream(
+        "cloudflare",
+        lambda request: httpx.Response(200, json={"errors": [{"message": "cost"}]}),
+    )
+
+    with pytest.raises(httpx.HTTPError):
+        asyncio.run(
+            cloudflare.fetch_cf_daily_rows_batch(
+                ["alpha", "beta"], date(2026, 3, 1), date(2026, 3, 3)
+            )
+        )
@@ -0,0 +1,137 @@
+"""Columnar migration files: round trips and recompiling stale or broken files."""
+
+import json
+import os
+import struct
+from datetime import timezone
+
+import pytest
+
+from models import AllStats
+from services import columnar
+from services.columnar import ColumnarData, columnar_path, open_columnar
+
+EXPORT = {
+    "metadata": {"export_date": "2025-12-01T10:00:00Z", "source": "vercel"},
+    "timeseries": [
+        # Out of order on purpose: the compiled date column is sorted
+        {
+            "date": "2025-11-02T05:00:00Z",
+            "pageviews": 7,
+            "visitors": 3,
+            "bounce_rate": 0.5,
+            "migration_date": "2025-12-01",
+        },
+        {
+            "date": "2025-11-01T23:00:00",
+            "pageviews": 2,
+            "visitors": 1,
+            "bounce_rate": 0,
+        },
+    ],
+    "stats": {
+        "path": [
+            {"key": "/", "pageviews": 6, "visitors": 3},
+            {"key": "/blog/ünïcode", "pageviews": 3, "visitors": 1},
+        ],
+        "country": [{"key": "IN", "pageviews": 9, "visitors": 4}],
+        "referrer": [{"key": "/", "pageviews": 1, "visitors": 1}],
+    },
+}
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "COLUMNAR_DIR", "")
+    path = tmp_path / "blog.json"
+    path.write_text(json.dumps(EXPORT))
+    return path
+
+
+def _expected(document: dict) -> AllStats:
+    data = AllStats(**document)
+    data.timeseries.sort(key=lambda entry: columnar._to_epoch(entry.date))
+    for entry in data.timeseries:
+        # Read back as UTC, like every timestamp of the exports
+        if entry.date.tzinfo is None:
+            entry.date = entry.date.replace(tzinfo=timezone.utc)
+    return data
+
+
+def test_compiled_file_round_trips_the_export(export):
+    data = open_columnar(export)
+
+    assert columnar_path(export).exists()
+    assert data.to_all_stats() == _expected(EXPORT)
+    assert len(data) == 2
+    # Keys shared across dimensions are stored once
+    assert data.strings.count("/") == 1
+
+
+def test_current_compiled_file_is_reused(export, monkeypatch):
+    first = open_columnar(export)
+
+    def compile_again(*args):
+        raise AssertionError("recompiled a current file")
+
+    monkeypatch.setattr(columnar, "compile_columnar", compile_again)
+    again = open_columnar(export)
+
+    assert again.source_signature == first.source_signature
+    assert again.to_all_stats() == first.to_all_stats()
+
+
+def test_changed_export_is_recompiled(export):
+    open_columnar(export)
+    changed = {**EXPORT, "timeseries": EXPORT["timeseries"][:1]}
+    export.write_text(json.dumps(changed))
+    # Same size and mtime would still match; force a different signature
+    stat = export.stat()
+    os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    data = open_columnar(export)
+
+    assert data.source_signature == columnar._source_signature(export)
+    assert data.to_all_stats() == _expected(changed)
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        lambda raw: b"NOTVCOL!" + raw[8:],
+        lambda raw: raw[:8] + b"\xff\xff\x00\x00" + raw[12:],
+        lambda raw: raw[:20],
+        lambda raw: raw[:10],
+        lambda raw: raw[:8] + struct.pack("<I", 2) + b"[]",
+        lambda raw: raw[:-8],
+    ],
+    ids=["magic", "header", "truncated", "short", "header-type", "short-column"],
+)
+def test_broken_compiled_file_is_recompiled(export, damage):
+    open_columnar(export)
+    compiled = columnar_path(export)
+    compiled.write_bytes(damage(compiled.read_bytes()))
+
+    data = open_columnar(export)
+
+    assert data.to_all_stats() == _expected(EXPORT)
+    assert compiled.read_bytes().startswith(columnar.COLUMNAR_MAGIC)
+
+
+def test_unwritable_directory_keeps_the_data_in_memory(export, monkeypatch):
+    def read_only(*args):
+        raise PermissionError("read-only file system")
+
+    monkeypatch.setattr(columnar, "compile_columnar", read_only)
+
+    data = open_columnar(export)
+
+    assert isinstance(data, ColumnarData)
+    assert data.name == str(export)
+    assert not columnar_path(export).exists()
+    assert data.to_all_stats() == _expected(EXPORT)
+
+
+def test_missing_export_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        open_columnar(tmp_path / "missing.json")
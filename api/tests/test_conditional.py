@@ -0,0 +1,149 @@
+"""Conditional GET and compression of cached responses."""
+
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from services import compression, serialization
+from services.cache import CACHE_CONTROL, CacheEntry, body_etag
+from services.compression import Compressor
+from services.serialization import conditional_response, etag_matches
+
+BIG_BODY = json.dumps(
+    {"timeseries": [{"pageviews": n, "visitors": n // 2} for n in range(200)]}
+).encode()
+SMALL_BODY = b'{"project":"blog"}'
+
+
+@pytest.fixture
+def compressor(monkeypatch) -> Compressor:
+    fresh = Compressor(enabled=True, min_bytes=1024)
+    monkeypatch.setattr(serialization, "compressor", fresh)
+    return fresh
+
+
+def _respond(entry: CacheEntry, **headers):
+    headers = {name.replace("_", "-"): value for name, value in headers.items()}
+    return asyncio.run(conditional_response(entry, headers))
+
+
+def test_bodies_differing_only_in_metadata_have_different_etags():
+    # Nested objects in the metadata used to cut a hashed prefix short
+    blog = (
+        b'{"metadata":{"export_date":"2026-03-14T15:09:26Z",'
+        b'"sections":{"path":"partial"},"source":"unified_blog"},"timeseries":[]}'
+    )
+    jportal = blog.replace(b"unified_blog", b"unified_jportal")
+    degraded = b'{"metadata":{"degraded":true,' + blog[len(b'{"metadata":{') :]
+
+    etags = {body_etag(body) for body in (blog, jportal, degraded)}
+
+    assert len(etags) == 3
+    assert body_etag(blog) == body_etag(bytes(blog))
+
+
+def test_degraded_copies_get_their_own_etag():
+    entry = CacheEntry(b'{"metadata":{"source":"unified_blog"},"timeseries":[]}')
+
+    degraded = entry.degraded(12.34)
+
+    assert degraded.etag != entry.etag
+    assert degraded.etag == body_etag(degraded.body)
+    assert b'"degraded":true,"data_age":12.3' in degraded.body
+
+
+@pytest.mark.parametrize(
+    "header, matches",
+    [
+        (None, False),
+        ("", False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"old", "abc"', True),
+        ('"old"', False),
+        ("*", True),
+    ],
+)
+def test_if_none_match_uses_weak_comparison(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+    assert etag_matches(header, 'W/"abc"') is matches
+
+
+def test_matching_request_gets_304_without_a_body(compressor):
+    entry = CacheEntry(SMALL_BODY)
+
+    response = _respond(entry, if_none_match=entry.etag)
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["ETag"] == entry.etag
+    assert response.headers["Cache-Control"] == CACHE_CONTROL
+
+
+def test_stale_etag_gets_the_body(compressor):
+    entry = CacheEntry(SMALL_BODY)
+
+    response = _respond(entry, if_none_match=body_etag(b"{}"))
+
+    assert response.status_code == 200
+    assert response.body == SMALL_BODY
+    assert response.headers["ETag"] == entry.etag
+    assert "Content-Encoding" not in response.headers
+
+
+def test_compressed_responses_are_kept_on_the_entry(compressor):
+    entry = CacheEntry(BIG_BODY)
+
+    first = _respond(entry, accept_encoding="gzip")
+    second = _respond(entry, accept_encoding="gzip, deflate")
+
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.headers["ETag"] == f"W/{entry.etag}"
+    assert first.headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(first.body) == BIG_BODY
+    assert second.body == first.body
+    assert entry.encodings["gzip"] == first.body
+    assert compressor.encoding_counters["gzip"]["precompressed"] == 1
+    assert entry.size == CacheEntry(BIG_BODY).size + len(first.body)
+
+
+def test_compressed_copy_revalidates_with_its_weak_etag(compressor):
+    entry = CacheEntry(BIG_BODY)
+
+    response = _respond(entry, accept_encoding="gzip", if_none_match=f"W/{entry.etag}")
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == f"W/{entry.etag}"
+    assert not entry.encodings
+
+
+def test_small_bodies_are_not_compressed(compressor):
+    response = _respond(CacheEntry(SMALL_BODY), accept_encoding="gzip")
+
+    assert response.body == SMALL_BODY
+    assert "Content-Encoding" not in response.headers
+    assert compressor.counters["below_threshold"] == 1
+
+
+@pytest.mark.parametrize(
+    "header, encoding",
+    [
+        (None, None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("GZIP;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("*", compression.ENCODINGS[0]),
+        ("*;q=0.5, gzip;q=0", "br" if "br" in compression.ENCODINGS else None),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("gzip, br", compression.ENCODINGS[0]),
+    ],
+)
+def test_negotiation_follows_q_values_then_server_preference(header, encoding):
+    assert Compressor(enabled=True, min_bytes=0).negotiate(header) == encoding
+
+
+def test_disabled_compressor_never_compresses():
+    assert Compressor(enabled=False, min_bytes=0).negotiate("gzip, br") is None
@@ -0,0 +1,172 @@
+"""Request deadlines: live sections that finish in time, and partial responses."""
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services import livestore, stats
+from services.cache import PartialBody, response_cache
+from services.columnar import STAT_DIMENSIONS
+from services.livestore import LiveStore
+from services.posthog import TIMESERIES_DIMENSION
+from services.records import StatRecord, TimeseriesRecord
+from services.window import live_windows
+
+NOW = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def config(monkeypatch, tmp_path) -> dict:
+    monkeypatch.setattr(stats, "LIVE_STORE_ENABLED", True)
+    monkeypatch.setattr(live_windows, "_windows", {})
+    return {"ph_id": "1", "vercel_file": tmp_path / "missing.json"}
+
+
+def _sections(body: bytes) -> dict[str, str] | None:
+    return json.loads(body)["metadata"].get("sections")
+
+
+def test_store_sections_finish_independently(config, monkeypatch):
+    arrived: list[asyncio.Event] = []
+
+    async def timeseries(config, days):
+        return [TimeseriesRecord(NOW, 5, 2, 0.0)]
+
+    async def breakdowns(config, days):
+        arrived.append(asyncio.Event())
+        await arrived[0].wait()
+        return {"path": [StatRecord("/", 5, 2)]}
+
+    monkeypatch.setattr(stats, "fetch_live_timeseries", timeseries)
+    monkeypatch.setattr(stats, "fetch_live_breakdowns", breakdowns)
+
+    async def run():
+        deadline = asyncio.get_running_loop().time() + 0.05
+        result = await stats.build_stats_body("blog", config, 7, deadline=deadline)
+        arrived[0].set()
+        return result, await result.complete
+
+    partial, complete = asyncio.run(run())
+
+    assert isinstance(partial, PartialBody)
+    sections = _sections(partial.body)
+    assert sections["timeseries"] == "complete"
+    assert {sections[field] for field in STAT_DIMENSIONS} == {"partial"}
+    assert json.loads(partial.body)["timeseries"][-1]["pageviews"] == 5
+    assert _sections(complete) is None
+    assert json.loads(complete)["stats"]["path"][0]["key"] == "/"
+
+
+def test_failed_sections_are_marked_partial(config, monkeypatch, capsys):
+    release = asyncio.Event()
+
+    async def timeseries(config, days):
+        raise RuntimeError("database is locked")
+
+    async def breakdowns(config, days):
+        await release.wait()
+        raise RuntimeError("no such table")
+
+    monkeypatch.setattr(stats, "fetch_live_timeseries", timeseries)
+    monkeypatch.setattr(stats, "fetch_live_breakdowns", breakdowns)
+
+    async def run():
+        deadline = asyncio.get_running_loop().time() + 0.05
+        result = await stats.build_stats_body("blog", config, 7, deadline=deadline)
+        release.set()
+        return result, await result.complete
+
+    partial, complete = asyncio.run(run())
+
+    # Nothing is raised: the failed sections are left out like late ones
+    assert set(_sections(partial.body).values()) == {"partial"}
+    assert set(_sections(complete).values()) == {"partial"}
+    out = capsys.readouterr().out
+    assert out.count("Live section error (timeseries): database is locked") == 1
+    assert "no such table" in out
+
+
+def test_failed_sections_are_not_cached(config, monkeypatch):
+    async def breakdowns(config, days):
+        await asyncio.sleep(0.1)
+        raise RuntimeError("no such table")
+
+    async def timeseries(config, days):
+        return [TimeseriesRecord(NOW, 5, 2, 0.0)]
+
+    monkeypatch.setattr(stats, "fetch_live_timeseries", timeseries)
+    monkeypatch.setattr(stats, "fetch_live_breakdowns", breakdowns)
+    key = stats.stats_cache_key("blog", 7)
+
+    async def run():
+        await stats.get_stats_body("blog", config, 7, timeout_ms=20)
+        # Let the background completion finish
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+
+    assert response_cache._entries.get(key) is None
+    assert response_cache.counters["degraded"] == 1
+
+
+def test_sections_in_time_make_a_complete_body(config, monkeypatch):
+    async def timeseries(config, days):
+        return []
+
+    async def breakdowns(config, days):
+        return {}
+
+    monkeypatch.setattr(stats, "fetch_live_timeseries", timeseries)
+    monkeypatch.setattr(stats, "fetch_live_breakdowns", breakdowns)
+
+    async def run():
+        deadline = asyncio.get_running_loop().time() + 5
+        return await stats.build_stats_body("blog", config, 7, deadline=deadline)
+
+    body = asyncio.run(run())
+
+    assert isinstance(body, bytes)
+    assert _sections(body) is None
+
+
+class HeldSync:
+    """Stands in for the PostHog daily rows fetcher; held once `hold` is set."""
+
+    def __init__(self):
+        self.hold: asyncio.Event | None = None
+
+    async def __call__(self, project_id, start, end, limit):
+        if self.hold is not None:
+            await self.hold.wait()
+        rows, day = [], start
+        while day < end:
+            rows += [
+                (day.isoformat(), TIMESERIES_DIMENSION, "", 10, 4),
+                (day.isoformat(), "path", "/", 10, 4),
+            ]
+            day += timedelta(days=1)
+        return rows
+
+
+def test_late_store_sync_leaves_a_complete_body(config, monkeypatch, tmp_path):
+    fetch = HeldSync()
+    source = livestore.SYNC_SOURCES["posthog"]
+    monkeypatch.setitem(source, "fetch", fetch)
+    monkeypatch.setitem(source, "backfill_days", 10)
+    monkeypatch.setitem(source, "configured", lambda: True)
+    monkeypatch.setattr(livestore, "LIVE_STORE_SYNC_INTERVAL", 0)
+    monkeypatch.setattr(stats, "live_store", LiveStore(tmp_path / "live.sqlite3"))
+
+    async def run():
+        await stats.live_store.sync("posthog", "1")
+        fetch.hold = asyncio.Event()
+        deadline = asyncio.get_running_loop().time() + 0.1
+        return await stats.build_stats_body("blog", config, 7, deadline=deadline)
+
+    body = asyncio.run(run())
+
+    assert isinstance(body, bytes)
+    assert _sections(body) is None
+    assert json.loads(body)["stats"]["path"][0]["key"] == "/"
@@ -0,0 +1,104 @@
+"""CPU offload: packed live data, the executor modes and the loop lag monitor."""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from services.executor import CpuExecutor, LoopLagMonitor
+from services.packing import pack_live_data, unpack_live_data
+from services.records import StatRecord, TimeseriesRecord
+
+TIMESERIES = [
+    TimeseriesRecord(datetime(2025, 11, 1, tzinfo=timezone.utc), 12, 5, 0.25),
+    TimeseriesRecord(datetime(2025, 11, 2, 13, tzinfo=timezone.utc), 0, 0, 0.0),
+    TimeseriesRecord(datetime(2025, 11, 3, tzinfo=timezone.utc), 2**40, 7, 1 / 3),
+]
+BREAKDOWNS = {
+    "path": [StatRecord("/blog/ünïcode", 9, 4), StatRecord("/", 3, 1)],
+    "country": [StatRecord("IN", 7, 2)],
+}
+
+
+def _rows(timeseries, breakdowns) -> tuple:
+    return (
+        [(e.date, e.pageviews, e.visitors, e.bounce_rate) for e in timeseries],
+        {
+            dimension: [(e.key, e.pageviews, e.visitors) for e in entries]
+            for dimension, entries in breakdowns.items()
+            if entries
+        },
+    )
+
+
+def test_packed_live_data_round_trips():
+    buffer = pack_live_data(TIMESERIES, BREAKDOWNS)
+    timeseries, breakdowns = unpack_live_data(buffer)
+
+    assert _rows(timeseries, breakdowns) == _rows(TIMESERIES, BREAKDOWNS)
+    # Every dimension comes back, empty or not
+    assert breakdowns["device_type"] == []
+    assert unpack_live_data(pack_live_data([], {})) == (
+        [],
+        {"path": [], "device_type": [], "referrer": [], "os_name": [], "country": []},
+    )
+
+
+def _run(executor: CpuExecutor, fn, *args):
+    executor.start()
+    try:
+        return asyncio.run(executor.run(fn, *args))
+    finally:
+        executor.shutdown()
+
+
+def test_jobs_run_in_the_configured_pool():
+    buffer = pack_live_data(TIMESERIES, BREAKDOWNS)
+
+    # Spawned workers import the job's module, as in production
+    unpacked = _run(CpuExecutor("process", 1), unpack_live_data, buffer)
+    assert _rows(*unpacked) == _rows(TIMESERIES, BREAKDOWNS)
+    assert _run(CpuExecutor("process", 1), os.getpid) != os.getpid()
+
+    main_thread = threading.get_ident()
+    assert _run(CpuExecutor("thread", 1), threading.get_ident) != main_thread
+    assert _run(CpuExecutor("inline", 1), threading.get_ident) == main_thread
+
+
+def test_job_errors_are_counted_and_raised():
+    executor = CpuExecutor("thread", 1)
+
+    with pytest.raises(ZeroDivisionError):
+        _run(executor, divmod, 1, 0)
+
+    assert executor.counters["tasks"] == 1
+    assert executor.counters["errors"] == 1
+    assert executor.counters["in_flight"] == 0
+
+
+def test_unknown_executor_kind_is_rejected():
+    with pytest.raises(ValueError):
+        CpuExecutor("fibers", 1)
+
+
+def test_blocking_callbacks_show_up_as_loop_lag():
+    monitor = LoopLagMonitor(interval=0.01, warn_ms=50)
+
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        # Block the loop the way CPU work on it would
+        asyncio.get_running_loop().call_soon(time.sleep, 0.2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(run())
+
+    stats = monitor.stats()
+    assert stats["probes"] >= 3
+    assert stats["stalls"] >= 1
+    assert stats["max_ms"] >= 100
+    assert not stats["running"]
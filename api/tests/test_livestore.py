@@ -0,0 +1,226 @@
+"""Live store: delta-only syncs of daily rows and local window reads."""
+
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from services import livestore
+from services.deadline import current_deadline
+from services.livestore import LiveStore
+from services.posthog import TIMESERIES_DIMENSION
+
+TODAY = date(2026, 3, 14)
+BACKFILL_DAYS = 10
+CHUNK_DAYS = 4
+
+
+class DailyRows:
+    """
+    Stands in for a provider's daily rows fetcher: every day has 10 * day
+    pageviews and two browsers, recording the requested ranges.
+    """
+
+    def __init__(self):
+        self.ranges: list[tuple[str, date, date]] = []
+        self.failing: set[date] = set()
+        self.scale = 10
+        # Fetches wait for this once set (a sync that outlives its request)
+        self.hold: asyncio.Event | None = None
+
+    def rows(self, start: date, end: date) -> list[tuple]:
+        rows = []
+        day = start
+        while day < end:
+            pageviews = self.scale * day.day
+            rows += [
+                (day.isoformat(), TIMESERIES_DIMENSION, "", pageviews, day.day),
+                (day.isoformat(), "path", "/", pageviews - 1, day.day),
+                (day.isoformat(), "path", "/blog", 1, 1),
+            ]
+            day += timedelta(days=1)
+        return rows
+
+    async def __call__(self, project_id, start, end, limit):
+        self.ranges.append((project_id, start, end))
+        if self.hold is not None:
+            await self.hold.wait()
+        if start in self.failing:
+            raise RuntimeError("upstream down")
+        return self.rows(start, end)
+
+    async def batch(self, project_ids, start, end, limit):
+        self.ranges.append((tuple(project_ids), start, end))
+        return {project_id: self.rows(start, end) for project_id in project_ids}
+
+
+@pytest.fixture
+def upstream(monkeypatch) -> DailyRows:
+    fake = DailyRows()
+    source = livestore.SYNC_SOURCES["posthog"]
+    monkeypatch.setitem(source, "fetch", fake)
+    monkeypatch.setitem(source, "chunk_days", CHUNK_DAYS)
+    monkeypatch.setitem(source, "backfill_days", BACKFILL_DAYS)
+    monkeypatch.setitem(source, "configured", lambda: True)
+    monkeypatch.setattr(livestore, "_today", lambda: TODAY)
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path) -> LiveStore:
+    return LiveStore(tmp_path / "live.sqlite3")
+
+
+def _closed_through(store: LiveStore) -> str:
+    return store.status()["projects"][0]["closed_through"]
+
+
+def test_first_sync_backfills_in_chunks(store, upstream):
+    asyncio.run(store.sync("posthog", "1"))
+
+    start = TODAY - timedelta(days=BACKFILL_DAYS)
+    assert [(s, e) for _, s, e in upstream.ranges] == [
+        (start, start + timedelta(days=4)),
+        (start + timedelta(days=4), start + timedelta(days=8)),
+        (start + timedelta(days=8), TODAY + timedelta(days=1)),
+    ]
+    # Today is still partial
+    assert _closed_through(store) == (TODAY - timedelta(days=1)).isoformat()
+
+
+def test_later_syncs_only_fetch_the_open_days(store, upstream, monkeypatch):
+    monkeypatch.setattr(livestore, "LIVE_STORE_SYNC_INTERVAL", 0)
+
+    async def run():
+        await store.sync("posthog", "1")
+        upstream.ranges.clear()
+        await store.sync("posthog", "1")
+
+    asyncio.run(run())
+
+    # The last closed day is re-queried for late events, plus today
+    yesterday = TODAY - timedelta(days=1)
+    assert upstream.ranges == [("1", yesterday, TODAY + timedelta(days=1))]
+
+
+def test_syncs_within_the_interval_are_skipped(store, upstream):
+    async def run():
+        await store.sync("posthog", "1")
+        await store.sync("posthog", "1")
+
+    asyncio.run(run())
+
+    assert len(upstream.ranges) == 3
+    assert store.counters["syncs"] == 1
+
+
+def test_concurrent_syncs_share_one_fetch(store, upstream):
+    async def run():
+        await asyncio.gather(*(store.sync("posthog", "1") for _ in range(3)))
+
+    asyncio.run(run())
+
+    assert len(upstream.ranges) == 3
+
+
+def test_failed_chunk_stops_the_sync_state_before_the_gap(store, upstream):
+    start = TODAY - timedelta(days=BACKFILL_DAYS)
+    upstream.failing = {start + timedelta(days=4)}
+
+    asyncio.run(store.sync("posthog", "1"))
+
+    assert store.counters["sync_errors"] == 1
+    # Only the first chunk is stored; the next sync resumes at the gap
+    assert _closed_through(store) == (start + timedelta(days=3)).isoformat()
+    stored = store.read_timeseries("posthog", "1", BACKFILL_DAYS)
+    assert stored[-1].date.date() == start + timedelta(days=3)
+
+
+def test_failed_sync_is_retried_within_the_interval(store, upstream):
+    start = TODAY - timedelta(days=BACKFILL_DAYS)
+    upstream.failing = {start + timedelta(days=4)}
+
+    async def run():
+        await store.sync("posthog", "1")
+        upstream.failing.clear()
+        upstream.ranges.clear()
+        await store.sync("posthog", "1")
+        # Complete now, so the interval applies again
+        await store.sync("posthog", "1")
+
+    asyncio.run(run())
+
+    # The retry resumes at the gap instead of waiting out the interval
+    assert [(s, e) for _, s, e in upstream.ranges] == [
+        (start + timedelta(days=3), start + timedelta(days=7)),
+        (start + timedelta(days=7), TODAY + timedelta(days=1)),
+    ]
+    assert _closed_through(store) == (TODAY - timedelta(days=1)).isoformat()
+
+
+def test_reads_cover_the_requested_days(store, upstream):
+    asyncio.run(store.sync("posthog", "1"))
+
+    timeseries, breakdowns = store.read_stats("posthog", "1", 3, limit=1)
+
+    days = [TODAY - timedelta(days=n) for n in (3, 2, 1, 0)]
+    assert [entry.date.date() for entry in timeseries] == days
+    assert [entry.pageviews for entry in timeseries] == [10 * d.day for d in days]
+    # Summed over the days, then limited
+    assert [(e.key, e.pageviews) for e in breakdowns["path"]] == [
+        ("/", sum(10 * d.day - 1 for d in days))
+    ]
+    assert breakdowns["country"] == []
+
+
+def test_batched_providers_sync_projects_together(store, upstream, monkeypatch):
+    source = livestore.SYNC_SOURCES["posthog"]
+    monkeypatch.setitem(source, "fetch_batch", upstream.batch)
+    monkeypatch.setitem(source, "batch_size", 2)
+
+    asyncio.run(store.sync_many("posthog", ["1", "2", "3"]))
+
+    batches = {ids for ids, _, _ in upstream.ranges}
+    assert batches == {("1", "2"), "3"}
+    assert store.counters["batched_syncs"] == 2
+    assert store.read_timeseries("posthog", "2", 0)[0].pageviews == 10 * TODAY.day
+
+
+def _with_deadline(seconds: float, read):
+    async def run():
+        current_deadline.set(asyncio.get_running_loop().time() + seconds)
+        return await read()
+
+    return run()
+
+
+def test_late_sync_leaves_the_stored_rows_at_the_deadline(store, upstream, monkeypatch):
+    monkeypatch.setattr(livestore, "LIVE_STORE_SYNC_INTERVAL", 0)
+
+    async def run():
+        await store.sync("posthog", "1")
+        stored = await asyncio.to_thread(store.read_timeseries, "posthog", "1", 3)
+        upstream.hold = asyncio.Event()
+        upstream.scale = 20
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        rows = await _with_deadline(0.05, lambda: store.timeseries("posthog", "1", 3))
+        return stored, rows, loop.time() - started
+
+    stored, rows, elapsed = asyncio.run(run())
+
+    assert rows == stored
+    assert elapsed < 0.5
+
+
+def test_sync_finished_in_time_is_read(store, upstream, monkeypatch):
+    monkeypatch.setattr(livestore, "LIVE_STORE_SYNC_INTERVAL", 0)
+
+    async def run():
+        await store.sync("posthog", "1")
+        upstream.scale = 20
+        return await _with_deadline(5, lambda: store.timeseries("posthog", "1", 3))
+
+    rows = asyncio.run(run())
+
+    assert rows[-1].pageviews == 20 * TODAY.day
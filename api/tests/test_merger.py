@@ -0,0 +1,243 @@
+"""Merging timeseries and breakdowns from several sources into one."""
+
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from services.merger import (
+    OTHER_KEY,
+    format_stat_totals,
+    merge_stat_lists,
+    merge_stat_totals,
+    merge_timeseries,
+    top_stat_entries,
+)
+from services.records import StatRecord, TimeseriesRecord
+from services.rollup import bucket_start, to_epoch
+from utils import get_country_display
+
+
+def _at(day: int, hour: int = 0) -> datetime:
+    return datetime(2026, 3, day, hour, tzinfo=timezone.utc)
+
+
+def _row(when, pageviews, visitors=1, bounce_rate=0.0, migration_date=None):
+    return TimeseriesRecord(when, pageviews, visitors, bounce_rate, migration_date)
+
+
+def test_entries_in_one_bucket_are_summed_across_lists():
+    vercel = [_row(_at(1), 10, 4, 0.5), _row(_at(2), 20, 8, 0.25)]
+    posthog = [_row(_at(2), 30, 12, 0.75), _row(_at(3), 5, 2, 1.0)]
+
+    merged = merge_timeseries(vercel, posthog)
+
+    assert [entry.date for entry in merged] == [_at(1), _at(2), _at(3)]
+    assert [entry.pageviews for entry in merged] == [10, 50, 5]
+    assert [entry.visitors for entry in merged] == [4, 20, 2]
+    # Weighted by pageviews: (20 * 0.25 + 30 * 0.75) / 50
+    assert merged[1].bounce_rate == pytest.approx(0.55)
+
+
+def test_merge_is_independent_of_input_order():
+    lists = [
+        [_row(_at(1), 1), _row(_at(3), 3)],
+        [_row(_at(2), 2), _row(_at(3), 4)],
+        [_row(_at(1), 5)],
+    ]
+
+    forward = merge_timeseries(*lists)
+    backward = merge_timeseries(*reversed(lists))
+
+    assert forward == backward
+    assert [(entry.date, entry.pageviews) for entry in forward] == [
+        (_at(1), 6),
+        (_at(2), 2),
+        (_at(3), 7),
+    ]
+
+
+def test_migration_date_is_kept_only_when_shared():
+    migrated = date(2025, 12, 1)
+    vercel = [_row(_at(1), 1, migration_date=migrated)]
+    also_vercel = [_row(_at(1), 2, migration_date=migrated), _row(_at(2), 3)]
+    live = [
+        _row(_at(2), 4, migration_date=None),
+        _row(_at(2, 5), 1, migration_date=migrated),
+    ]
+
+    merged = merge_timeseries(vercel, also_vercel, live)
+
+    assert [entry.migration_date for entry in merged] == [migrated, None]
+
+
+def test_leading_zero_buckets_are_trimmed():
+    merged = merge_timeseries(
+        [_row(_at(1), 0), _row(_at(2), 0), _row(_at(3), 7), _row(_at(4), 0)]
+    )
+
+    assert [(entry.date, entry.pageviews) for entry in merged] == [
+        (_at(3), 7),
+        (_at(4), 0),
+    ]
+
+
+def test_all_zero_series_is_kept():
+    rows = [_row(_at(1), 0), _row(_at(2), 0)]
+
+    assert [entry.date for entry in merge_timeseries(rows)] == [_at(1), _at(2)]
+
+
+def test_hourly_rows_are_normalized_to_days_before_joining():
+    vercel = [_row(_at(1, 22), 2, 1, 1.0), _row(_at(1, 23), 2, 1, 0.0)]
+    vercel += [_row(_at(2, hour), 1) for hour in range(3)]
+    live = [_row(_at(2), 5), _row(_at(3), 4)]
+
+    merged = merge_timeseries(vercel, live)
+
+    assert [(entry.date, entry.pageviews) for entry in merged] == [
+        (_at(1), 4),
+        (_at(2), 8),
+        (_at(3), 4),
+    ]
+    assert merged[0].bounce_rate == pytest.approx(0.5)
+
+
+def test_lone_entries_at_their_bucket_start_are_reused():
+    daily = _row(_at(3), 4, 2, 0.25)
+    hourly = _row(_at(4, 6), 4, 2, 0.25)
+
+    merged = merge_timeseries([daily], [hourly])
+
+    assert merged[0] is daily
+    # Rebuilt at the start of its day
+    assert merged[1] is not hourly
+    assert merged[1].date == _at(4)
+
+
+def _reference_merge(lists, resolution):
+    """Straightforward dict-of-buckets merge to compare the join against."""
+    buckets = {}
+    for entries in lists:
+        for entry in entries:
+            key = bucket_start(to_epoch(entry.date), resolution)
+            bucket = buckets.setdefault(key, [0, 0, 0.0])
+            bucket[0] += entry.pageviews
+            bucket[1] += entry.visitors
+            bucket[2] += entry.bounce_rate * entry.pageviews
+    series = [
+        (datetime.fromtimestamp(key, timezone.utc), pv, vis, bounced / pv if pv else 0)
+        for key, (pv, vis, bounced) in sorted(buckets.items())
+    ]
+    first = next((i for i, (_, pv, _, _) in enumerate(series) if pv), 0)
+    return series[first:]
+
+
+@pytest.mark.parametrize("resolution", ["hour", "day", "week", "month"])
+def test_join_matches_a_reference_merge(resolution):
+    rng = random.Random(resolution)
+    start = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    lists = []
+    # Hourly, 3-hourly and daily sources over ~3 months, with gaps
+    for step, steps in (
+        (timedelta(hours=1), 2160),
+        (timedelta(hours=3), 720),
+        (timedelta(days=1), 90),
+    ):
+        times = sorted(start + step * n for n in rng.sample(range(steps), 60))
+        lists.append(
+            [
+                _row(t, rng.randrange(0, 20), rng.randrange(0, 5), rng.random())
+                for t in times
+            ]
+        )
+
+    merged = merge_timeseries(*lists, resolution=resolution)
+
+    expected = _reference_merge(lists, resolution)
+    assert [(e.date, e.pageviews, e.visitors) for e in merged] == [
+        (when, pv, vis) for when, pv, vis, _ in expected
+    ]
+    assert [e.bounce_rate for e in merged] == pytest.approx(
+        [rate for _, _, _, rate in expected]
+    )
+
+
+def _stat(key, pageviews, visitors=1):
+    return StatRecord(key=key, pageviews=pageviews, visitors=visitors)
+
+
+def test_top_entries_without_a_limit_are_all_sorted():
+    totals = {"a": [3, 1], "b": [9, 2], "c": [5, 3]}
+
+    entries = top_stat_entries(totals)
+
+    assert [entry.key for entry in entries] == ["b", "c", "a"]
+    assert OTHER_KEY not in {entry.key for entry in entries}
+
+
+def test_keys_beyond_the_limit_are_summed_into_other():
+    totals = {
+        key: [pageviews, pageviews // 2]
+        for key, pageviews in zip("abcdef", [10, 60, 30, 50, 20, 40])
+    }
+
+    entries = top_stat_entries(totals, limit=3)
+
+    assert [(entry.key, entry.pageviews) for entry in entries] == [
+        ("b", 60),
+        ("d", 50),
+        ("f", 40),
+        (OTHER_KEY, 60),
+    ]
+    assert entries[-1].visitors == 5 + 15 + 10
+    assert sum(entry.pageviews for entry in entries) == 210
+
+
+def test_limit_covering_every_key_adds_no_other_entry():
+    totals = {"a": [1, 1], "b": [2, 1]}
+
+    assert [entry.key for entry in top_stat_entries(totals, limit=2)] == ["b", "a"]
+
+
+def test_stat_lists_merge_case_insensitively_before_the_limit():
+    vercel = [_stat("Chrome", 10), _stat("Safari", 4), _stat("Edge", 1)]
+    posthog = [_stat("chrome", 5), _stat("Firefox", 6), _stat("safari", 3)]
+
+    merged = merge_stat_lists(vercel, posthog, limit=2)
+
+    assert [(entry.key, entry.pageviews) for entry in merged] == [
+        ("chrome", 15),
+        ("safari", 7),
+        (OTHER_KEY, 7),
+    ]
+    assert merged[-1].visitors == 2
+
+
+def test_live_breakdowns_merge_into_vercel_totals_before_the_limit():
+    vercel = {"country": {"us": [10, 5], "de": [3, 1]}, "path": {"/": [8, 4]}}
+    live = {
+        "country": [_stat("US", 2), _stat("FR", 4), _stat("IN", 1)],
+        "device_type": [_stat("Mobile", 6, 3)],
+    }
+
+    totals = merge_stat_totals(vercel, live)
+    stats = format_stat_totals(totals, limit=2)
+
+    assert totals is vercel
+    assert totals["country"] == {
+        "us": [12, 6],
+        "de": [3, 1],
+        "fr": [4, 1],
+        "in": [1, 1],
+    }
+    assert [(entry.key, entry.pageviews) for entry in stats["country"]] == [
+        (get_country_display("us"), 12),
+        (get_country_display("fr"), 4),
+        (OTHER_KEY, 4),
+    ]
+    assert [(entry.key, entry.pageviews) for entry in stats["device_type"]] == [
+        ("mobile", 6)
+    ]
+    assert stats["path"][0].key == "/"
+    assert stats["referrer"] == []
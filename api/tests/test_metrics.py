@@ -0,0 +1,155 @@
+"""Prometheus metrics: the text format, the registry and request labels."""
+
+import asyncio
+import importlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from services.metrics import (
+    CallbackMetric,
+    Counter,
+    Histogram,
+    MetricsMiddleware,
+    MetricsRegistry,
+)
+
+# `services.metrics` the attribute is the registry, re-exported by the package
+metrics_module = importlib.import_module("services.metrics")
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("job_seconds", "Job time", ("job",), buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "merge")
+
+    assert histogram.render() == [
+        "# HELP job_seconds Job time",
+        "# TYPE job_seconds histogram",
+        'job_seconds_bucket{job="merge",le="0.1"} 2',
+        'job_seconds_bucket{job="merge",le="1"} 3',
+        'job_seconds_bucket{job="merge",le="+Inf"} 4',
+        'job_seconds_sum{job="merge"} 3.65',
+        'job_seconds_count{job="merge"} 4',
+    ]
+
+
+def test_counters_keep_one_sample_per_label_set():
+    counter = Counter("errors_total", "Errors", ("upstream",))
+
+    counter.inc("posthog")
+    counter.inc("posthog", amount=2)
+    counter.inc('cloud"flare')
+
+    assert counter.render()[2:] == [
+        'errors_total{upstream="posthog"} 3',
+        'errors_total{upstream="cloud\\"flare"} 1',
+    ]
+
+
+def test_callbacks_skip_missing_values():
+    gauge = CallbackMetric(
+        "lag_seconds", "Lag", "gauge", lambda: [((), 0.25), ((), None)]
+    )
+
+    assert gauge.render() == [
+        "# HELP lag_seconds Lag",
+        "# TYPE lag_seconds gauge",
+        "lag_seconds 0.25",
+    ]
+
+
+def test_registry_rejects_duplicate_names_and_survives_broken_callbacks(capsys):
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests").inc()
+
+    with pytest.raises(ValueError):
+        registry.histogram("requests_total", "Requests again")
+
+    registry.callback("broken", "Broken", "gauge", lambda: 1 / 0)
+    text = registry.render()
+
+    assert text.endswith("requests_total 1\n")
+    assert "Metrics error (broken)" in capsys.readouterr().out
+
+
+def test_timed_records_the_phase_also_on_errors(monkeypatch):
+    phases = Histogram("phase_seconds", "Phases", ("phase",))
+    monkeypatch.setattr(metrics_module, "phase_duration", phases)
+
+    @metrics_module.timed
+    def merge_rows(fail: bool) -> str:
+        if fail:
+            raise RuntimeError("bad rows")
+        return "merged"
+
+    assert merge_rows(False) == "merged"
+    with pytest.raises(RuntimeError):
+        merge_rows(True)
+
+    assert merge_rows.__name__ == "merge_rows"
+    assert 'phase_seconds_count{phase="merge_rows"} 2' in phases.render()
+
+
+@pytest.fixture
+def requests(monkeypatch) -> Histogram:
+    recorded = Histogram(
+        "request_seconds", "Requests", ("route", "slug", "method", "status")
+    )
+    monkeypatch.setattr(metrics_module, "request_duration", recorded)
+    return recorded
+
+
+def _serve(paths: list[str]) -> None:
+    app = FastAPI()
+
+    @app.get("/api/v1/{project_slug}/stats")
+    async def stats(project_slug: str):
+        return {"project": project_slug}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("handler failed")
+
+    transport = httpx.ASGITransport(
+        app=MetricsMiddleware(app, slugs=["blog"]), raise_app_exceptions=False
+    )
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            for path in paths:
+                await c.get(path)
+
+    asyncio.run(run())
+
+
+def _counts(histogram: Histogram) -> dict[str, int]:
+    """Request count per label set, e.g. {'{route="/boom",...}': 1}."""
+    prefix = "request_seconds_count"
+    return {
+        line[len(prefix) :].split(" ")[0]: int(line.split(" ")[1])
+        for line in histogram.render()
+        if line.startswith(prefix)
+    }
+
+
+def test_requests_are_labelled_by_route_template(requests):
+    _serve(["/api/v1/blog/stats", "/api/v1/blog/stats", "/api/v1/x1y2/stats"])
+
+    route = "/api/v1/{project_slug}/stats"
+    assert _counts(requests) == {
+        f'{{route="{route}",slug="blog",method="GET",status="200"}}': 2,
+        # Unregistered slugs don't become label values
+        f'{{route="{route}",slug="",method="GET",status="200"}}': 1,
+    }
+
+
+def test_unmatched_and_failed_requests_are_recorded(requests):
+    _serve(["/nope/abc", "/boom"])
+
+    assert _counts(requests) == {
+        '{route="unmatched",slug="",method="GET",status="404"}': 1,
+        '{route="/boom",slug="",method="GET",status="500"}': 1,
+    }
@@ -0,0 +1,106 @@
+"""Batched PostHog queries: the HogQL text and splitting the rows back up."""
+
+import asyncio
+import json
+import re
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from services import posthog
+from services.posthog import (
+    BREAKDOWN_FIELDS,
+    TIMESERIES_DIMENSION,
+    build_batched_query,
+    fetch_posthog_stats,
+    parse_batched_results,
+)
+
+DAY = 86400
+EPOCH = int(datetime(2025, 11, 1, tzinfo=timezone.utc).timestamp())
+
+# Unordered on purpose: the outer SELECT doesn't keep the subqueries' order
+ROWS = [
+    ["country", "IN", 4, 2],
+    [TIMESERIES_DIMENSION, str(EPOCH + DAY), 6, 3],
+    ["path", "/", 9, 5],
+    ["country", "US", 7, 1],
+    ["path", "/blog", 12, 4],
+    [TIMESERIES_DIMENSION, str(EPOCH), 15, 6],
+    ["device_type", "Desktop", 21, 9],
+    ["unknown", "ignored", 1, 1],
+]
+
+
+def _normalized(query: str) -> str:
+    return re.sub(r"\s+", " ", query)
+
+
+def test_query_ranks_every_field_in_one_pass():
+    query = _normalized(build_batched_query(days=7, limit=10))
+
+    assert "ARRAY JOIN [" in query
+    for field in BREAKDOWN_FIELDS:
+        assert f"tuple('{field}', toString({posthog.PH_FIELDS[field]}))" in query
+    assert "INTERVAL 7 DAY" in query
+    assert "LIMIT 10 BY dimension" in query
+    assert "UNION ALL" not in query
+    assert query.rstrip().endswith(f"LIMIT {10 * len(BREAKDOWN_FIELDS)}")
+
+
+def test_query_folds_in_the_timeseries():
+    query = _normalized(build_batched_query(days=7, limit=10, include_timeseries=True))
+
+    assert query.count("UNION ALL") == 1
+    assert f"'{TIMESERIES_DIMENSION}' as dimension" in query
+    assert "toUnixTimestamp(toStartOfDay(timestamp))" in query
+    # Every breakdown row plus one row per day, edges included
+    assert query.rstrip().endswith(f"LIMIT {10 * len(BREAKDOWN_FIELDS) + 8}")
+
+
+def _check_parsed(timeseries, breakdowns) -> None:
+    assert [(entry.date, entry.pageviews, entry.visitors) for entry in timeseries] == [
+        (datetime(2025, 11, 1, tzinfo=timezone.utc), 15, 6),
+        (datetime(2025, 11, 2, tzinfo=timezone.utc), 6, 3),
+    ]
+    assert {
+        field: [(entry.key, entry.pageviews, entry.visitors) for entry in entries]
+        for field, entries in breakdowns.items()
+    } == {
+        "path": [("/blog", 12, 4), ("/", 9, 5)],
+        "device_type": [("Desktop", 21, 9)],
+        "referrer": [],
+        "os_name": [],
+        "country": [("US", 7, 1), ("IN", 4, 2)],
+    }
+
+
+def test_rows_are_split_by_dimension_and_reordered():
+    _check_parsed(*parse_batched_results(ROWS))
+
+
+@pytest.fixture
+def posthog_queries(mock_upstream, monkeypatch) -> list[str]:
+    """HogQL of every request to a mocked PostHog answering with ROWS."""
+    monkeypatch.setattr(posthog, "PH_API_KEY", "phx_test")
+    monkeypatch.setattr(posthog, "PH_BATCH_BREAKDOWNS", True)
+    monkeypatch.setattr(posthog, "PH_BATCH_TIMESERIES", True)
+    queries = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/projects/123/query/"
+        body = json.loads(request.content)
+        assert body["query"]["kind"] == "HogQLQuery"
+        queries.append(body["query"]["query"])
+        return httpx.Response(200, json={"results": ROWS})
+
+    mock_upstream("posthog", handler)
+    return queries
+
+
+def test_stats_are_fetched_in_one_round_trip(posthog_queries):
+    timeseries, breakdowns = asyncio.run(fetch_posthog_stats("123", days=7))
+
+    assert posthog_queries == [build_batched_query(7, include_timeseries=True)]
+    _check_parsed(timeseries, breakdowns)
@@ -0,0 +1,99 @@
+"""Prewarm scheduler: per-project refreshes, bounded concurrency and purging."""
+
+import asyncio
+
+import pytest
+
+from services import prewarm
+from services.aggregate import AGGREGATE_KEY
+from services.cache import response_cache
+from services.prewarm import PrewarmScheduler
+
+
+class Refresh:
+    """Stands in for refresh_stats_body, recording calls and peak concurrency."""
+
+    def __init__(self, failing: set[int] = frozenset()):
+        self.failing = failing
+        self.calls: list[tuple[str, int, str]] = []
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, slug, config, days, resolution):
+        self.calls.append((slug, days, resolution))
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0)
+            if days in self.failing:
+                raise RuntimeError(f"upstream down ({days}d)")
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def refresh(monkeypatch) -> Refresh:
+    fake = Refresh()
+    monkeypatch.setattr(prewarm, "LIVE_STORE_ENABLED", False)
+    monkeypatch.setattr(prewarm, "refresh_stats_body", fake)
+    return fake
+
+
+def test_refresh_rebuilds_every_period_with_bounded_concurrency(refresh):
+    scheduler = PrewarmScheduler(jitter=0.1, concurrency=2)
+
+    status = asyncio.run(scheduler.refresh("blog", {"name": "Blog"}))
+
+    assert sorted(days for _, days, _ in refresh.calls) == sorted(
+        prewarm.PREWARM_PERIODS
+    )
+    assert {resolution for _, _, resolution in refresh.calls} == {
+        prewarm.PREWARM_RESOLUTION
+    }
+    assert refresh.peak == 2
+    assert status["refreshes"] == 1
+    assert status["errors"] == 0
+    assert status["last_refresh"] is not None
+
+
+def test_refresh_counts_failed_periods(refresh):
+    refresh.failing = {7, 365}
+    scheduler = PrewarmScheduler(jitter=0.1, concurrency=2)
+    config = {"name": "Blog", "prewarm_periods": [7, 30, 365]}
+
+    async def run():
+        await scheduler.refresh("blog", config)
+        return await scheduler.refresh("blog")
+
+    status = asyncio.run(run())
+
+    assert status["refreshes"] == 2
+    assert status["errors"] == 4
+    assert status["last_error"].startswith("upstream down")
+    assert scheduler.status()["projects"]["blog"]["periods"] == [7, 30, 365]
+
+
+def test_purge_drops_the_project_and_aggregates_containing_it():
+    for key in [
+        ("blog", "stats", 30),
+        ("jportal", "stats", 30),
+        (AGGREGATE_KEY, "aggregate", ("blog", "jportal"), 30, None, None),
+        (AGGREGATE_KEY, "aggregate", ("jportal",), 30, None, None),
+    ]:
+        response_cache.set(key, b"{}")
+
+    assert PrewarmScheduler(jitter=0.1, concurrency=2).purge("blog") == 2
+    assert set(response_cache._entries) == {
+        ("jportal", "stats", 30),
+        (AGGREGATE_KEY, "aggregate", ("jportal",), 30, None, None),
+    }
+
+
+@pytest.mark.parametrize("jitter", [0.0, 0.1, 0.5])
+def test_sleep_time_stays_within_the_jitter(jitter):
+    scheduler = PrewarmScheduler(jitter=jitter, concurrency=2)
+
+    sleeps = [scheduler._sleep_time(60) for _ in range(200)]
+
+    assert all(60 * (1 - jitter) <= sleep <= 60 * (1 + jitter) for sleep in sleeps)
+    assert scheduler._sleep_time(0) == 0
@@ -0,0 +1,128 @@
+"""Timeseries rollups: tier choice, UTC bucket boundaries and rolled-up series."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.merger import merge_timeseries
+from services.records import TimeseriesRecord
+from services.rollup import (
+    AUTO_MIN_POINTS,
+    TIERS,
+    bucket_start,
+    choose_resolution,
+    to_epoch,
+)
+from services.stats import resolve_resolution
+
+
+def _epoch(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+@pytest.mark.parametrize(
+    "days, tier",
+    [
+        (0, "hour"),
+        (1, "hour"),
+        (7, "hour"),
+        (30, "day"),
+        (90, "day"),
+        (365, "week"),
+        (3650, "month"),
+    ],
+)
+def test_choose_resolution_for_dashboard_periods(days, tier):
+    assert choose_resolution(days * 86400) == tier
+
+
+@pytest.mark.parametrize("tier", ["day", "week", "month"])
+def test_choose_resolution_switches_exactly_at_the_minimum_points(tier):
+    threshold = TIERS[tier] * AUTO_MIN_POINTS
+
+    assert choose_resolution(threshold) == tier
+    assert choose_resolution(threshold - 1) != tier
+
+
+@pytest.mark.parametrize(
+    "moment, resolution, start",
+    [
+        # Last second of an hour, and the hour boundary itself
+        ((2026, 3, 14, 15, 59, 59), "hour", (2026, 3, 14, 15)),
+        ((2026, 3, 14, 16, 0, 0), "hour", (2026, 3, 14, 16)),
+        ((2026, 3, 14, 23, 59, 59), "day", (2026, 3, 14)),
+        ((2026, 3, 15, 0, 0, 0), "day", (2026, 3, 15)),
+        # 2026-03-15 is a Sunday, 2026-03-16 a Monday
+        ((2026, 3, 15, 23, 59, 59), "week", (2026, 3, 9)),
+        ((2026, 3, 16, 0, 0, 0), "week", (2026, 3, 16)),
+        # Weeks crossing a month and a year
+        ((2026, 3, 1, 12, 0, 0), "week", (2026, 2, 23)),
+        ((2026, 1, 1, 0, 0, 0), "week", (2025, 12, 29)),
+        # The epoch itself was a Thursday
+        ((1970, 1, 1, 0, 0, 0), "week", (1969, 12, 29)),
+        ((2026, 2, 28, 23, 59, 59), "month", (2026, 2, 1)),
+        ((2028, 2, 29, 12, 0, 0), "month", (2028, 2, 1)),
+        ((2026, 3, 1, 0, 0, 0), "month", (2026, 3, 1)),
+        ((2025, 12, 31, 23, 59, 59), "month", (2025, 12, 1)),
+    ],
+)
+def test_bucket_start_at_utc_boundaries(moment, resolution, start):
+    assert bucket_start(_epoch(*moment), resolution) == _epoch(*start)
+
+
+def test_week_buckets_start_on_monday():
+    epoch = _epoch(2026, 1, 1)
+    for day in range(60):
+        start = bucket_start(epoch + day * 86400 + 3600, "week")
+        assert datetime.fromtimestamp(start, timezone.utc).weekday() == 0
+
+
+def test_unknown_resolution_is_rejected():
+    with pytest.raises(ValueError):
+        bucket_start(0, "year")
+
+
+def test_naive_timestamps_are_utc():
+    naive = datetime(2026, 3, 14, 15)
+
+    assert to_epoch(naive) == _epoch(2026, 3, 14, 15)
+
+
+def test_hourly_rows_roll_up_into_weeks_and_months():
+    start = datetime(2026, 2, 20, tzinfo=timezone.utc)
+    hourly = [
+        TimeseriesRecord(start + timedelta(hours=h), 1, 1, 0.0) for h in range(24 * 14)
+    ]
+
+    weeks = merge_timeseries(hourly, resolution="week")
+    months = merge_timeseries(hourly, resolution="month")
+
+    # Fri 2026-02-20 .. Thu 2026-03-05
+    assert [(e.date.day, e.pageviews) for e in weeks] == [
+        (16, 24 * 3),
+        (23, 24 * 7),
+        (2, 24 * 4),
+    ]
+    assert [(e.date.month, e.pageviews) for e in months] == [(2, 24 * 9), (3, 24 * 5)]
+    assert sum(e.pageviews for e in weeks) == len(hourly)
+
+
+def _day(*args) -> TimeseriesRecord:
+    return TimeseriesRecord(datetime(*args, tzinfo=timezone.utc), 1, 1, 0.0)
+
+
+@pytest.mark.parametrize(
+    "resolution, days, tier",
+    [(None, 30, "day"), ("week", 30, "week"), ("auto", 7, "hour"), ("auto", 90, "day")],
+)
+def test_resolve_resolution_for_fixed_windows(resolution, days, tier):
+    assert resolve_resolution(resolution, days, None, []) == tier
+
+
+def test_auto_resolution_of_lifetime_uses_the_data_span():
+    short = [_day(2026, 3, 1), _day(2026, 3, 3)]
+    long = [_day(2024, 3, 1), _day(2026, 3, 1)]
+
+    assert resolve_resolution("auto", 0, None, short) == "hour"
+    assert resolve_resolution("auto", 0, None, long) == "week"
+    assert resolve_resolution("auto", 0, None, []) == "hour"
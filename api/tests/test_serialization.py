@@ -0,0 +1,83 @@
+"""Response serialization: orjson and the standard library encode the same JSON."""
+
+import json
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from models import AllStats
+from services import serialization
+from services.records import StatRecord, TimeseriesRecord
+from services.serialization import FastJSONResponse, dumps
+
+CONTENT = {
+    "metadata": {
+        "export_date": datetime(2026, 3, 14, 15, 9, 26, 123456, tzinfo=timezone.utc),
+        "source": "unified_blog",
+        "degraded": False,
+        "data_age": None,
+    },
+    "timeseries": [
+        TimeseriesRecord(
+            datetime(2026, 3, 14, tzinfo=timezone.utc), 12, 5, 0.25, date(2025, 12, 1)
+        ),
+        TimeseriesRecord(datetime(2026, 3, 15, tzinfo=timezone.utc), 0, 0, 0.0),
+    ],
+    "stats": {
+        "path": [StatRecord("/blog/ünïcode", 3, 1)],
+        "country": [StatRecord("🇮🇳 India", 9, 4)],
+    },
+}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+def test_encoders_produce_identical_bytes(monkeypatch):
+    pytest.importorskip("orjson")
+    with_orjson = dumps(CONTENT)
+    monkeypatch.setattr(serialization, "orjson", None)
+
+    assert dumps(CONTENT) == with_orjson
+
+
+def test_records_serialize_like_the_api_models(encoder):
+    body = dumps(CONTENT)
+
+    document = json.loads(body)
+    assert document["metadata"]["export_date"] == "2026-03-14T15:09:26.123456Z"
+    assert document["timeseries"][0] == {
+        "date": "2026-03-14T00:00:00Z",
+        "pageviews": 12,
+        "visitors": 5,
+        "bounce_rate": 0.25,
+        "migration_date": "2025-12-01",
+    }
+    # The records have exactly the fields of the response models
+    model = AllStats.model_validate(document)
+    assert model.model_dump(mode="json")["timeseries"] == document["timeseries"]
+    assert "🇮🇳 India".encode() in body
+
+
+def test_non_utc_offsets_are_kept(encoder):
+    moment = datetime(2026, 3, 14, 12, tzinfo=timezone(timedelta(hours=5, minutes=30)))
+
+    assert dumps({"at": moment}) == b'{"at":"2026-03-14T12:00:00+05:30"}'
+
+
+def test_unserializable_values_are_rejected(encoder):
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_fast_response_sends_serialized_bodies_as_they_are():
+    body = b'{"already":"serialized"}'
+
+    assert FastJSONResponse(body).body == body
+    assert FastJSONResponse({"n": 1}).body == b'{"n":1}'
@@ -0,0 +1,144 @@
+"""Request coalescing: concurrent identical fetches share one in-flight call."""
+
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight, coalesce, upstream_flights
+
+
+class Fetch:
+    """A fetch that blocks until released and counts its calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self, *args):
+        self.calls += 1
+        await self.release.wait()
+        return ("result", *args)
+
+
+def test_concurrent_calls_with_one_key_share_a_fetch():
+    flights = SingleFlight()
+    fetch = Fetch()
+
+    async def run():
+        fetch.release = asyncio.Event()
+        callers = [
+            asyncio.create_task(flights.do("k", lambda: fetch())) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        assert flights.running("k")
+        fetch.release.set()
+        return await asyncio.gather(*callers)
+
+    results = asyncio.run(run())
+    assert fetch.calls == 1
+    assert results == [("result",)] * 5
+    assert flights.stats() == {"calls": 5, "shared": 4, "in_flight": 0}
+
+
+def test_calls_after_completion_fetch_again():
+    flights = SingleFlight()
+    fetch = Fetch()
+
+    async def run():
+        fetch.release = asyncio.Event()
+        fetch.release.set()
+        await flights.do("k", lambda: fetch())
+        await flights.do("k", lambda: fetch())
+
+    asyncio.run(run())
+    assert fetch.calls == 2
+    assert not flights.running("k")
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch():
+    flights = SingleFlight()
+    fetch = Fetch()
+
+    async def run():
+        fetch.release = asyncio.Event()
+        leaving = asyncio.create_task(flights.do("k", lambda: fetch()))
+        staying = asyncio.create_task(flights.do("k", lambda: fetch()))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.gather(leaving, return_exceptions=True)
+        fetch.release.set()
+        return leaving, await staying
+
+    leaving, result = asyncio.run(run())
+    assert leaving.cancelled()
+    assert result == ("result",)
+    assert fetch.calls == 1
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError("upstream down")
+
+    async def run():
+        return await asyncio.gather(
+            flights.do("k", failing), flights.do("k", failing), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert not flights.running("k")
+
+
+def test_coalesce_keys_on_bound_arguments():
+    fetch = Fetch()
+
+    @coalesce("test")
+    async def fetch_stats(project_id: str, days: int = 30):
+        return await fetch(project_id, days)
+
+    async def run():
+        fetch.release = asyncio.Event()
+        calls = [
+            fetch_stats("1"),
+            fetch_stats("1", 30),
+            fetch_stats(project_id="1", days=30),
+            fetch_stats("1", days=7),
+            fetch_stats("2"),
+        ]
+        tasks = [asyncio.create_task(call) for call in calls]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(run())
+    # However the arguments were passed, ("1", 30) is one fetch
+    assert fetch.calls == 3
+    assert results[:3] == [("result", "1", 30)] * 3
+    assert results[3:] == [("result", "1", 7), ("result", "2", 30)]
+    assert upstream_flights.stats()["in_flight"] == 0
+
+
+@pytest.mark.parametrize("shared", [True, False])
+def test_running_reflects_in_flight_keys(shared):
+    flights = SingleFlight()
+
+    async def run():
+        release = asyncio.Event()
+        task = asyncio.create_task(flights.do("k", release.wait))
+        await asyncio.sleep(0)
+        seen = flights.running("k"), flights.running("other")
+        if shared:
+            # A second caller joins without starting anything new
+            joined = asyncio.create_task(flights.do("k", release.wait))
+            await asyncio.sleep(0)
+        release.set()
+        await task
+        if shared:
+            await joined
+        return seen
+
+    assert asyncio.run(run()) == (True, False)
+    assert flights.stats()["shared"] == (1 if shared else 0)
@@ -0,0 +1,307 @@
+"""
+Vercel migration data: the per-process cache and preload, and the indexed
+day windows against the original filters.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+from datetime import datetime, time, timedelta, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+import main
+from models import AllStats
+from services import columnar, vercel
+from services.columnar import STAT_DIMENSIONS
+from services.vercel import (
+    dataset_stat_totals,
+    filter_dataset_timeseries,
+    filter_stats_by_date,
+    filter_timeseries_by_date,
+    load_vercel_dataset,
+    preload_vercel_data,
+)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+# None, 0, inside the data, and far past either end of it
+DAYS = [None, 0, 1, 2, 7, 30, 365, 400, 100_000]
+
+
+@pytest.fixture
+def blog(tmp_path, monkeypatch) -> Path:
+    monkeypatch.setattr(columnar, "COLUMNAR_DIR", "")
+    path = tmp_path / "blog.json"
+    shutil.copy(DATA_DIR / "blog.json", path)
+    return path
+
+
+def test_dataset_is_reused_until_the_file_changes(blog):
+    dataset = load_vercel_dataset(blog)
+    assert load_vercel_dataset(blog) is dataset
+
+    # Same size, newer mtime
+    st = blog.stat()
+    os.utime(blog, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    touched = load_vercel_dataset(blog)
+    assert touched is not dataset
+
+    # Same mtime, different size
+    document = json.loads(blog.read_text())
+    document["timeseries"] = document["timeseries"][:10]
+    blog.write_text(json.dumps(document))
+    os.utime(blog, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    shrunk = load_vercel_dataset(blog)
+    assert shrunk is not touched
+    assert len(shrunk.timeseries_index) == 10
+
+
+def test_unparseable_file_is_cached_as_missing(blog, monkeypatch, capsys):
+    blog.write_text("{not json")
+    opened = []
+    original_open = vercel.open_columnar
+    monkeypatch.setattr(
+        vercel, "open_columnar", lambda path: opened.append(path) or original_open(path)
+    )
+
+    assert load_vercel_dataset(blog) is None
+    assert load_vercel_dataset(blog) is None
+    assert len(opened) == 1
+    assert capsys.readouterr().out.count("Error parsing JSON file") == 1
+
+    # A fixed file is picked up on the next load
+    shutil.copy(DATA_DIR / "blog.json", blog)
+    assert load_vercel_dataset(blog) is not None
+    assert len(opened) == 2
+
+
+def test_preload_loads_every_readable_file(blog, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(vercel, "_vercel_preloaded", False)
+    broken = tmp_path / "broken.json"
+    broken.write_text("[]")
+    opened = []
+    original_open = vercel.open_columnar
+    monkeypatch.setattr(
+        vercel, "open_columnar", lambda path: opened.append(path) or original_open(path)
+    )
+
+    assert preload_vercel_data([blog, broken, tmp_path / "missing.json"]) == 1
+    assert vercel.is_vercel_data_ready()
+
+    # Requests are served from the preloaded datasets
+    load_vercel_dataset(blog)
+    assert len(opened) == 2
+    assert "broken.json" in capsys.readouterr().out
+
+
+def test_ready_fails_until_the_preload_finishes(blog, monkeypatch):
+    monkeypatch.setattr(vercel, "_vercel_preloaded", False)
+    transport = httpx.ASGITransport(app=main.app)
+
+    async def ready() -> int:
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return (await c.get("/ready")).status_code
+
+    assert asyncio.run(ready()) == 503
+    preload_vercel_data([blog])
+    assert asyncio.run(ready()) == 200
+
+
+def _synthetic_export() -> dict:
+    """
+    Sixty days of hourly rows ending today, starting and ending with runs
+    of zero-pageview hours, so every window has something to trim, and
+    breakdowns whose keys differ only in case across migration dates.
+    """
+    today = datetime.combine(
+        datetime.now(timezone.utc).date(), time(), tzinfo=timezone.utc
+    )
+    first = today - timedelta(days=60)
+    timeseries = []
+    for hour in range(60 * 24):
+        moment = first + timedelta(hours=hour)
+        quiet = hour < 5 * 24 + 7 or hour >= 58 * 24 or hour % 11 == 0
+        timeseries.append(
+            {
+                "date": moment.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "pageviews": 0 if quiet else hour % 17 + 1,
+                "visitors": 0 if quiet else hour % 5 + 1,
+                "bounce_rate": 0 if quiet else (hour % 4) / 4,
+                "migration_date": (first + timedelta(days=hour // 240 * 10))
+                .date()
+                .isoformat(),
+            }
+        )
+    stats = {}
+    for n, dimension in enumerate(STAT_DIMENSIONS):
+        keys = ["/", "/Blog", "/blog", "/BLOG/x", "IN", "in"][n:]
+        stats[dimension] = [
+            {
+                "key": key,
+                "pageviews": 3 * i + len(key),
+                "visitors": i + 1,
+                # Every fourth row is undated, the rest spread over 80 days
+                "migration_date": (
+                    None
+                    if i % 4 == 3
+                    else (today - timedelta(days=i * 7 % 80)).date().isoformat()
+                ),
+            }
+            for i, key in enumerate(keys * 4)
+        ]
+    return {
+        "metadata": {"export_date": today.isoformat(), "source": "vercel"},
+        "timeseries": timeseries,
+        "stats": stats,
+    }
+
+
+@pytest.fixture
+def exports(tmp_path, monkeypatch) -> dict[str, Path]:
+    """The bundled exports plus a synthetic one, copied next to their caches."""
+    monkeypatch.setattr(columnar, "COLUMNAR_DIR", "")
+    paths = {}
+    for source in sorted(DATA_DIR.glob("*.json")):
+        paths[source.stem] = Path(shutil.copy(source, tmp_path))
+    synthetic = tmp_path / "synthetic.json"
+    synthetic.write_text(json.dumps(_synthetic_export()))
+    paths["synthetic"] = synthetic
+    return paths
+
+
+def _original(path: Path) -> AllStats:
+    """The export parsed the way the unindexed code path read it."""
+    data = AllStats(**json.loads(path.read_text()))
+    data.timeseries.sort(key=lambda entry: entry.date.timestamp())
+    return data
+
+
+def _rows(entries) -> list[tuple]:
+    return [
+        (
+            entry.date.replace(tzinfo=timezone.utc).timestamp(),
+            entry.pageviews,
+            entry.visitors,
+            entry.bounce_rate,
+            entry.migration_date,
+        )
+        for entry in entries
+    ]
+
+
+def test_timeseries_windows_match_the_original_filter(exports):
+    for name, path in exports.items():
+        original = _original(path)
+        dataset = load_vercel_dataset(path)
+
+        for days in DAYS:
+            expected = filter_timeseries_by_date(original.timeseries, days)
+            actual = filter_dataset_timeseries(dataset, days)
+            assert _rows(actual) == _rows(expected), (name, days)
+
+
+def test_windows_start_at_the_first_nonzero_entry(exports):
+    dataset = load_vercel_dataset(exports["synthetic"])
+
+    for days in (None, 30, 57):
+        entries = filter_dataset_timeseries(dataset, days)
+        assert entries[0].pageviews > 0
+        # Trailing quiet hours are kept
+        assert entries[-1].pageviews == 0
+
+    # A window with no traffic at all is returned whole
+    quiet = filter_dataset_timeseries(dataset, 1)
+    assert len(quiet) == 24
+    assert not any(entry.pageviews for entry in quiet)
+
+
+def _totals(stats) -> dict[str, dict[str, list[int]]]:
+    return {
+        dimension: {
+            entry.key: [entry.pageviews, entry.visitors]
+            for entry in getattr(stats, dimension)
+        }
+        for dimension in STAT_DIMENSIONS
+    }
+
+
+def test_stat_totals_match_the_original_filter(exports):
+    for name, path in exports.items():
+        stats = _original(path).stats
+        dataset = load_vercel_dataset(path)
+
+        for days in DAYS:
+            # Without a window the original returned the rows unaggregated;
+            # a cutoff before any migration date aggregates all of them
+            expected = filter_stats_by_date(stats, 10**5 if days is None else days)
+            assert dataset_stat_totals(dataset, days) == _totals(expected), (
+                name,
+                days,
+            )
+
+
+def _ago(days: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).date().isoformat()
+
+
+def test_stat_totals_per_dimension(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "COLUMNAR_DIR", "")
+    path = tmp_path / "blog.json"
+    export = {
+        "metadata": {"export_date": "2025-12-01T10:00:00Z", "source": "vercel"},
+        "timeseries": [],
+        "stats": {
+            "path": [
+                {
+                    "key": "/Blog",
+                    "pageviews": 5,
+                    "visitors": 2,
+                    "migration_date": _ago(40),
+                },
+                {"key": "/", "pageviews": 4, "visitors": 4},
+                {
+                    "key": "/blog",
+                    "pageviews": 3,
+                    "visitors": 1,
+                    "migration_date": _ago(3),
+                },
+                {
+                    "key": "/old",
+                    "pageviews": 9,
+                    "visitors": 9,
+                    "migration_date": _ago(90),
+                },
+            ],
+            "country": [
+                {"key": "in", "pageviews": 7, "visitors": 3, "migration_date": _ago(3)},
+                {
+                    "key": "IN",
+                    "pageviews": 1,
+                    "visitors": 1,
+                    "migration_date": _ago(10),
+                },
+            ],
+        },
+    }
+    path.write_text(json.dumps(export))
+    dataset = load_vercel_dataset(path)
+
+    # Keys are merged case-insensitively, in order of first appearance
+    assert dataset_stat_totals(dataset) == {
+        "path": {"/blog": [8, 3], "/": [4, 4], "/old": [9, 9]},
+        "device_type": {},
+        "referrer": {},
+        "os_name": {},
+        "country": {"in": [8, 4]},
+    }
+
+    # Older rows drop out of a window; undated rows always count
+    recent = dataset_stat_totals(dataset, 30)
+    assert recent["path"] == {"/blog": [3, 1], "/": [4, 4]}
+    assert recent["country"] == {"in": [8, 4]}
+    assert dataset_stat_totals(dataset, 5)["country"] == {"in": [7, 3]}
+    assert dataset_stat_totals(dataset, 0)["path"] == {"/": [4, 4]}
@@ -0,0 +1,155 @@
+"""Live windows: slicing periods, and only ever from the live store."""
+
+import asyncio
+import json
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from services import stats
+from services.records import StatRecord, TimeseriesRecord
+from services.window import LiveWindow, live_windows
+
+TODAY = date(2026, 3, 14)
+CONFIG = {"ph_id": "1", "vercel_file": "missing.json"}
+
+
+def _window(days: int = 30, today: date = TODAY) -> LiveWindow:
+    timeseries, paths = [], []
+    for n in range(days, -1, -1):
+        day = today - timedelta(days=n)
+        timeseries.append(
+            TimeseriesRecord(
+                datetime(day.year, day.month, day.day, tzinfo=timezone.utc),
+                n + 1,
+                1,
+                0.0,
+            )
+        )
+        paths += [(day.isoformat(), "/", 2, 1), (day.isoformat(), f"/{n}", 1, 1)]
+    return LiveWindow(days, today, timeseries, {"path": paths, "country": []})
+
+
+def test_slices_sum_the_daily_rows_of_the_period():
+    window = _window()
+
+    timeseries, breakdowns = window.slice(7, limit=3)
+
+    assert [entry.pageviews for entry in timeseries] == [8, 7, 6, 5, 4, 3, 2, 1]
+    # Ties are broken by key, as the store orders them
+    assert [(e.key, e.pageviews, e.visitors) for e in breakdowns["path"]] == [
+        ("/", 16, 8),
+        ("/0", 1, 1),
+        ("/1", 1, 1),
+    ]
+    assert breakdowns["country"] == []
+    assert window.slice_timeseries(0)[0].date.date() == TODAY
+    assert window.covers(30) and not window.covers(31)
+
+
+class StoreReads:
+    """Stands in for live_store.window, counting reads."""
+
+    def __init__(self, error: bool = False):
+        self.error = error
+        self.calls: list[int] = []
+
+    async def __call__(self, provider, source_id, days):
+        self.calls.append(days)
+        if self.error:
+            raise sqlite3.OperationalError("database is locked")
+        # Windows read from the store end today
+        window = _window(days, datetime.now(timezone.utc).date())
+        return window.timeseries, window.breakdowns
+
+
+class DirectFetches:
+    """Stands in for fetch_live_stats, recording the queried periods."""
+
+    def __init__(self):
+        self.calls: list[int] = []
+
+    async def __call__(self, config, days):
+        self.calls.append(days)
+        return [], {"path": [StatRecord(f"/{days}", days, 1)]}
+
+
+@pytest.fixture
+def live(monkeypatch, tmp_path):
+    monkeypatch.setitem(CONFIG, "vercel_file", tmp_path / "missing.json")
+    monkeypatch.setattr(live_windows, "_windows", {})
+    direct = DirectFetches()
+    monkeypatch.setattr(stats, "fetch_live_stats", direct)
+    return direct
+
+
+def _bundle_paths(body: bytes) -> dict[str, list]:
+    periods = json.loads(body)["periods"]
+    return {days: period["stats"]["path"] for days, period in periods.items()}
+
+
+def test_without_the_store_periods_are_queried_directly(live, monkeypatch):
+    monkeypatch.setattr(stats, "LIVE_STORE_ENABLED", False)
+
+    async def run():
+        body = await stats.build_bundle_body("blog", CONFIG, [7, 30, 0])
+        # A later /stats request isn't answered from a window either
+        await stats.gather_live_stats(CONFIG, 7)
+        return body
+
+    body = asyncio.run(run())
+
+    lifetime = stats.LIFETIME_QUERY_DAYS
+    assert live.calls == [7, 30, lifetime, 7]
+    assert _bundle_paths(body)["0"][0]["key"] == f"/{lifetime}"
+    assert stats.cached_live_window(CONFIG, 7) is None
+
+
+def test_with_the_store_periods_are_sliced_from_one_read(live, monkeypatch):
+    reads = StoreReads()
+    monkeypatch.setattr(stats, "LIVE_STORE_ENABLED", True)
+    monkeypatch.setattr(stats.live_windows, "ttl", 60)
+    monkeypatch.setattr("services.window.live_store.window", reads)
+
+    async def run():
+        body = await stats.build_bundle_body("blog", CONFIG, [7, 30])
+        return body, await stats.gather_live_stats(CONFIG, 7)
+
+    body, later = asyncio.run(run())
+
+    assert reads.calls == [30]
+    assert live.calls == []
+    assert isinstance(later, LiveWindow)
+    assert _bundle_paths(body)["7"][0] == {
+        "key": "/",
+        "pageviews": 16,
+        "visitors": 8,
+        "migration_date": None,
+    }
+
+
+def test_store_errors_fall_back_to_direct_queries(live, monkeypatch, capsys):
+    monkeypatch.setattr(stats, "LIVE_STORE_ENABLED", True)
+    monkeypatch.setattr("services.window.live_store.window", StoreReads(error=True))
+
+    asyncio.run(stats.build_bundle_body("blog", CONFIG, [7, 30]))
+
+    assert live.calls == [7, 30]
+    assert "Live store error: database is locked" in capsys.readouterr().out
+
+
+def test_process_pools_get_packed_slices_of_cached_windows(live, monkeypatch):
+    window = _window()
+    monkeypatch.setattr(stats, "cached_live_window", lambda config, days: window)
+    monkeypatch.setattr(stats.cpu_executor, "kind", "process")
+
+    packed = asyncio.run(stats.gather_live_stats(CONFIG, 7))
+
+    # Only the period's rows cross the process boundary, not the window
+    assert isinstance(packed, bytes)
+    timeseries, breakdowns = stats.unpack_live_stats(packed, 7)
+    expected_timeseries, expected_breakdowns = window.slice(7)
+    assert timeseries == expected_timeseries
+    assert breakdowns["path"] == expected_breakdowns["path"]
+    assert live.calls == []
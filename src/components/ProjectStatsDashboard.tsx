@@ -583,7 +583,7 @@ export default function ProjectStatsDashboard() {
 			setError(null);
 			try {
 				const res = await fetch(
-					`${API_BASE}/api/v1/${selectedSlug}/stats?days=${period}`,
+					`${API_BASE}/api/v1/${selectedSlug}/stats?days=${period}&resolution=auto`,
 					{ signal: controller.signal }
 				);
 				if (!res.ok) throw new Error("Failed to fetch stats");